@@ -20,10 +20,12 @@ def fourq_write_scalar(sakura: SaseboGii, k0 : str, k1: str, k2 : str, k3 : str)
 
     cur_addr = addresses[0]
     next_addr = addresses[1]
-    sakura.write64(k0, cur_addr, 0x0140, is_upper_half=False)
-    sakura.write64(k1, cur_addr, 0x0140, is_upper_half=True)
-    sakura.write64(k2, next_addr, 0x0140, is_upper_half=False)
-    sakura.write64(k3, next_addr, 0x0140, is_upper_half=True)
+    # The 24 register writes of the scalar are sent in a single USB transaction
+    with sakura.batch() as batch:
+        batch.write64(k0, cur_addr, 0x0140, is_upper_half=False)
+        batch.write64(k1, cur_addr, 0x0140, is_upper_half=True)
+        batch.write64(k2, next_addr, 0x0140, is_upper_half=False)
+        batch.write64(k3, next_addr, 0x0140, is_upper_half=True)
 
 
 def fourq_write_base_point(sakura: SaseboGii, x0, x1, y0, y1):
@@ -42,14 +44,15 @@ def fourq_write_base_point(sakura: SaseboGii, x0, x1, y0, y1):
     y00, y01 = hex(y0 & mask)[2:].zfill(16), hex((y0 >> 64) & mask)[2:].zfill(16)
     y10, y11 = hex(y1 & mask)[2:].zfill(16), hex((y1 >> 64) & mask)[2:].zfill(16)
 
-    sakura.write64(x00, 0x02, 0x0140, is_upper_half=False)
-    sakura.write64(x01, 0x02, 0x0140, is_upper_half=True)
-    sakura.write64(x10, 0x03, 0x0140, is_upper_half=False)
-    sakura.write64(x11, 0x03, 0x0140, is_upper_half=True)
-    sakura.write64(y00, 0x04, 0x0140, is_upper_half=False)
-    sakura.write64(y01, 0x04, 0x0140, is_upper_half=True)
-    sakura.write64(y10, 0x05, 0x0140, is_upper_half=False)
-    sakura.write64(y11, 0x05, 0x0140, is_upper_half=True)
+    with sakura.batch() as batch:
+        batch.write64(x00, 0x02, 0x0140, is_upper_half=False)
+        batch.write64(x01, 0x02, 0x0140, is_upper_half=True)
+        batch.write64(x10, 0x03, 0x0140, is_upper_half=False)
+        batch.write64(x11, 0x03, 0x0140, is_upper_half=True)
+        batch.write64(y00, 0x04, 0x0140, is_upper_half=False)
+        batch.write64(y01, 0x04, 0x0140, is_upper_half=True)
+        batch.write64(y10, 0x05, 0x0140, is_upper_half=False)
+        batch.write64(y11, 0x05, 0x0140, is_upper_half=True)
 
 
 def fourq_read_result_point(sakura: SaseboGii):
@@ -60,15 +63,15 @@ def fourq_read_result_point(sakura: SaseboGii):
         0x04,  # y0
         0x05  # y1
     ]
-    data_read = []
-    for address in addresses:
-        sakura.write_rom_address(address, 0x00)  # Xi[0]
-        data_out = sakura.read_result()
-        data_read.append(data_out)
+    # All ROM address writes and result reads are queued, and the 64 response bytes are collected in one bulk read
+    with sakura.batch() as batch:
+        for address in addresses:
+            batch.write_rom_address(address, 0x00)  # Xi[0]
+            batch.read_result()
 
-        sakura.write_rom_address(address, 0x01)  # Xi[1]
-        data_out = sakura.read_result()
-        data_read.append(data_out)
+            batch.write_rom_address(address, 0x01)  # Xi[1]
+            batch.read_result()
+    data_read = batch.responses64()
 
     x00, x01, x10, x11, y00, y01, y10, y11 = [int(el, 16) for el in data_read]
     x = (int(x01 << 64 | x00), int(x11 << 64 | x10))
@@ -76,17 +79,28 @@ def fourq_read_result_point(sakura: SaseboGii):
     return x, y
 
 
-def fourq_initialize_rom(sakura: SaseboGii):
+def fourq_initialize_rom(sakura: SaseboGii, verify_device_state: bool = True):
     """
-    Initialize the ROM values
+    Initialize the ROM values. The ROM values are not overwritten by the operations of the design, so values that were
+    already written to this device (according to its shadow copy) are skipped.
     :param sakura: The FPGA interface
+    :param verify_device_state: Whether to read back the previously written ROM values first, such that values lost
+    (e.g. by power-cycling the device) are written again
     """
 
     print("[*] Initializing ROM")
-    for value in fourq_rom_constants.rom_values:
-        lower_half = value[0]
-        upper_half = value[1]
-        addr = value[2]
-        sakura.write64(lower_half, addr, 0x0140, is_upper_half=False)
-        sakura.write64(upper_half, addr, 0x0140, is_upper_half=True)
+    if verify_device_state and sakura.shadow:
+        mismatches = sakura.verify_shadow()
+        if mismatches:
+            print("[*] {} ROM value(s) changed on the device".format(len(mismatches)))
+    # All ROM values are sent in a single USB transaction, after which we wait until they have been written
+    with sakura.batch(verify=True) as batch:
+        for value in fourq_rom_constants.rom_values:
+            lower_half = value[0]
+            upper_half = value[1]
+            addr = value[2]
+            batch.write64(lower_half, addr, 0x0140, is_upper_half=False, skip_unchanged=True)
+            batch.write64(upper_half, addr, 0x0140, is_upper_half=True, skip_unchanged=True)
+    if len(batch) == 0:
+        print("[*] ROM already initialized")
     print("[*] done")
@@ -0,0 +1,54 @@
+import gmpy2
+
+from fourq_hardware import constants
+
+# Precomputed constants used by the scalar decomposition of FourQ.
+# All constants are integers taken from the hardware constants (which in turn were taken from FourQlib), such that the
+# decomposition can be done without rational arithmetic. Their derivation is implemented in scalar_decomposition, and
+# can be checked against the values in this module using self_test().
+
+# The curve constants ell_i, used to compute alpha_tilde_i = floor(ell_i * m / mu)
+CURVE_CONSTANTS = (constants.L1, constants.L2, constants.L3, constants.L4)
+
+# The Babai optimal basis B = [b1, b2, b3, b4] of the zero decomposition lattice (all entries are integers)
+BABAI_OPTIMAL_BASIS = (tuple(constants.basis1), tuple(constants.basis2), tuple(constants.basis3),
+                       tuple(constants.basis4))
+
+_b1, _b2, _b3, _b4 = BABAI_OPTIMAL_BASIS
+
+# The offset vectors c = 5b2 - 3b3 + 2b4 and c' = c + b4, exactly one of them gives a multi-scalar with odd a1
+OFFSET_C = tuple(5 * _b2[i] - 3 * _b3[i] + 2 * _b4[i] for i in range(4))
+OFFSET_C_PRIME = tuple(OFFSET_C[i] + _b4[i] for i in range(4))
+
+_eigenvalues = None
+
+
+def get_eigenvalues():
+    """
+    The eigenvalues of the endomorphisms phi and psi, computed on first use.
+    :return: (lambda_phi, lambda_psi)
+    """
+    global _eigenvalues
+    if _eigenvalues is None:
+        p, r, N, V = constants.p, constants.r, constants.N, constants.V
+        lambda_phi = int(4 * (p - 1) * r ** 3 * gmpy2.invert((p + 1) ** 2 * V, N) % N)
+        lambda_psi = int(4 * (p + 1) * gmpy2.invert(r, N) % N)
+        _eigenvalues = (lambda_phi, lambda_psi)
+    return _eigenvalues
+
+
+def self_test():
+    """
+    Verify the precomputed constants against their derivation (see Section 4 of the FourQ paper).
+    :return: True if all constants match, raises an AssertionError otherwise
+    """
+    # Imported here, as scalar_decomposition itself depends on this module
+    from fourq_software import scalar_decomposition
+    assert tuple(scalar_decomposition.calculate_curve_constants()) == CURVE_CONSTANTS
+    derived_basis = scalar_decomposition.calculate_babai_optimal_basis()
+    for bi, exp_bi in zip(derived_basis, BABAI_OPTIMAL_BASIS):
+        for bij, exp_bij in zip(bi, exp_bi):
+            assert bij == exp_bij
+    assert get_eigenvalues() == (scalar_decomposition.calculate_eigenvalue_phi(),
+                                 scalar_decomposition.calculate_eigenvalue_psi())
+    return True
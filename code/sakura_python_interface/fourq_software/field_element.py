@@ -1,80 +1,117 @@
-import mpmath
-from fourq_hardware import constants
 import gmpy2
 import numpy as np
 
-mpmath.mp.dps = 9000
+from fourq_hardware import constants
+
+# p = 2^127 - 1 is a Mersenne prime, which allows reductions using only shifts, masks and additions
+P_BITS = 127
+P = constants.p
+P_SQUARED = P * P
+
+
+def mersenne_reduce(value: int) -> int:
+    """
+    Reduce an integer modulo the Mersenne prime p = 2^127 - 1.
+    As 2^127 = 1 (mod p), the bits above position 127 can be folded back onto the lower bits:
+    value = hi * 2^127 + lo = hi + lo (mod p)
+    A product of two reduced coordinates (< 2^254) is brought back into [0, p) with two folds.
+    :param value: The integer to reduce (negative values are handled using the generic modulo)
+    :return: value mod p
+    """
+    if value < 0:
+        return value % P
+    while value >> P_BITS:
+        value = (value & P) + (value >> P_BITS)
+    return 0 if value == P else value
+
+
+def _to_coordinates(value):
+    """
+    Interpret an operand as the coordinates (a, b) of the element a + b*i in GF(p^2)
+    :param value: A FieldElement, an integer or a complex number (e.g. complex, mpmath.mpc or mpmath.mpf)
+    :return: The tuple (a, b) with 0 <= a, b < p
+    """
+    if isinstance(value, FieldElement):
+        return value.real, value.imag
+    if isinstance(value, int):
+        return mersenne_reduce(value), 0
+    # Complex numbers (Python complex or mpmath.mpc) and real numbers (e.g. mpmath.mpf, gmpy2.mpz)
+    real = getattr(value, "real", value)
+    imag = getattr(value, "imag", 0)
+    return mersenne_reduce(int(real)), mersenne_reduce(int(imag))
 
 
 class FieldElement(object):
+    """
+    An element a + b*i of GF(p^2) = GF(p)[i] / (i^2 + 1) with p = 2^127 - 1.
+    Both coordinates are stored as Python integers in the range [0, p).
+    """
+
+    __slots__ = ("real", "imag")
 
     def __init__(self, real, imag):
         # A point is a complex number: p = a + bi
-        self.real = int(real)
-        self.imag = int(imag)
-        self.point = mpmath.mpc(real, imag)
+        self.real = mersenne_reduce(int(real))
+        self.imag = mersenne_reduce(int(imag))
+
+    @classmethod
+    def _from_reduced(cls, real: int, imag: int):
+        """
+        Construct a field element from coordinates that are already reduced modulo p (skips the reduction)
+        """
+        element = cls.__new__(cls)
+        element.real = real
+        element.imag = imag
+        return element
+
+    @property
+    def point(self):
+        """
+        The field element as an mpmath complex number (kept for compatibility with the former mpmath representation)
+        """
+        import mpmath
+        return mpmath.mpc(self.real, self.imag)
 
     def __add__(self, other):
-        if isinstance(other, FieldElement):
-            p3 = self.point + other.point
-            return FieldElement(p3.real % constants.p, p3.imag % constants.p)
-        else:
-            p3 = self.point + other
-            return FieldElement(p3.real % constants.p, p3.imag % constants.p)
+        c, d = _to_coordinates(other)
+        return FieldElement._from_reduced(mersenne_reduce(self.real + c), mersenne_reduce(self.imag + d))
 
     # Allow different operator order for addition if one of the argument is an integer
     __radd__ = __add__
 
     def __mul__(self, other):
-        if isinstance(other, FieldElement):
-            # Multiplying two points
-            p3 = self.point * other.point
-            return FieldElement(p3.real % constants.p, p3.imag % constants.p)
-        else:
-            p3 = self.point * other
-            return FieldElement(p3.real % constants.p, p3.imag % constants.p)
+        a, b = self.real, self.imag
+        c, d = _to_coordinates(other)
+        if d == 0:
+            # Multiplication with an element of the base field GF(p)
+            return FieldElement._from_reduced(mersenne_reduce(a * c), mersenne_reduce(b * c))
+        # (a + bi)(c + di) = (ac - bd) + ((a + b)(c + d) - ac - bd)i
+        ac = a * c
+        bd = b * d
+        real = mersenne_reduce(ac - bd + P_SQUARED)
+        imag = mersenne_reduce((a + b) * (c + d) - ac - bd)
+        return FieldElement._from_reduced(real, imag)
 
     # Allow different operator order for multiplication if one of the argument is an integer
     __rmul__ = __mul__
 
     def __sub__(self, other):
-        if isinstance(other, FieldElement):
-            p3 = self.point - other.point
-            return FieldElement(p3.real % constants.p, p3.imag % constants.p)
-        else:
-            p3 = self.point - other
-            return FieldElement(p3.real % constants.p, p3.imag % constants.p)
+        c, d = _to_coordinates(other)
+        return FieldElement._from_reduced(mersenne_reduce(self.real - c + P), mersenne_reduce(self.imag - d + P))
 
     def __rsub__(self, other):
-        if isinstance(other, FieldElement):
-            p3 = other.point - self.point
-            return FieldElement(p3.real % constants.p, p3.imag % constants.p)
-        else:
-            p3 = other - self.point
-            return FieldElement(p3.real % constants.p, p3.imag % constants.p)
+        c, d = _to_coordinates(other)
+        return FieldElement._from_reduced(mersenne_reduce(c - self.real + P), mersenne_reduce(d - self.imag + P))
 
     def __mod__(self, other):
-        return FieldElement(self.point.real % other, self.point.imag % other)
+        return FieldElement(self.real % other, self.imag % other)
 
     def __truediv__(self, other):
         if isinstance(other, FieldElement):
-            a = int(self.real)
-            b = int(self.imag)
-            c = int(other.real)
-            d = int(other.imag)
-
-            p3_real = (a * c + b * d) % constants.p
-            p3_real *= gmpy2.invert(c ** 2 + d ** 2, constants.p)
-
-            p3_imag = (b * c - a * d) % constants.p
-            p3_imag *= gmpy2.invert(c ** 2 + d ** 2, constants.p)
-
-            return FieldElement(p3_real % constants.p, p3_imag % constants.p)
-
+            return self * other.mult_inv_complex()
         else:
-            number_inv = gmpy2.invert(other, constants.p)
-            p3 = self.point * number_inv
-            return FieldElement(p3.real % constants.p, p3.imag % constants.p)
+            number_inv = int(gmpy2.invert(int(other), P))
+            return self * number_inv
 
     def __pow__(self, power, modulo=constants.p):
         """
@@ -85,39 +122,51 @@ class FieldElement(object):
         """
         if power == constants.p:
             # This is the same as a negation (i.e. conjugate)
-            new_imag = -self.imag % constants.p
-            return FieldElement(self.real, new_imag)
+            return FieldElement._from_reduced(self.real, mersenne_reduce(P - self.imag))
         if modulo == 1:
             return 0
-        result = mpmath.mpc(1, 0)
+        result = FieldElement._from_reduced(1, 0)
         base_var = self
         while power > 0:
             # check if exponent is odd
             if power & 1:
-                result = (base_var * result) % modulo
+                result = base_var * result
             power >>= 1
-            base_var = base_var * base_var
-            base_var %= modulo
+            if power:
+                base_var = base_var.square()
         return result
 
+    def square(self):
+        """
+        Square the field element
+        (a + bi)^2 = (a + b)(a - b) + 2abi
+        :return: The square of the field element
+        """
+        a, b = self.real, self.imag
+        real = mersenne_reduce((a + b) * (a - b + P))
+        imag = mersenne_reduce((a * b) << 1)
+        return FieldElement._from_reduced(real, imag)
+
     def __neg__(self):
-        p3 = -self.point
-        return FieldElement(p3.real % constants.p, p3.imag % constants.p)
+        return FieldElement._from_reduced(mersenne_reduce(P - self.real), mersenne_reduce(P - self.imag))
 
     def __lt__(self, other):
-        return self.point < other.point
+        return _to_coordinates(self) < _to_coordinates(other)
 
     def __le__(self, other):
-        return self.point <= other.point
+        return _to_coordinates(self) <= _to_coordinates(other)
 
     def __eq__(self, other):
-        return self.point == other.point
+        try:
+            return (self.real, self.imag) == _to_coordinates(other)
+        except (TypeError, ValueError):
+            return NotImplemented
 
     def __gt__(self, other):
-        return self.point > other.point
+        return _to_coordinates(self) > _to_coordinates(other)
 
     def __ge__(self, other):
-        return self.point >= other.point
+        return _to_coordinates(self) >= _to_coordinates(other)
 
     def __str__(self):
         sign = "-" if self.imag <= 0 else "+"
@@ -130,13 +179,13 @@ class FieldElement(object):
         :param z: The complex number z = a + b*i unequal to zero
         :return: multiplicative inverse for z=a+bi ≠0
         """
-        assert self.point != 0
-        x = int(self.point.real) % constants.p
-        y = int(self.point.imag) % constants.p
-        denom = (x ** 2 + y ** 2) % constants.p
-        z_inv_real = x * gmpy2.invert(denom, constants.p) % constants.p
-        z_inv_imag = -(y * gmpy2.invert(denom, constants.p)) % constants.p
-        return FieldElement(z_inv_real, z_inv_imag)
+        assert self.real != 0 or self.imag != 0
+        x = self.real
+        y = self.imag
+        denom_inv = int(gmpy2.invert(mersenne_reduce(x * x + y * y), P))
+        z_inv_real = mersenne_reduce(x * denom_inv)
+        z_inv_imag = mersenne_reduce((P - y) * denom_inv)
+        return FieldElement._from_reduced(z_inv_real, z_inv_imag)
 
     def complex_square_root(self):
         """
@@ -144,10 +193,9 @@ class FieldElement(object):
         :param z: A complex number
         :return: sqrt(z) if the square-root exists, None otherwise
         """
-        a = int(self.point.real) % constants.p
-        b = int(self.point.imag) % constants.p
-        assert self.point.imag != 0
-        mpmath.mp.dps = 9000
+        a = self.real
+        b = self.imag
+        assert b != 0
 
         results_real = []
         results_imag = []
@@ -178,12 +226,10 @@ class FieldElement(object):
         # Verify which solutions lead to the correct result
         for sol_real in results_real:
             for sol_imag in results_imag:
-                root = mpmath.mpc(sol_real, sol_imag)
-                pow_of_two = (mpmath.power(root, 2))
-                pow_of_two = mpmath.mpc(pow_of_two.real % constants.p, pow_of_two.imag % constants.p)
-                if pow_of_two == self.point:
+                root = FieldElement(sol_real, sol_imag)
+                if root.square() == self:
                     verfied_results.append(root)
-        return FieldElement(verfied_results[0].real, verfied_results[0].imag) if len(verfied_results) > 0 else None
+        return verfied_results[0] if len(verfied_results) > 0 else None
 
     def _find_modular_square_root(self, val):
         """
@@ -5,20 +5,35 @@ from fourq_software.scalar_recoding import recode_multi_scalar_general_unoptimiz
 import numpy as np
 
 
-def fourq_scalar_mult(base_point: Point, scalar):
-    assert 0 <= scalar < 2 ** 256
+def precompute_lookup_table(base_point: Point):
+    """
+    Precompute the lookup table T[u] = P + u0 * phi(P) + u1 * psi(P) + u2 * psi(phi(P)) for u = (u2, u1, u0)_2.
+    The additions are done in extended coordinates, so only the endomorphisms need field inversions.
+    :param base_point: The base point P (affine)
+    :return: The 8 table entries in extended coordinates
+    """
     # Compute endomorphisms
     p_phi = apply_endomorphism_phi(base_point)
     p_psi = apply_endomorphism_psi(base_point)
     psi_phi_p = apply_endomorphism_psi(p_phi)
 
+    p = base_point.to_extended()
+    q = p_phi.to_extended().to_precomputed()
+    r = p_psi.to_extended().to_precomputed()
+    s = psi_phi_p.to_extended().to_precomputed()
+
+    lookup_table = [p, p + q, p + r, None, None, None, None, None]
+    lookup_table[3] = lookup_table[1] + r
+    for u in range(4):
+        lookup_table[u + 4] = lookup_table[u] + s
+    return lookup_table
+
+
+def fourq_scalar_mult(base_point: Point, scalar):
+    assert 0 <= scalar < 2 ** 256
     # Precompute lookup table
-    lookup_table = {}
-    for u in range(8):
-        # u = (u2, u1, u0)_2
-        u0, u1, u2 = u & 1, (u >> 1) & 1, (u >> 2) & 1
-        t_u = base_point + u0 * p_phi + u1 * p_psi + u2 * psi_phi_p
-        lookup_table[u] = t_u
+    lookup_table = precompute_lookup_table(base_point)
+    precomputed_table = [t_u.to_precomputed() for t_u in lookup_table]
 
     # Decompose scalar
     multi_scalar = decompose_scalar(scalar)
@@ -29,9 +44,11 @@ def fourq_scalar_mult(base_point: Point, scalar):
     signs, digit_cols_vals = interpret_recoded_matrix(recoded_matrix)
 
     # Main loop
-    q = signs[64] * lookup_table[digit_cols_vals[64]]
+    q = lookup_table[digit_cols_vals[64]]
+    q = q if signs[64] > 0 else -q
     for i in reversed(range(64)):
         q = q.dbl()
-        t_i = signs[i] * lookup_table[digit_cols_vals[i]]
-        q = q + t_i
-    return q
+        t_i = precomputed_table[digit_cols_vals[i]]
+        q = q.add_precomputed(t_i if signs[i] > 0 else -t_i)
+    # Only a single inversion is needed to return to affine coordinates
+    return q.to_affine()
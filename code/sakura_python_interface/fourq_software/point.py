@@ -1,13 +1,13 @@
 from fourq_hardware import constants
-import mpmath
 from fourq_software.field_element import FieldElement
 
+# 2d, used by the addition formulas in extended twisted Edwards coordinates
+TWO_D = FieldElement(constants.d.real, constants.d.imag) * 2
+
 
 class Point(object):
 
     def __init__(self, field_elem_x, field_elem_y):
-        mpmath.mp.dps = 9000
-        # Set precision
         self.x = field_elem_x
         self.y = field_elem_y
         self.a = constants.a
@@ -78,3 +78,140 @@ class Point(object):
             raise Exception("ECC points can only be multiplied with a scalar of type int")
 
     __rmul__ = __mul__
+
+    def to_extended(self):
+        """
+        Convert the affine point (x, y) to extended twisted Edwards coordinates (x:y:1:xy)
+        :return: The point in extended coordinates
+        """
+        one = FieldElement(1, 0)
+        return ExtendedPoint(self.x, self.y, one, self.x, self.y)
+
+
+class PrecomputedPoint(object):
+    """
+    A point in the representation (X + Y, Y - X, 2Z, 2dT) (called R2 in FourQlib).
+    This is the representation in which the points of the lookup table are stored, as it makes the addition cheap.
+    """
+
+    def __init__(self, xy, yx, z2, t2):
+        self.xy = xy
+        self.yx = yx
+        self.z2 = z2
+        self.t2 = t2
+
+    def __neg__(self):
+        # -(x, y) = (-x, y), thus X + Y and Y - X are swapped and T changes sign
+        return PrecomputedPoint(self.yx, self.xy, self.z2, -self.t2)
+
+
+class ExtendedPoint(object):
+    """
+    A point (X:Y:Z:T) in extended twisted Edwards coordinates with x = X/Z, y = Y/Z and T = XY/Z.
+    The coordinate T is stored as the product T = Ta * Tb (called R1 in FourQlib), as the doubling and addition
+    formulas produce both factors for free and T itself is only needed when the point is added to another point.
+    The formulas are the ones of the DBL and ADD_core operations of FourQ, they do not need any field inversions.
+    """
+
+    def __init__(self, x, y, z, ta, tb):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.ta = ta
+        self.tb = tb
+
+    @staticmethod
+    def neutral():
+        """
+        :return: The neutral element (0:1:1:0)
+        """
+        zero = FieldElement(0, 0)
+        one = FieldElement(1, 0)
+        return ExtendedPoint(zero, one, one, zero, one)
+
+    def dbl(self):
+        """
+        Point doubling (DBL), 2P = (Xfinal, Yfinal, Zfinal, Tafinal, Tbfinal)
+        :return: The point 2P in extended coordinates
+        """
+        t1 = self.x.square()  # X1^2
+        t2 = self.y.square()  # Y1^2
+        tb = t1 + t2  # X1^2 + Y1^2
+        t1 = t2 - t1  # Y1^2 - X1^2
+        ta = (self.x + self.y).square() - tb  # 2X1Y1 = (X1 + Y1)^2 - (X1^2 + Y1^2)
+        t2 = self.z.square()
+        t2 = t2 + t2 - t1  # 2Z1^2 - (Y1^2 - X1^2)
+        y = t1 * tb
+        x = t2 * ta
+        z = t1 * t2
+        return ExtendedPoint(x, y, z, ta, tb)
+
+    def to_precomputed(self):
+        """
+        Convert the point to the representation (X + Y, Y - X, 2Z, 2dT) used by the lookup table
+        :return: The point as a PrecomputedPoint
+        """
+        return PrecomputedPoint(self.x + self.y, self.y - self.x, self.z + self.z, TWO_D * (self.ta * self.tb))
+
+    def add_precomputed(self, other):
+        """
+        Point addition (ADD_core) of this point and a point (X2 + Y2, Y2 - X2, 2Z2, 2dT2) of the lookup table
+        :param other: A PrecomputedPoint
+        :return: The sum of both points in extended coordinates
+        """
+        t = self.ta * self.tb
+        z = other.t2 * t  # 2dT1T2
+        t1 = other.z2 * self.z  # 2Z1Z2
+        x = other.xy * (self.x + self.y)  # (X1 + Y1)(X2 + Y2)
+        y = other.yx * (self.y - self.x)  # (Y1 - X1)(Y2 - X2)
+        theta = t1 - z
+        alpha = t1 + z
+        beta = x - y
+        omega = x + y
+        return ExtendedPoint(beta * theta, alpha * omega, theta * alpha, omega, beta)
+
+    def __add__(self, other):
+        """
+        Unified point addition, which also works when both points are equal
+        :param other: A point in extended coordinates or in the precomputed representation
+        :return: The sum of both points in extended coordinates
+        """
+        if isinstance(other, ExtendedPoint):
+            other = other.to_precomputed()
+        if not isinstance(other, PrecomputedPoint):
+            raise Exception("Points can only be added to other points.")
+        return self.add_precomputed(other)
+
+    def __neg__(self):
+        return ExtendedPoint(-self.x, self.y, self.z, -self.ta, self.tb)
+
+    def to_affine(self):
+        """
+        Convert the point to affine coordinates using a single field inversion
+        :return: The point in affine coordinates
+        """
+        z_inv = self.z.mult_inv_complex()
+        return Point(self.x * z_inv, self.y * z_inv)
+
+
+def batch_to_affine(points):
+    """
+    Convert a list of points in extended coordinates to affine coordinates using a single field inversion for the
+    whole list (Montgomery's simultaneous inversion trick).
+    :param points: A list of ExtendedPoints
+    :return: A list with the corresponding points in affine coordinates
+    """
+    if len(points) == 0:
+        return []
+    # Prefix products of the Z coordinates: z_0, z_0 * z_1, ...
+    prefix_products = [points[0].z]
+    for point in points[1:]:
+        prefix_products.append(prefix_products[-1] * point.z)
+    inv = prefix_products[-1].mult_inv_complex()
+    affine_points = [None] * len(points)
+    for idx in reversed(range(len(points))):
+        # inv = 1 / (z_0 * ... * z_idx), thus z_idx^-1 = inv * (z_0 * ... * z_{idx - 1})
+        z_inv = inv * prefix_products[idx - 1] if idx > 0 else inv
+        inv = inv * points[idx].z
+        affine_points[idx] = Point(points[idx].x * z_inv, points[idx].y * z_inv)
+    return affine_points
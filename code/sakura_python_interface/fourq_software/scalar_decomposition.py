@@ -1,11 +1,16 @@
+import functools
+
 import gmpy2
+import numpy as np
 from gmpy2 import mpq
 
 from preconditions import preconditions
 
 from fourq_hardware.constants import *
+from fourq_software import decomposition_constants
 
 
+@functools.lru_cache(maxsize=None)
 def calculate_babai_optimal_basis():
     """
     Calculate the Babai optimal basis for the zero decomposition lattice L (see Definition 1 of the FourQ paper).
@@ -46,16 +51,19 @@ def calculate_babai_optimal_basis():
     return result
 
 
+@functools.lru_cache(maxsize=None)
 def calculate_eigenvalue_psi():
     lambda_psi = 4 * (p + 1) * gmpy2.invert(r, N) % N
     return int(lambda_psi)
 
 
+@functools.lru_cache(maxsize=None)
 def calculate_eigenvalue_phi():
     lambda_phi = 4 * (p - 1) * r ** 3 * gmpy2.invert((p + 1) ** 2 * V, N) % N
     return int(lambda_phi)
 
 
+@functools.lru_cache(maxsize=None)
 def calculate_curve_constants():
     """
     Calculate the curve constants $\ell_i$
@@ -84,7 +92,7 @@ def calculate_alpha_tildes(scalar):
     :param scalar:
     :return:
     """
-    curve_constants = calculate_curve_constants()
+    curve_constants = decomposition_constants.CURVE_CONSTANTS
     alpha_tildes = []
     for i in range(4):
         curve_constant_ell_i = curve_constants[i]
@@ -93,6 +101,7 @@ def calculate_alpha_tildes(scalar):
     return alpha_tildes
 
 
+@functools.lru_cache(maxsize=None)
 def calculate_alpha_hats():
     """
     Calculate the alpha hat values
@@ -117,12 +126,8 @@ def calculate_alpha_hats():
 
 
 def inverse_decomposition_using_eigen(multi_scalar):
-    a1 = multi_scalar[0]
-    a2 = multi_scalar[1]
-    a3 = multi_scalar[2]
-    a4 = multi_scalar[3]
-    lambda_phi = calculate_eigenvalue_phi()
-    lambda_psi = calculate_eigenvalue_psi()
+    a1, a2, a3, a4 = [int(ai) for ai in multi_scalar]
+    lambda_phi, lambda_psi = decomposition_constants.get_eigenvalues()
     m = a1 + a2 * lambda_phi + a3 * lambda_psi + a4 * lambda_phi * lambda_psi
     m %= N
     return m
@@ -133,6 +138,76 @@ def inverse_decomposition_using_eigen(multi_scalar):
     lambda m: 0 < m < 2 ** 256
 )
 def decompose_scalar(m):
+    """
+    Decompose the scalar m into the multi-scalar (a1, a2, a3, a4) with a1 odd, using integer arithmetic only.
+    (a1, a2, a3, a4) = (m, 0, 0, 0) - sum_{i = 1}^{4} alpha_tilde_i * b_i + c (or c')
+    :param m: The scalar
+    :return: The multi-scalar as a list of four integers
+    """
+    basis = decomposition_constants.BABAI_OPTIMAL_BASIS
+    alpha_tildes = [ell_i * m // mu for ell_i in decomposition_constants.CURVE_CONSTANTS]
+
+    a = [m, 0, 0, 0]
+    a = [a[j] - sum(alpha_tildes[i] * basis[i][j] for i in range(4)) for j in range(4)]
+    ac = [a[j] + decomposition_constants.OFFSET_C[j] for j in range(4)]
+
+    # Check which one of the multi-scalars has an odd first coordinate (it should be exactly one)
+    if ac[0] & 1:
+        return ac
+    # a + c' = a + c + b4 has an odd first coordinate, as b4[0] is odd
+    return [ac[j] + basis[3][j] for j in range(4)]
+
+
+def decompose_scalars(ms):
+    """
+    Decompose many scalars at once. The arithmetic is done on NumPy object arrays (i.e. Python integers), such that the
+    loop over the scalars runs inside NumPy instead of calling decompose_scalar for every scalar.
+    :param ms: A sequence or array of scalars with 0 < m < 2^256
+    :return: An (N, 4) array of type np.uint64 with the multi-scalar (a1, a2, a3, a4) of each scalar in its rows
+    """
+    ms = np.asarray([int(m) for m in ms], dtype=object)
+    if ms.size == 0:
+        return np.zeros((0, 4), dtype=np.uint64)
+    if np.any(ms <= 0) or np.any(ms >= mu):
+        raise Exception("Scalars should be in the range 0 < m < 2^256")
+    basis = decomposition_constants.BABAI_OPTIMAL_BASIS
+    alpha_tildes = [ell_i * ms // mu for ell_i in decomposition_constants.CURVE_CONSTANTS]
+
+    multi_scalars = np.empty((len(ms), 4), dtype=object)
+    multi_scalars[:, 0] = ms
+    multi_scalars[:, 1:] = 0
+    for j in range(4):
+        for i in range(4):
+            multi_scalars[:, j] -= alpha_tildes[i] * basis[i][j]
+        multi_scalars[:, j] += decomposition_constants.OFFSET_C[j]
+
+    # Add b4 (i.e. use c' instead of c) for the multi-scalars that have an even first coordinate
+    is_even = (multi_scalars[:, 0] & 1) == 0
+    multi_scalars[is_even] += np.asarray(basis[3], dtype=object)
+    return multi_scalars.astype(np.uint64)
+
+
+def inverse_decompositions_using_eigen(multi_scalars):
+    """
+    Vectorized version of inverse_decomposition_using_eigen.
+    :param multi_scalars: An (N, 4) array with a multi-scalar in each row
+    :return: An object array with the N scalars m = a1 + a2 * λ_phi + a3 * λ_psi + a4 * λ_phi * λ_psi (mod N)
+    """
+    # Convert to Python integers to avoid overflows
+    multi_scalars = np.asarray(multi_scalars).astype(object)
+    lambda_phi, lambda_psi = decomposition_constants.get_eigenvalues()
+    eigen_products = np.asarray([1, lambda_phi, lambda_psi, lambda_phi * lambda_psi], dtype=object)
+    ms = multi_scalars.dot(eigen_products)
+    return ms % N
+
+
+def decompose_scalar_rational(m):
+    """
+    Decompose the scalar using the rational Babai optimal basis, following the derivation in the FourQ paper.
+    This gives the same result as decompose_scalar, and is kept as a reference.
+    :param m: The scalar
+    :return: The multi-scalar
+    """
     b1, b2, b3, b4 = calculate_babai_optimal_basis()
 
     c = [5 * b2[i] - 3 * b3[i] + 2 * b4[i] for i in range(4)]
@@ -157,7 +232,4 @@ def decompose_scalar(m):
 
 
 if __name__ == "__main__":
-    calculate_babai_optimal_basis()
-    calculate_alpha_hats()
-    calculate_curve_constants()
-    calculate_eigenvalue_phi()
+    decomposition_constants.self_test()
@@ -237,6 +237,53 @@ def recode_multi_scalar_optimized(multi_scalar, output_in_matrix_format=False):
         return matrix_glv_sac
 
 
+def recode_multi_scalars(multi_scalars):
+    """
+    Recode many multi-scalars at once. This gives the same result as recode_multi_scalar_general_unoptimized (with a1
+    as the sign aligner) for every multi-scalar, but loops over the 65 digit positions instead of over the scalars and
+    their bits, operating on all multi-scalars with whole-array bit operations.
+    :param multi_scalars: An (N, 4) array of type np.uint64 with a multi-scalar (a1, a2, a3, a4) in each row, a1 odd
+    :return: (recoded_matrices, signs, digit_column_values) with
+    - recoded_matrices: an (N, 4, 65) np.int8 array, recoded_matrices[n] is the recoded matrix of the n-th multi-scalar
+    - signs: an (N, 65) np.int8 array with signs[n, i] = s_i
+    - digit_column_values: an (N, 65) np.int8 array with digit_column_values[n, i] = d_i (0 <= d_i < 8)
+    The signs and digit columns are indexed as returned by interpret_recoded_matrix (i.e. index 64 holds s_64 and d_64)
+    """
+    multi_scalars = np.asarray(multi_scalars, dtype=np.uint64)
+    if multi_scalars.ndim != 2 or multi_scalars.shape[1] != 4:
+        raise Exception("We expect an (N, 4) matrix with a multi-scalar in each row.")
+    one = np.uint64(1)
+    if not np.all(multi_scalars[:, 0] & one):
+        raise Exception("The first sub-scalar of each multi-scalar (the sign aligner) should be odd.")
+    nr_of_scalars = multi_scalars.shape[0]
+    length = 65
+
+    # The signs are given by the signed non-zero encoding of a1: s_i = 2 * a1[i + 1] - 1 and s_64 = 1
+    sign_aligner_bits = (multi_scalars[:, [0]] >> np.arange(1, 64, dtype=np.uint64)) & one
+    signs = np.empty((nr_of_scalars, length), dtype=np.int8)
+    signs[:, :63] = 2 * sign_aligner_bits.astype(np.int8) - 1
+    signs[:, 63] = -1
+    signs[:, 64] = 1
+    is_negative = (signs < 0).astype(np.uint64)
+
+    # b_i^j = s_i * a_j[0] and a_j = floor(a_j / 2) - floor(b_i^j / 2) for the remaining sub-scalars
+    sub_scalars = multi_scalars[:, 1:].copy()
+    digit_bits = np.empty((nr_of_scalars, 3, length), dtype=np.int8)
+    for i in range(length):
+        bits = sub_scalars & one
+        digit_bits[:, :, i] = bits
+        sub_scalars >>= one
+        # floor(b_i^j / 2) = -1 only if the digit is -1
+        sub_scalars += bits & is_negative[:, [i]]
+
+    recoded_matrices = np.empty((nr_of_scalars, 4, length), dtype=np.int8)
+    # The recoded matrix stores b_64 in the first and b_0 in the last column
+    recoded_matrices[:, 0, :] = signs[:, ::-1]
+    recoded_matrices[:, 1:, :] = (digit_bits * signs[:, np.newaxis, :])[:, :, ::-1]
+    digit_column_values = digit_bits[:, 0] + 2 * digit_bits[:, 1] + 4 * digit_bits[:, 2]
+    return recoded_matrices, signs, digit_column_values.astype(np.int8)
+
+
 def matrix_to_scalars(scalars_arranged_in_matrix: np.ndarray):
     """
     Convert a matrix with encoded scalars to a list of corresponding decimal values
@@ -284,14 +331,19 @@ def scalars_fit_in_uint64(recoded_matrix, sign_aligner_index=0):
     return True
 
 
-def get_valid_recoded_matrix(expected_digit_columns, length):
+def get_valid_recoded_matrix(expected_digit_columns, length, rng=None):
     """
     Given a 2d array of wanted digit columns, gives back the scalars in matrix form that will produce these digit columns.
+    The multi-scalar is constructed directly (no search is involved): the free padding of a sub-scalar only adds an
+    integer from a contiguous range (determined by the padding signs of the sign-aligner) to the value of its fixed
+    digit columns, so we can pick the sign-aligner first and then any in-range value for each sub-scalar.
     :param length: The fixed length of the recoded matrix (i.e the width or the number of columns in this matrix)
     :param expected_digit_columns: The digit column that are wanted in the recoded matrix
-    :return: The scalars that will produce the corresponding recoded matrix with wanted digit columns (formatted as a matrix)
+    :param rng: None to fill the padding deterministically (padding digits of the sub-scalars are zero where possible),
+    or a seed / np.random.Generator to fill the padding uniformly at random among all valid fillings
+    :return: The scalars that will produce the corresponding recoded matrix with wanted digit columns (formatted as a
+    matrix), and whether such scalars exist
     """
-    # print(expected_digit_columns)
     shape = expected_digit_columns.shape
 
     if len(shape) != 2:
@@ -303,14 +355,10 @@ def get_valid_recoded_matrix(expected_digit_columns, length):
     # Create recoding matrix with the appropriate number of columns and rows
     padding_length = length - cols
     padding_cols = np.zeros((rows, padding_length))
-    recoded_matrix = np.concatenate((expected_digit_columns, padding_cols), axis=1)
+    recoded_matrix = np.concatenate((expected_digit_columns, padding_cols), axis=1).astype(np.int8)
 
     # Some checks that the input was valid
 
-    if not _scalars_could_fit_in_uint64(recoded_matrix, cols):
-        # Assuming all "blank" signs are negative and, can they ever fit in uint64?
-        # If not, we do not bother to find a compliant recoded matrix as it does not exist
-        return recoded_matrix, False
     if recoded_matrix[0, 0] != 1:
         # raise Exception("The first bit of the sign-aligner must be zero")
         return recoded_matrix, False
@@ -326,77 +374,65 @@ def get_valid_recoded_matrix(expected_digit_columns, length):
         """
         return recoded_matrix, False
 
-    # Probability of a positive bit in free-to-fill-in positions in the padding of the sign-aligner
-    prob_pos = 1. / 5
-
-    # Fill the padding for the sign aligner with 1's and -1's at random
-    recoded_sign_aligner_padding = np.random.choice([1, -1], size=(padding_length,), p=[prob_pos, 1 - prob_pos])
-    # recoded_sign_aligner_padding = [-1] * padding_length
-    # Add this padding to the sign-aligner in the recoded matrix
-    recoded_matrix[0, cols:] = recoded_sign_aligner_padding
-
-    # Do the same for the padding of the sub-scalars (which is a matrix instead of a single array)
-    recoded_sub_scalars_padding = np.random.choice([1, 0], size=(rows - 1, padding_length), p=[prob_pos, 1 - prob_pos])
-    # recoded_sub_scalars_padding = [1] * padding_length
-    recoded_matrix[1:rows, cols:] = recoded_sub_scalars_padding
-
-    # Interpret the recoded matrix as int8 type (instead of float64)
-    recoded_matrix = recoded_matrix.astype(np.int8)
-
-    valid_decomposition, recoded_matrix = _is_valid_decomposition(recoded_matrix)
-    valid_decomposition &= scalars_fit_in_uint64(recoded_matrix)
-
-    attempts = 0
-
-    while not valid_decomposition:
-        recoded_sign_aligner = recoded_matrix[0]
-        sign_aligner_val = scalar_array_to_decimal(recoded_sign_aligner)
-        # Verify that the value of the sign-aligner is odd
-        assert sign_aligner_val & 1
-        # Verify that the value of the sign aligner fits in a 64 bit unsigned integer
-        if not sign_aligner_val <= np.iinfo(np.uint64).max or attempts >= 1000:
-            recoded_matrix[0, cols:] = np.random.choice([1, -1], size=(padding_length,), p=[prob_pos, 1 - prob_pos])
-            attempts = 0
-            continue
-        for row in range(1, recoded_matrix.shape[0]):
-            is_positive_sub_scalar = first_value_positive(np.multiply(recoded_matrix[row], recoded_sign_aligner))
-            if not is_positive_sub_scalar:
-                # Randomize padding of scalar
-                while True:
-                    recoded_matrix[row, cols:] = np.random.choice([0, 1], size=(padding_length,), p=[9. / 10, 1. / 10])
-                    sub_scalar_val = scalar_array_to_decimal(np.multiply(recoded_matrix[row], recoded_sign_aligner))
-                    if 0 < sub_scalar_val <= np.iinfo(np.uint64).max:
-                        break
-        valid_decomposition, recoded_matrix = _is_valid_decomposition(recoded_matrix)
-        valid_decomposition &= scalars_fit_in_uint64(recoded_matrix)
-        attempts += 1
-        # If this takes too long, we should randomize the sign-aligner.
-    # Apply the sign-aligner to the rows such that the signs match
-    for row in range(1, recoded_matrix.shape[0]):
-        recoded_matrix[row] *= recoded_matrix[0]
+    uint64_max = int(np.iinfo(np.uint64).max)
+    padding_range = 1 << padding_length
+    # The values of the fixed digit columns (the padding being zero), these are multiples of 2^padding_length
+    fixed_vals = matrix_to_scalars(recoded_matrix)
+
+    """
+    Let N be the value of the negative signs in the padding of the sign-aligner (N = sum 2^i with s_i = -1).
+    The sign-aligner then equals a1 = fixed_a1 + (2^padding_length - 1) - 2N, which is always odd.
+    A sub-scalar can take every value in [fixed_aj - N, fixed_aj - N + 2^padding_length - 1] (exactly once), which
+    has to intersect [0, 2^64 - 1]. As fixed_aj >= 0, this only requires N >= fixed_aj - (2^64 - 1).
+    """
+    min_negative_padding = max([0] + [fixed_val - uint64_max for fixed_val in fixed_vals[1:]])
+    min_sign_aligner = max(1, fixed_vals[0] - padding_range + 1)
+    max_sign_aligner = min(uint64_max, fixed_vals[0] + padding_range - 1 - 2 * min_negative_padding)
+    if min_sign_aligner > max_sign_aligner:
+        # Even when taking all signs in the padding negative, the scalars can not fit in an uint64
+        return recoded_matrix, False
+
+    if rng is None:
+        # Take all signs in the padding negative (if possible), this gives the most room for the sub-scalars
+        sign_aligner_val = min_sign_aligner
+    else:
+        rng = np.random.default_rng(rng)
+        # Both bounds are odd
+        sign_aligner_val = min_sign_aligner + 2 * _random_int_below(rng, (max_sign_aligner - min_sign_aligner) // 2 + 1)
+    negative_padding = (fixed_vals[0] + padding_range - 1 - sign_aligner_val) >> 1
+
+    for i in range(padding_length):
+        recoded_matrix[0, length - 1 - i] = -1 if (negative_padding >> i) & 1 else 1
+
+    for row in range(1, rows):
+        min_val = max(0, fixed_vals[row] - negative_padding)
+        max_val = min(uint64_max, fixed_vals[row] - negative_padding + padding_range - 1)
+        if rng is None:
+            # A zero padding gives the value of the fixed digit columns
+            sub_scalar_val = min(fixed_vals[row], max_val)
+        else:
+            sub_scalar_val = min_val + _random_int_below(rng, max_val - min_val + 1)
+        # The padding digit at index i is non-zero iff bit i of the padding value (offset by N) differs from that of N
+        padding_val = sub_scalar_val - fixed_vals[row] + negative_padding
+        for i in range(padding_length):
+            is_non_zero = ((padding_val ^ negative_padding) >> i) & 1
+            recoded_matrix[row, length - 1 - i] = is_non_zero * recoded_matrix[0, length - 1 - i]
     return recoded_matrix, True
 
 
-def _is_valid_decomposition(recoded_matrix):
+def _random_int_below(rng, bound):
     """
-    Cheks whether the current recoding matrix is valid with  respect to positive sub-scalars.
-    :param recoded_matrix: The recoded matrix
-    :param padding_length: The padding length (the amount of padding compared to the number of digit columns given)
-    :return:
+    Draw a uniformly random integer in [0, bound) using rejection sampling, as bound may exceed the range of np.int64.
+    :param rng: The np.random.Generator to use
+    :param bound: The exclusive upper bound (at least 1)
+    :return: The random integer
     """
-    recoded_sign_aligner = recoded_matrix[0]
-    valid_decomposition = True
-    # Loop through the rows (i.e the recoded scalars in our recoded matrix) but not sign-aligner
-    for row in range(1, recoded_matrix.shape[0]):
-        # Multiply the recoded multi scalar with the sign aligner
-        recoded_matrix[row] *= recoded_sign_aligner
-        # Calculate the original value of the scalar
-        # This method seems to overflow, so we just check the first sign of the first bit we encounter
-        # scalar_val = recoded_matrix[i].dot(2 ** np.arange(recoded_matrix[i].size)[::-1])
-        if not first_value_positive(recoded_matrix[row]):
-            valid_decomposition &= False
-        recoded_matrix[row] = np.abs(recoded_matrix[row])
-    return valid_decomposition, recoded_matrix
+    nr_of_bits = (bound - 1).bit_length()
+    while True:
+        bits = rng.integers(0, 2, size=nr_of_bits)
+        val = sum(int(bit) << i for i, bit in enumerate(bits))
+        if val < bound:
+            return val
 
 
 def _verify_signs(recoded_matrix):
@@ -452,35 +488,6 @@ def _verify_positive_sub_scalars(recoded_matrix):
     return True
 
 
-def _scalars_could_fit_in_uint64(recoded_matrix, nr_of_fixed_cols):
-    """
-    Given the number of fixed digit columns (starting from d_64 and s_64), check whether it is possible
-    to fit all of the scalars in an unsigned 64 bit integer.
-    :param recoded_matrix: The recoded matrix
-    :param nr_of_fixed_cols: The number of fixed digit columns
-    :return: True if the scalars values in the recoded matrix could fit in an uint64 by filling in the
-    unfixed digit columns with negative values, False otherwise.
-    """
-    for row in range(recoded_matrix.shape[0]):
-        scalar = recoded_matrix[row]
-        scalar_val = scalar_array_to_decimal(scalar)
-        if scalar_val == 0:
-            continue
-        if scalar_val < 0:
-            return False
-        # As know that the scalar must be positive, we can deterimee if it can fit in an uint64 by
-        # filling in the remaining entries (where we assume that the sign will be negative)
-        tmp_scalar = scalar[:nr_of_fixed_cols]
-        nr_of_unfixed_cols = len(scalar) - nr_of_fixed_cols
-        tmp_scalar = np.append(tmp_scalar, [-1] * nr_of_unfixed_cols)
-        tmp_scalar_val = scalar_array_to_decimal(tmp_scalar)
-        if 0 <= tmp_scalar_val <= np.iinfo(np.uint64).max:
-            continue
-        else:
-            return False
-    return True
-
-
 @preconditions(
     lambda value: 0 <= value <= 2 ** 3 - 1
 )
@@ -506,6 +513,28 @@ def generate_digit_column_for_value(value, sign):
     return digit_column
 
 
+def digit_column_value(digit_column):
+    """
+    The inverse of generate_digit_column_for_value: the value of a digit column, independent of its sign
+    :param digit_column: A digit column (4 x 1 matrix, or 4 digits) with the sign in the first row
+    :return: The value (0 <= value < 8) of the digit column
+    """
+    digits = np.asarray(digit_column).reshape(4)
+    return int(np.dot(np.abs(digits[1:]), [1, 2, 4]))
+
+
+def digit_column_class(value, sign):
+    """
+    The class of a digit column, as used to label profiling traces, to index the Gaussian templates and to store the
+    template traces of a campaign: 8 classes per sign, the negative ones (0, ..., 7) before the positive ones (8, ...,
+    15). Also works element-wise on arrays of values and signs.
+    :param value: The value of the digit column (see digit_column_value)
+    :param sign: The sign of the digit column
+    :return: The class of the digit column
+    """
+    return (np.asarray(sign) > 0) * 8 + value
+
+
 @preconditions(
     lambda recoded_matrix: isinstance(recoded_matrix, np.ndarray),
 )
@@ -88,6 +88,8 @@ class Lecroy(metaclass=Singleton):
         command = "LeCroy.ActiveDSOCtrl.1"
         self._scope = win32com.client.Dispatch(command)
         self.ip_address = ip_address
+        # The time-out time of the control in seconds (ActiveDSO can not be queried for it, 10 is its default)
+        self.transfers_timeout = 10
         self.connect()
         # Intel systems us least-significant byte order
         self.set_communication_order(use_big_endian=False)
@@ -816,6 +818,7 @@ class Lecroy(metaclass=Singleton):
         :param seconds: Time-out time in seconds
         """
         self._scope.SetTimeout(seconds)
+        self.transfers_timeout = seconds
 
     def get_log_info(self, clear=True):
         command = "CHL? {}".format("CLR" if clear else "")
@@ -823,11 +826,20 @@ class Lecroy(metaclass=Singleton):
         response = self._scope.ReadString(np.iinfo(np.int_).max)
         return response
 
-    def wait_lecroy(self):
+    def wait_lecroy(self, timeout=None):
         """
         The WaitForOPC method may be used to wait for previous commands to be interpreted before continuing.
+        :param timeout: The maximum number of seconds to wait, by default the time-out time of the control (see
+        set_transfers_timeout), which is restored afterwards
+        :return: Whether the previous commands were completed before the timeout
         """
-        return self._scope.WaitForOPC()
+        if timeout is None or timeout == self.transfers_timeout:
+            return self._scope.WaitForOPC()
+        self._scope.SetTimeout(timeout)
+        try:
+            return self._scope.WaitForOPC()
+        finally:
+            self._scope.SetTimeout(self.transfers_timeout)
 
     def reset_lecroy(self):
         """
@@ -889,8 +901,27 @@ class Lecroy(metaclass=Singleton):
         :return:
         :rtype:
         """
+        return self.decode_trace(self.transfer_trace(channel))
+
+    def transfer_trace(self, channel="C1"):
+        """
+        Transfer the raw 8-bit waveform of the last acquisition, without interpreting it (see decode_trace).
+        Once this returns, the oscilloscope can be armed for the next acquisition.
+        :param channel: The channel to transfer the waveform from
+        :return: The raw waveform bytes (shifted by 128)
+        """
         channel_out = self.get_raw_signal(channel, use_word_data_format=False)
         self.enable_wait_lecroy_acquisition(timeout=5)
+        return channel_out
+
+    @staticmethod
+    def decode_trace(channel_out):
+        """
+        Interpret a raw waveform as returned by transfer_trace. This does not communicate with the oscilloscope, so it
+        can be done in another thread.
+        :param channel_out: The raw waveform bytes
+        :return: The interpreted waveform
+        """
         channel_out_interpreted = np.frombuffer(channel_out, dtype="uint8")
         # GetByteWaveform shifts the result with 128 such that it fits in Visual Basic's unsigned byte type
         # We shift it back by: converting to normal int type, apply shift, and convert to signed int8 format
@@ -899,6 +930,64 @@ class Lecroy(metaclass=Singleton):
         channel_out_interpreted.astype(np.int8)
         return channel_out_interpreted
 
+    def set_sequence_mode(self, nr_of_segments: int, max_samples_per_segment: int = None):
+        """
+        Enable sequence mode, in which every trigger is acquired in a separate segment of the acquisition memory.
+        :param nr_of_segments: The number of segments to acquire before the acquisition is complete
+        :param max_samples_per_segment: The maximum number of samples per segment (None keeps the current setting)
+        """
+        command = "SEQ ON,{}".format(nr_of_segments)
+        if max_samples_per_segment is not None:
+            command += ",{}".format(max_samples_per_segment)
+        self._scope.WriteString(command, True)
+
+    def disable_sequence_mode(self):
+        """
+        Disable sequence mode, such that every trigger results in a single waveform again.
+        """
+        command = "SEQ OFF"
+        self._scope.WriteString(command, True)
+
+    def prepare_for_segmented_capture(self, nr_of_segments: int):
+        """
+        Prepare for the acquisition of nr_of_segments traces in sequence mode. The oscilloscope is armed for a single
+        sequence acquisition, which completes after nr_of_segments triggers.
+        :param nr_of_segments: The number of segments (i.e. traces) to acquire
+        """
+        self.set_sequence_mode(nr_of_segments)
+        self.enable_wait_lecroy_acquisition()
+        time.sleep(0.300)
+        self.clear_sweeps()
+        self.set_trigger_mode("SINGLE")
+
+    def acquire_segmented_traces(self, channel: str, nr_of_segments: int):
+        """
+        Acquire all segments of a sequence acquisition (see prepare_for_segmented_capture) using a single waveform
+        transfer.
+        :param channel: The channel to acquire the segments from
+        :param nr_of_segments: The number of acquired segments
+        :return: An (nr_of_segments, samples) array with the interpreted waveform of every segment
+        """
+        # Segment number 0 in the waveform transfer setup (see get_raw_signal) transfers all segments
+        return self.decode_segmented_trace(self.transfer_trace(channel), nr_of_segments)
+
+    @staticmethod
+    def decode_segmented_trace(channel_out, nr_of_segments: int):
+        """
+        Interpret the raw waveform of a sequence acquisition, in which the segments are stored one after the other.
+        :param channel_out: The raw waveform bytes of all segments
+        :param nr_of_segments: The number of segments
+        :return: An (nr_of_segments, samples) array with the interpreted waveform of every segment
+        """
+        channel_out_interpreted = np.frombuffer(channel_out, dtype="uint8")
+        if len(channel_out_interpreted) % nr_of_segments != 0:
+            raise Exception("The waveform of {} bytes can not be split in {} segments of equal length.".format(
+                len(channel_out_interpreted), nr_of_segments))
+        # Undo the shift by 128 of GetByteWaveform (see decode_trace)
+        channel_out_interpreted = channel_out_interpreted.reshape(nr_of_segments, -1).astype(int)
+        channel_out_interpreted -= 128
+        return channel_out_interpreted
+
     def write_file(self, file_name, directory, content):
         """
         A directory is a "folder", a place where you can put files or other directories
@@ -206,32 +206,58 @@ class TraceSetCoding(object):
             raise AssertionError("Valid values for the sample length are 1, 2 and 4")
         # Add the title into the title space (also check that it does not exceed the number of bytes available for this)
         encoded_trace = bytearray()
-        if title is None:
-            # If there is not title specified, we fill the title space with spaces
-            encoded_trace.extend((bytearray([0x20] * title_space_len)))
-        else:
-            # Convert string to bytes
-            title_as_bytes = bytes(title, 'utf-8')
-            encoded_title = (bytearray([0x20] * title_space_len))
-            # See https://stackoverflow.com/questions/4013230/how-many-bytes-does-a-string-have
-            if len(title_as_bytes) < len(encoded_title):
-                # see https://stackoverflow.com/questions/10633881/how-to-copy-a-python-bytearray-buffer
-                # As the num
-                encoded_title[0:len(title_as_bytes)] = title_as_bytes
-            else:
-                encoded_title = title_as_bytes[0:title_space_len]
-
-            encoded_trace.extend(encoded_title)
+        encoded_trace.extend(self._encode_title(title, title_space_len))
 
         # Add the data bytes
         if data_bytes is not None:
             encoded_trace.extend(data_bytes)
         # Add the samples
-        for sample in np.nditer(samples):
-            encoded_sample = self._encode_sample(sample, sample_data_type, sample_length)
-            encoded_trace.extend(encoded_sample)
+        encoded_trace.extend(self._encode_samples(samples, sample_data_type, sample_length))
         return encoded_trace
 
+    @staticmethod
+    def _encode_title(title: Optional[str], title_space_len: int) -> bytearray:
+        """
+        Encode the title of a trace into the title space, the title is padded with spaces or truncated to fit.
+        :param title: The title (None leaves the title space empty)
+        :param title_space_len: The title space reserved per trace
+        :return: The encoded title of exactly title_space_len bytes
+        """
+        # If there is not title specified, we fill the title space with spaces
+        encoded_title = bytearray([0x20] * title_space_len)
+        if title is not None:
+            # Convert string to bytes
+            title_as_bytes = bytes(title, 'utf-8')[0:title_space_len]
+            encoded_title[0:len(title_as_bytes)] = title_as_bytes
+        return encoded_title
+
+    @staticmethod
+    def _get_sample_dtype(sample_data_type: int, sample_length: int) -> np.dtype:
+        """
+        Get the (little endian) numpy data type corresponding to the sample coding
+        :param sample_data_type: The data type of the samples: integer (0) or floating point (1)
+        :param sample_length: The length of each sample in bytes
+        :return: The numpy data type
+        """
+        if sample_data_type not in [0, 1]:
+            raise AssertionError("The sample type should be integer (0) or floating point (1)")
+        if sample_length not in [1, 2, 4]:
+            raise AssertionError("Valid values for the sample length are 1, 2 and 4")
+        if sample_data_type == 1 and sample_length != 4:
+            raise Exception("A sample encoded as a float needs to have a sample length of 4 bytes")
+        return np.dtype(("<f" if sample_data_type == 1 else "<i") + str(sample_length))
+
+    def _encode_samples(self, samples: np.ndarray, sample_data_type: int, sample_length: int) -> bytes:
+        """
+        Encode all samples at once based on the provided data type and sample length
+        (see _encode_sample for a single sample)
+        :param samples: The samples
+        :param sample_data_type: The data type to store the samples in: integer (0) or floating point (1)
+        :param sample_length: The length of each sample in bytes
+        :return: The encoded samples
+        """
+        return np.asarray(samples).astype(self._get_sample_dtype(sample_data_type, sample_length), copy=False).tobytes()
+
     def _encode_sample(self, sample: int, sample_data_type: int, sample_length: int):
         """
         Encode the sample based on the provided data type and sample length
@@ -298,3 +324,192 @@ class TraceSetCoding(object):
                                                trace_data_bytes)
             trs_file_content.extend(trace_encoded)
         return trs_file_content
+
+
+class TrsWriter(object):
+    """
+    Write a trace set (see TraceSetCoding) to a file, one trace at a time. The header is written once, the samples of
+    each trace are written directly from the numpy array and the number of traces in the header is updated on close.
+    """
+
+    # The number of traces is the value of the first TLV triple (after its tag and length byte) in the header
+    _nr_of_traces_offset = 2
+
+    def __init__(self, path: str, samples_per_trace: int, sample_type: int = 0, sample_length: int = 1,
+                 nr_of_data_bytes: int = 0, title_space_len: int = 20,
+                 global_trace_title: str = "FourQ power trace"):
+        """
+        :param path: The path of the trs file, which is overwritten if it exists
+        :param samples_per_trace: The number of samples per trace
+        :param sample_type: The type of the samples: integer (0) or floating point (1)
+        :param sample_length: The number of bytes a sample consists of
+        :param nr_of_data_bytes: The number of data bytes stored with each trace
+        :param title_space_len: The title space reserved per trace
+        :param global_trace_title: The global trace title
+        """
+        self.samples_per_trace = samples_per_trace
+        self.nr_of_data_bytes = nr_of_data_bytes
+        self.title_space_len = title_space_len
+        self.nr_of_traces = 0
+        self._trace_set_coding = TraceSetCoding()
+        self._sample_dtype = self._trace_set_coding._get_sample_dtype(sample_type, sample_length)
+        sample_coding = self._trace_set_coding._get_sample_coding(sample_type, sample_length)
+        header = self._trace_set_coding._encode_header(0, samples_per_trace, sample_coding, nr_of_data_bytes,
+                                                       title_space_len, global_trace_title)
+        self._file = open(path, "wb")
+        self._file.write(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write_trace(self, samples: np.ndarray, title: Optional[str] = None,
+                    data_bytes: Optional[Union[bytes, bytearray]] = None):
+        """
+        Append a trace to the trace set.
+        :param samples: The samples of the trace (converted to the sample coding of the trace set)
+        :param title: The title of the trace
+        :param data_bytes: The data bytes related to the trace (exactly nr_of_data_bytes bytes)
+        """
+        samples = np.asarray(samples)
+        if samples.size != self.samples_per_trace:
+            raise Exception("Expected {} samples, but the trace has {} samples".format(self.samples_per_trace,
+                                                                                      samples.size))
+        data_bytes = data_bytes if data_bytes is not None else b""
+        if len(data_bytes) != self.nr_of_data_bytes:
+            raise Exception("Expected {} data bytes, but got {} data bytes".format(self.nr_of_data_bytes,
+                                                                                  len(data_bytes)))
+        self._file.write(self._trace_set_coding._encode_title(title, self.title_space_len))
+        self._file.write(data_bytes)
+        samples = np.ascontiguousarray(samples.astype(self._sample_dtype, copy=False))
+        # Write straight from the buffer of the array
+        self._file.write(memoryview(samples).cast("B"))
+        self.nr_of_traces += 1
+
+    def close(self):
+        """
+        Write the number of traces into the header and close the file.
+        """
+        if self._file.closed:
+            return
+        self._file.seek(self._nr_of_traces_offset)
+        self._file.write(struct.pack("<i", self.nr_of_traces))
+        self._file.close()
+
+
+class TrsReader(object):
+    """
+    Read a trace set (see TraceSetCoding) without loading it into memory: the traces, titles and data bytes are views
+    on a memory-mapped file.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: The path of the trs file
+        """
+        self.path = path
+        self.header = {}
+        tag_names = {}
+        for _, tags, _ in TraceSetCoding.trace_set_coding_objects.values():
+            tag_names.update({tag: name for name, tag in tags.items()})
+        with open(path, "rb") as f:
+            while True:
+                tag = f.read(1)
+                if len(tag) == 0:
+                    raise Exception("The end of the header (TB) is missing")
+                tag = tag[0]
+                length = f.read(1)[0]
+                # If bit 8 of the length is set, the remaining 7 bits indicate the number of additional length bytes
+                if length & 0x80:
+                    length = int.from_bytes(f.read(length & 0x7F), byteorder="little")
+                value = f.read(length)
+                if tag == TraceSetCoding.trace_set_coding_objects["Misc"][1]["TB"]:
+                    break
+                self.header[tag_names.get(tag, tag)] = value
+            self.header_length = f.tell()
+            file_size = f.seek(0, 2)
+
+        self.samples_per_trace = int.from_bytes(self.header["NS"], byteorder="little", signed=True)
+        sample_coding = self.header["SC"][0]
+        self.sample_type = (sample_coding >> 4) & 1
+        self.sample_length = sample_coding & 0x0F
+        self.nr_of_data_bytes = int.from_bytes(self.header.get("DS", b""), byteorder="little", signed=True)
+        self.title_space_len = int.from_bytes(self.header.get("TS", b""), byteorder="little", signed=True)
+        self.global_trace_title = self.header.get("GT", b"").decode("utf8")
+
+        fields = []
+        if self.title_space_len > 0:
+            fields.append(("title", "S{}".format(self.title_space_len)))
+        if self.nr_of_data_bytes > 0:
+            fields.append(("data", np.uint8, (self.nr_of_data_bytes,)))
+        sample_dtype = TraceSetCoding._get_sample_dtype(self.sample_type, self.sample_length)
+        fields.append(("samples", sample_dtype, (self.samples_per_trace,)))
+        self._record_dtype = np.dtype(fields)
+
+        self.nr_of_traces = int.from_bytes(self.header["NT"], byteorder="little", signed=True)
+        nr_of_stored_traces = (file_size - self.header_length) // self._record_dtype.itemsize
+        if self.nr_of_traces == 0:
+            # The number of traces is only known once the trace set is complete (see TrsWriter.close)
+            self.nr_of_traces = nr_of_stored_traces
+        elif self.nr_of_traces > nr_of_stored_traces:
+            raise Exception("The header specifies {} traces, but the file only contains {} traces".format(
+                self.nr_of_traces, nr_of_stored_traces))
+
+        if self.nr_of_traces > 0:
+            self._records = np.memmap(path, dtype=self._record_dtype, mode="r", offset=self.header_length,
+                                      shape=(self.nr_of_traces,))
+        else:
+            self._records = np.zeros(0, dtype=self._record_dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.nr_of_traces
+
+    def __getitem__(self, item):
+        return self.traces[item]
+
+    def __iter__(self):
+        return iter(self.traces)
+
+    @property
+    def traces(self) -> np.ndarray:
+        """
+        :return: An (NT, NS) view on the samples of all traces
+        """
+        return self._records["samples"]
+
+    @property
+    def data_bytes(self) -> np.ndarray:
+        """
+        :return: An (NT, DS) view on the data bytes of all traces
+        """
+        if self.nr_of_data_bytes == 0:
+            return np.zeros((self.nr_of_traces, 0), dtype=np.uint8)
+        return self._records["data"]
+
+    def get_title(self, idx: int) -> str:
+        """
+        :param idx: The index of the trace
+        :return: The title of the trace (without the padding)
+        """
+        if self.title_space_len == 0:
+            return ""
+        return self._records["title"][idx].decode("utf8", errors="replace").rstrip(" ")
+
+    @property
+    def titles(self) -> List[str]:
+        return [self.get_title(idx) for idx in range(self.nr_of_traces)]
+
+    def close(self):
+        """
+        Release the memory map of this reader. The file is unmapped once the views obtained from it are gone as well.
+        """
+        self._records = np.zeros(0, dtype=self._record_dtype)
+        self.nr_of_traces = 0
@@ -0,0 +1,103 @@
+import numpy as np
+
+from online_template_attack import trace_statistics
+
+
+class AdaptiveTemplateAcquisition:
+    """
+    Capture the template traces of a digit column adaptively: the templates are captured round-robin in small batches,
+    and after every round the running means of the templates are scored (correlated with the target trace). Only the
+    candidates that are still ambiguous receive traces in the next round, and the acquisition stops as soon as the best
+    candidate beats the runner-up with confidence, or when the ambiguous candidates have reached the maximum number of
+    traces.
+    A candidate is ambiguous when the best score does not exceed its score by the margin plus `confidence` standard
+    errors. The standard error of the correlation of a mean trace follows from the noise left in that mean: it is
+    approximately sqrt(noise variance / (S * total variance)) of the mean trace (estimated over all its samples), with S
+    the number of correlated samples. Neighbouring samples of oversampled traces are not independent, in which case S
+    should be lowered accordingly.
+    """
+
+    def __init__(self, score_templates, margin=0.0, confidence=3.0, batch_size=2, min_traces_per_candidate=2,
+                 max_traces_per_candidate=32, nr_of_scored_samples=None):
+        """
+        :param score_templates: Function returning the correlation coefficient of every given (mean) template trace
+        :param margin: The minimum difference by which the best candidate has to beat the runner-up
+        :param confidence: The number of standard errors by which the best candidate has to beat the runner-up (on top
+        of the margin)
+        :param batch_size: The number of traces captured per ambiguous candidate in every round
+        :param min_traces_per_candidate: The number of traces every candidate gets before it can be discarded
+        :param max_traces_per_candidate: The maximum number of traces captured per candidate
+        :param nr_of_scored_samples: The number of (independent) samples that are correlated by score_templates, by
+        default the length of the traces
+        """
+        if not 0 < min_traces_per_candidate <= max_traces_per_candidate:
+            raise Exception("Invalid number of traces per candidate: min {}, max {}".format(
+                min_traces_per_candidate, max_traces_per_candidate))
+        self.score_templates = score_templates
+        self.margin = margin
+        self.confidence = confidence
+        self.batch_size = batch_size
+        self.min_traces_per_candidate = min_traces_per_candidate
+        self.max_traces_per_candidate = max_traces_per_candidate
+        self.nr_of_scored_samples = nr_of_scored_samples
+
+    def standard_error(self, accumulator):
+        """
+        :param accumulator: The accumulator of the traces of a candidate
+        :return: The approximate standard error of the correlation coefficient of the mean trace of the candidate
+        """
+        if accumulator.count < 2:
+            # Without an estimate of the noise, the score can not be trusted at all
+            return np.inf
+        noise_variance = np.mean(accumulator.variance) / accumulator.count
+        total_variance = np.var(accumulator.mean)
+        if total_variance == 0:
+            return 0.0 if noise_variance == 0 else np.inf
+        nr_of_samples = self.nr_of_scored_samples or accumulator.nr_of_samples
+        return float(np.sqrt(min(noise_variance / total_variance, 1) / nr_of_samples))
+
+    def ambiguous_candidates(self, scores, standard_errors=None):
+        """
+        :param scores: The score of every candidate
+        :param standard_errors: The standard error of every score (all 0 by default)
+        :return: The indices of the best candidate and of the candidates it does not beat with confidence (all
+        candidates if none of them has a valid score)
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        if np.all(np.isnan(scores)):
+            return list(range(len(scores)))
+        standard_errors = np.zeros(len(scores)) if standard_errors is None else np.asarray(standard_errors)
+        best_idx = np.nanargmax(scores)
+        # Candidates without a valid score can not win
+        differences = np.nan_to_num(scores[best_idx] - scores, nan=np.inf)
+        thresholds = self.margin + self.confidence * np.sqrt(standard_errors[best_idx] ** 2 + standard_errors ** 2)
+        return [idx for idx in range(len(scores)) if idx == best_idx or differences[idx] <= thresholds[idx]]
+
+    def run(self, nr_of_candidates, capture_traces):
+        """
+        Capture the template traces of the given number of candidates.
+        :param nr_of_candidates: The number of candidates (templates)
+        :param capture_traces: Function called as capture_traces(candidate_indices), which captures a trace for every
+        given candidate index (in this order) and returns the list of traces
+        :return: (mean_traces, scores, nr_of_traces), with the average template trace, the final score and the number
+        of captured traces of every candidate
+        """
+        accumulators = [trace_statistics.TraceAccumulator() for _ in range(nr_of_candidates)]
+        scores = np.full(nr_of_candidates, np.nan)
+        ambiguous = list(range(nr_of_candidates))
+        while len(ambiguous) > 1 or all(accumulator.count == 0 for accumulator in accumulators):
+            candidate_indices = []
+            for idx in ambiguous:
+                nr_of_traces = accumulators[idx].count
+                nr_of_new_traces = min(max(self.batch_size, self.min_traces_per_candidate - nr_of_traces),
+                                       self.max_traces_per_candidate - nr_of_traces)
+                candidate_indices += [idx] * nr_of_new_traces
+            if not candidate_indices:
+                break
+            for idx, trace in zip(candidate_indices, capture_traces(candidate_indices)):
+                accumulators[idx].add(trace)
+            scores = np.asarray(self.score_templates([accumulator.mean for accumulator in accumulators]))
+            ambiguous = self.ambiguous_candidates(scores, [self.standard_error(accumulator)
+                                                           for accumulator in accumulators])
+        return ([accumulator.mean if accumulator.count > 0 else None for accumulator in accumulators], scores,
+                np.array([accumulator.count for accumulator in accumulators]))
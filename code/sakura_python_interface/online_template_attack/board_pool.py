@@ -0,0 +1,194 @@
+import collections
+import multiprocessing
+import queue
+import traceback
+
+from sakura_g import ftdi_interface
+
+# A board of the pool: the serial number of its control FPGA, and the IP address and channel of the oscilloscope that
+# captures its power consumption
+Board = collections.namedtuple("Board", ["serial_no", "scope_address", "channel"])
+
+
+def discover_boards(scope_addresses, channels=("C3",), exclude=()):
+    """
+    Pair the control FPGAs of all connected SAKURA-G boards (in the order in which they are found) with the given
+    oscilloscopes and channels: every oscilloscope is used for one board before a second channel of it is used.
+    :param scope_addresses: The IP addresses of the oscilloscopes
+    :param channels: The channels of every oscilloscope that can be used
+    :param exclude: The serial numbers of control FPGAs that are not to be used (e.g. the one of the main process)
+    :return: A list with the Boards, at most one per combination of oscilloscope and channel
+    """
+    control_fpgas = [serial_no for serial_no in ftdi_interface.list_control_fpgas() if serial_no not in exclude]
+    captures = [(scope_address, channel) for channel in channels for scope_address in scope_addresses]
+    if len(control_fpgas) > len(captures):
+        print("[*] Only {} of the {} boards can be used with the given oscilloscope channels".format(
+            len(captures), len(control_fpgas)))
+    return [Board(serial_no, scope_address, channel)
+            for serial_no, (scope_address, channel) in zip(control_fpgas, captures)]
+
+
+def _run_board(board, setup_board, setup_args, capture, jobs, results, scope_lock):
+    """
+    The worker process of a board: set up the board and capture jobs from the job queue until the sentinel (None)
+    """
+    try:
+        state = setup_board(board, *setup_args)
+    except Exception:
+        results.put((None, board, None, traceback.format_exc()))
+        return
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_idx, payload = job
+        try:
+            if scope_lock is not None:
+                # Boards sharing an oscilloscope can not capture at the same time
+                with scope_lock:
+                    result = capture(state, board, payload)
+            else:
+                result = capture(state, board, payload)
+            results.put((job_idx, board, result, None))
+        except Exception:
+            results.put((job_idx, board, None, traceback.format_exc()))
+
+
+class BoardPool:
+    """
+    Drive several SAKURA-G boards in parallel: every board gets its own worker process (the FTDI and oscilloscope
+    interfaces are one instance per process), which sets up its board once and then takes capture jobs from a shared
+    job queue, such that faster boards take more jobs. The results are passed back to the main process, which is the
+    only one writing them (e.g. to the trace store of the campaign).
+    The worker processes are spawned, so setup_board and capture have to be functions at the top level of a module.
+    """
+
+    def __init__(self, boards, setup_board, capture, setup_args=(), result_timeout=600):
+        """
+        :param boards: The Boards of the pool
+        :param setup_board: Called (in the worker process) as setup_board(board, *setup_args), connecting to the board
+        and its oscilloscope, and returning the state passed to capture
+        :param capture: Called (in the worker process) as capture(state, board, payload) for every job, returning the
+        result of the job (e.g. the captured traces)
+        :param setup_args: The additional (picklable) arguments of setup_board
+        :param result_timeout: The maximum number of seconds to wait for the next result
+        """
+        if not boards:
+            raise Exception("A board pool needs at least one board")
+        self.boards = list(boards)
+        self.setup_board = setup_board
+        self.capture = capture
+        self.setup_args = tuple(setup_args)
+        self.result_timeout = result_timeout
+        self._processes = []
+        self._jobs = None
+        self._results = None
+        self._scope_locks = {}
+        self._next_job_idx = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return len(self.boards)
+
+    def start(self):
+        """
+        Start the worker process of every board
+        """
+        context = multiprocessing.get_context("spawn")
+        self._jobs = context.Queue()
+        self._results = context.Queue()
+        scope_addresses = [board.scope_address for board in self.boards]
+        # The locks are kept for the lifetime of the workers, as a spawned worker only attaches to a lock while starting
+        self._scope_locks = {scope_address: context.Lock() for scope_address in set(scope_addresses)
+                             if scope_addresses.count(scope_address) > 1}
+        for board in self.boards:
+            process = context.Process(target=_run_board, args=(board, self.setup_board, self.setup_args, self.capture,
+                                                               self._jobs, self._results,
+                                                               self._scope_locks.get(board.scope_address)),
+                                      daemon=True)
+            process.start()
+            self._processes.append(process)
+
+    def run(self, payloads, on_result=None, in_parallel=None):
+        """
+        Run a job for every payload on the boards of the pool, and wait until all of them are done.
+        :param payloads: The (picklable) payloads of the jobs
+        :param on_result: Called as on_result(index, board, result) for every job, in order of completion
+        :param in_parallel: Called (without arguments) once the jobs are queued, while the boards of the pool work on
+        them, e.g. to capture on the board of the main process as well
+        :return: The results of the jobs, in the order of the payloads
+        """
+        if not self._processes:
+            raise Exception("The board pool has not been started")
+        first_job_idx = self._next_job_idx
+        payloads = list(payloads)
+        for payload in payloads:
+            self._jobs.put((self._next_job_idx, payload))
+            self._next_job_idx += 1
+        if in_parallel is not None:
+            try:
+                in_parallel()
+            except Exception:
+                # The results of the jobs that are already running are skipped by the next run
+                self._drop_pending_jobs()
+                raise
+
+        results = [None] * len(payloads)
+        nr_of_results = 0
+        while nr_of_results < len(payloads):
+            job_idx, board, result, error = self._next_result()
+            if job_idx is not None and job_idx < first_job_idx:
+                # A late result of a previous run that failed
+                continue
+            if error is not None:
+                self._drop_pending_jobs()
+                raise Exception("Board {} failed{}:\n{}".format(
+                    board.serial_no, " to set up" if job_idx is None else " on job {}".format(job_idx - first_job_idx),
+                    error))
+            idx = job_idx - first_job_idx
+            results[idx] = result
+            nr_of_results += 1
+            if on_result is not None:
+                on_result(idx, board, result)
+        return results
+
+    def _drop_pending_jobs(self):
+        """
+        Remove the jobs that have not been taken by a worker yet
+        """
+        try:
+            while True:
+                self._jobs.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _next_result(self):
+        """
+        :return: The next (job_idx, board, result, error) from the workers
+        """
+        waited = 0
+        while True:
+            try:
+                return self._results.get(timeout=1)
+            except queue.Empty:
+                waited += 1
+                if not any(process.is_alive() for process in self._processes):
+                    raise Exception("All workers of the board pool have stopped")
+                if waited >= self.result_timeout:
+                    raise Exception("No result from the board pool within {} seconds".format(self.result_timeout))
+
+    def close(self):
+        """
+        Stop the worker processes once they have finished their current job
+        """
+        for _ in self._processes:
+            self._jobs.put(None)
+        for process in self._processes:
+            process.join()
+        self._processes = []
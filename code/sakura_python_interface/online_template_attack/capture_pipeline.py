@@ -0,0 +1,97 @@
+import queue
+import threading
+
+
+class CapturePipeline:
+    """
+    Capture power traces for a sequence of scalars, overlapping the different stages of a capture:
+    - a loader thread writes the next scalar to the FPGA (over FTDI) as soon as the previous scalar multiplication is
+    done, i.e. while the oscilloscope still transfers the waveform of the previous run
+    - the calling thread arms the oscilloscope, runs the scalar multiplication and transfers the raw waveform (all
+    oscilloscope calls stay in the calling thread, as the ActiveDSO control can not be shared between threads)
+    - a decoder thread interprets the raw waveforms and passes them on, while the next run is already being captured
+    The queues between the stages are bounded, such that a slow consumer does not make the raw waveforms pile up.
+    """
+
+    def __init__(self, scope, load_scalar, perform_scalar_mult, channel="C3", max_queued_traces=4):
+        """
+        :param scope: The oscilloscope (lecroy_interface.Lecroy)
+        :param load_scalar: Function loading the given scalar to the FPGA
+        :param perform_scalar_mult: Function running the scalar multiplication on the FPGA (until it is done)
+        :param channel: The channel to capture from
+        :param max_queued_traces: The maximum number of raw waveforms waiting to be decoded
+        """
+        self.scope = scope
+        self.load_scalar = load_scalar
+        self.perform_scalar_mult = perform_scalar_mult
+        self.channel = channel
+        self.max_queued_traces = max_queued_traces
+
+    def run(self, scalars, on_trace):
+        """
+        Capture a trace for every scalar. A scalar equal to the previous one is not loaded again.
+        :param scalars: The scalars to capture a trace for
+        :param on_trace: Called (from the decoder thread) as on_trace(index, trace) for every captured trace, in order
+        """
+        scalars = list(scalars)
+        # Indices of the scalars that have been loaded onto the FPGA (None signals an error in the loader), the loader
+        # is at most one scalar ahead as it waits for the FPGA to become available
+        loaded = queue.Queue()
+        raw_traces = queue.Queue(maxsize=self.max_queued_traces)
+        # Released when the FPGA is done with the loaded scalar, such that the next one can be loaded
+        fpga_available = threading.Semaphore(1)
+        stop = threading.Event()
+        errors = []
+
+        def load_scalars():
+            try:
+                previous_scalar = None
+                for idx, scalar in enumerate(scalars):
+                    fpga_available.acquire()
+                    if stop.is_set():
+                        return
+                    if idx == 0 or scalar != previous_scalar:
+                        self.load_scalar(scalar)
+                    previous_scalar = scalar
+                    loaded.put(idx)
+            except Exception as e:
+                errors.append(e)
+                loaded.put(None)
+
+        def decode_traces():
+            while True:
+                item = raw_traces.get()
+                if item is None:
+                    return
+                if errors:
+                    # Keep on draining the queue, such that the capturing thread does not block
+                    continue
+                idx, raw_trace = item
+                try:
+                    on_trace(idx, self.scope.decode_trace(raw_trace))
+                except Exception as e:
+                    errors.append(e)
+
+        loader = threading.Thread(target=load_scalars, daemon=True)
+        decoder = threading.Thread(target=decode_traces, daemon=True)
+        loader.start()
+        decoder.start()
+        try:
+            for _ in range(len(scalars)):
+                idx = loaded.get()
+                if idx is None or errors:
+                    break
+                self.scope.prepare_for_trace_capture()
+                self.perform_scalar_mult()
+                # The FPGA is done, load the next scalar while the waveform is transferred
+                fpga_available.release()
+                self.scope.wait_lecroy()
+                raw_traces.put((idx, self.scope.transfer_trace(self.channel)))
+        finally:
+            stop.set()
+            fpga_available.release()
+            raw_traces.put(None)
+            decoder.join()
+            loader.join()
+        if errors:
+            raise errors[0]
@@ -0,0 +1,171 @@
+import numpy as np
+
+
+def _result_dtype(dtype, *arrays):
+    """
+    :param dtype: The configured floating point type (np.float32 or np.float64)
+    :return: The configured type, or the complex type of the same precision if any of the arrays is complex
+    """
+    if any(np.iscomplexobj(array) for array in arrays):
+        return np.result_type(dtype, np.complex64)
+    return np.dtype(dtype)
+
+
+def normalize_rows(traces, dtype=np.float64):
+    """
+    Center every row (trace) on its mean and scale it to unit norm, such that the Pearson correlation coefficient of two
+    rows is their inner product.
+    :param traces: An (N, S) matrix (or a single trace of S samples)
+    :param dtype: The floating point type to compute in (np.float32 or np.float64)
+    :return: The normalized (N, S) matrix (rows without variance become NaN, as in np.corrcoef)
+    """
+    traces = np.atleast_2d(np.asarray(traces))
+    normalized = traces.astype(_result_dtype(dtype, traces), copy=True)
+    normalized -= normalized.mean(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalized /= np.linalg.norm(normalized, axis=1, keepdims=True)
+    return normalized
+
+
+class PearsonCorrelator:
+    """
+    Correlate templates with one or more target windows of the same length. The targets are centered and normalized
+    once, after which all Pearson correlation coefficients follow from a single matrix product.
+    """
+
+    def __init__(self, targets, dtype=np.float64):
+        """
+        :param targets: A (W, S) matrix with W target windows (or a single target window of S samples)
+        :param dtype: The floating point type to compute in (np.float32 or np.float64)
+        """
+        self.dtype = dtype
+        self.normalized_targets = normalize_rows(targets, dtype)
+
+    def correlate(self, templates):
+        """
+        :param templates: A (T, S) matrix with T templates (or a single template of S samples)
+        :return: A (W, T) matrix with the Pearson correlation coefficient of every target window and template
+        """
+        normalized_templates = normalize_rows(templates, self.dtype)
+        if normalized_templates.shape[1] != self.normalized_targets.shape[1]:
+            raise Exception("The templates have {} samples, while the target windows have {} samples".format(
+                normalized_templates.shape[1], self.normalized_targets.shape[1]))
+        # Same convention as np.corrcoef(template, target)[1, 0] for complex traces
+        correlations = self.normalized_targets @ normalized_templates.conj().T
+        return np.real_if_close(correlations) if np.iscomplexobj(correlations) else correlations
+
+
+def pearson_correlations(templates, targets, dtype=np.float64):
+    """
+    Calculate the Pearson correlation coefficients of all templates with all target windows.
+    :param templates: A (T, S) matrix with T templates (or a single template of S samples)
+    :param targets: A (W, S) matrix with W target windows (or a single target window of S samples)
+    :param dtype: The floating point type to compute in (np.float32 or np.float64)
+    :return: A (W, T) matrix with the correlation coefficients, or a vector of T coefficients for a single target
+    window
+    """
+    correlations = PearsonCorrelator(targets, dtype).correlate(templates)
+    return correlations[0] if np.ndim(targets) == 1 else correlations
+
+
+def correlate_windows(templates, target, windows, dtype=np.float64, transform=None):
+    """
+    Correlate all templates with the target at the given windows, where the same samples of templates and target are
+    correlated.
+    :param templates: The template traces (a list of traces or a (T, N) matrix)
+    :param target: The target trace
+    :param windows: A list of (offset, duration) tuples
+    :param dtype: The floating point type to compute in (np.float32 or np.float64)
+    :param transform: An optional function applied to the windowed (T, S) templates and the (S,) target (e.g. FFT)
+    :return: A (len(windows), T) matrix with the correlation coefficients of each window and template
+    """
+    correlations = np.empty((len(windows), len(templates)), dtype=np.dtype(dtype))
+    if len(templates) == 0:
+        return correlations
+    for idx, (offset, duration) in enumerate(windows):
+        template_windows = np.stack([template[offset:offset + duration] for template in templates])
+        target_window = target[offset:offset + duration]
+        if transform is not None:
+            template_windows = transform(template_windows)
+            target_window = transform(target_window)
+        window_correlations = pearson_correlations(template_windows, target_window, dtype)
+        if np.iscomplexobj(window_correlations):
+            correlations = correlations.astype(window_correlations.dtype, copy=False)
+        correlations[idx] = window_correlations
+    return correlations
+
+
+def sliding_correlations(templates, target_segment, dtype=np.float64):
+    """
+    Calculate the Pearson correlation coefficient of every template with every window of the target segment that has
+    the length of the templates (i.e. for every lag), using FFT based cross-correlation.
+    :param templates: A (T, S) matrix with T templates (or a single template of S samples)
+    :param target_segment: The target segment of S + L - 1 samples (for L lags)
+    :param dtype: The floating point type to compute in (np.float32 or np.float64)
+    :return: A (T, L) matrix, where entry [t, l] is the correlation of template t with target_segment[l:l + S]
+    """
+    normalized_templates = normalize_rows(templates, dtype)
+    target_segment = np.asarray(target_segment, dtype=np.dtype(dtype))
+    nr_of_samples = normalized_templates.shape[1]
+    nr_of_lags = len(target_segment) - nr_of_samples + 1
+    if nr_of_lags < 1:
+        raise Exception("The target segment ({} samples) is shorter than the templates ({} samples)".format(
+            len(target_segment), nr_of_samples))
+
+    # As the templates are centered, correlating with the (not centered) target windows gives the covariance
+    fft_length = 1 << (len(target_segment) + nr_of_samples - 1).bit_length()
+    cross_correlation = np.fft.irfft(np.fft.rfft(target_segment, fft_length) *
+                                     np.conj(np.fft.rfft(normalized_templates, fft_length, axis=1)), fft_length, axis=1)
+    covariances = cross_correlation[:, :nr_of_lags]
+
+    # The norm of every centered target window follows from running sums of the samples and their squares
+    running_sum = np.concatenate(([0], np.cumsum(target_segment, dtype=np.float64)))
+    running_sum_of_squares = np.concatenate(([0], np.cumsum(np.square(target_segment, dtype=np.float64))))
+    window_sums = running_sum[nr_of_samples:] - running_sum[:nr_of_lags]
+    window_sums_of_squares = running_sum_of_squares[nr_of_samples:] - running_sum_of_squares[:nr_of_lags]
+    window_norms = np.sqrt(np.maximum(window_sums_of_squares - window_sums ** 2 / nr_of_samples, 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (covariances / window_norms).astype(np.dtype(dtype), copy=False)
+
+
+def lag_search_correlations(templates, target, offset, duration, max_lag, dtype=np.float64):
+    """
+    Correlate the window [offset, offset + duration) of all templates with the target shifted by every lag in
+    [-max_lag, max_lag] (as far as the target allows), and return the best lag for each template.
+    :param templates: The template traces (a list of traces or a (T, N) matrix)
+    :param target: The target trace
+    :param offset: The offset of the window
+    :param duration: The duration of the window
+    :param max_lag: The maximum shift of the target window (in samples)
+    :param dtype: The floating point type to compute in (np.float32 or np.float64)
+    :return: (peak_correlations, lags), both of length T, where lags[t] is the shift of the target window with the
+    highest correlation peak_correlations[t]
+    """
+    if len(templates) == 0:
+        return np.empty(0, dtype=np.dtype(dtype)), np.empty(0, dtype=int)
+    template_windows = np.stack([template[offset:offset + duration] for template in templates])
+    duration = template_windows.shape[1]
+    min_lag = -min(max_lag, offset)
+    max_lag = min(max_lag, len(target) - offset - duration)
+    target_segment = target[offset + min_lag:offset + duration + max_lag]
+    correlations = sliding_correlations(template_windows, target_segment, dtype)
+    # Windows without variance give NaN, which should never be the best lag
+    best_lag_indices = np.argmax(np.nan_to_num(correlations, nan=-np.inf), axis=1)
+    peak_correlations = correlations[np.arange(len(template_windows)), best_lag_indices]
+    return peak_correlations, best_lag_indices + min_lag
+
+
+def correlate_samples(templates, target, sample_indices, dtype=np.float64):
+    """
+    Correlate all templates with the target at the given samples only (e.g. the points of interest of an operation).
+    :param templates: The template traces (a list of traces or a (T, N) matrix)
+    :param target: The target trace
+    :param sample_indices: The indices of the samples to correlate
+    :param dtype: The floating point type to compute in (np.float32 or np.float64)
+    :return: The correlation coefficient of every template
+    """
+    if len(templates) == 0:
+        return np.empty(0, dtype=np.dtype(dtype))
+    sample_indices = np.asarray(sample_indices)
+    template_samples = np.stack([np.asarray(template)[sample_indices] for template in templates])
+    return pearson_correlations(template_samples, np.asarray(target)[sample_indices], dtype)
@@ -0,0 +1,143 @@
+import numpy as np
+
+from utils import files
+
+DEFAULT_TEMPLATES_PATH = files.get_full_path("online_template_attack", "gaussian_templates.npz")
+
+
+class ClassCovarianceAccumulator:
+    """
+    Accumulate the mean vector and the scatter matrix (sum of outer products of the deviations from the mean) of every
+    class at a fixed set of samples (the points of interest), from which the pooled covariance matrix follows. Batches of
+    observations are merged with Chan et al.'s parallel algorithm, so memory is independent of the number of traces.
+    """
+
+    def __init__(self, nr_of_classes, nr_of_samples):
+        """
+        :param nr_of_classes: The number of classes (labels are 0, ..., nr_of_classes - 1)
+        :param nr_of_samples: The number of samples of an observation
+        """
+        self.counts = np.zeros(nr_of_classes, dtype=np.int64)
+        self.means = np.zeros((nr_of_classes, nr_of_samples))
+        self.scatters = np.zeros((nr_of_classes, nr_of_samples, nr_of_samples))
+
+    def add(self, observations, labels):
+        """
+        Add a batch of observations.
+        :param observations: An (N, P) matrix with an observation in every row (or a single observation)
+        :param labels: The N class labels of the observations (or a single label)
+        """
+        observations = np.atleast_2d(np.asarray(observations, dtype=np.float64))
+        labels = np.atleast_1d(labels)
+        for label in np.unique(labels):
+            class_observations = observations[labels == label]
+            count = len(class_observations)
+            mean = class_observations.mean(axis=0)
+            deviations = class_observations - mean
+            scatter = deviations.T @ deviations
+            total_count = self.counts[label] + count
+            delta = mean - self.means[label]
+            self.scatters[label] += scatter + np.outer(delta, delta) * (self.counts[label] * count / total_count)
+            self.means[label] += delta * (count / total_count)
+            self.counts[label] = total_count
+
+    @property
+    def pooled_covariance(self) -> np.ndarray:
+        """
+        :return: The covariance matrix pooled over all classes (assuming the noise does not depend on the class)
+        """
+        nr_of_classes = np.count_nonzero(self.counts)
+        degrees_of_freedom = self.counts.sum() - nr_of_classes
+        if degrees_of_freedom <= 0:
+            raise Exception("Not enough observations to estimate the pooled covariance")
+        return self.scatters.sum(axis=0) / degrees_of_freedom
+
+
+class GaussianTemplates:
+    """
+    Multivariate Gaussian templates with a pooled covariance matrix: every class has its own mean vector, while the
+    covariance is shared. The Cholesky factor of the covariance is computed once, after which the observations and class
+    means are whitened, and the log-likelihoods of all observations and classes follow from a single matrix product.
+    """
+
+    def __init__(self, means, pooled_covariance):
+        """
+        :param means: A (C, P) matrix with the mean vector of every class (NaN for classes without observations)
+        :param pooled_covariance: The (P, P) pooled covariance matrix
+        """
+        self.means = np.asarray(means, dtype=np.float64)
+        self.pooled_covariance = np.asarray(pooled_covariance, dtype=np.float64)
+        nr_of_samples = self.means.shape[1]
+        cholesky_factor = np.linalg.cholesky(self.pooled_covariance)
+        # Whitening: (x - mu)^T S^-1 (x - mu) = |L^-1 x - L^-1 mu|^2 with S = L L^T
+        self._whitening = np.linalg.solve(cholesky_factor, np.eye(nr_of_samples))
+        self._whitened_means = self.means @ self._whitening.T
+        self._squared_norms_of_means = np.sum(np.square(self._whitened_means), axis=1)
+        self._normalization = -0.5 * nr_of_samples * np.log(2 * np.pi) - np.sum(np.log(np.diag(cholesky_factor)))
+
+    @classmethod
+    def from_accumulator(cls, accumulator):
+        """
+        :param accumulator: The ClassCovarianceAccumulator with the profiling observations
+        :return: The templates of the accumulated classes (classes without observations get a NaN mean)
+        """
+        means = np.where(accumulator.counts[:, np.newaxis] > 0, accumulator.means, np.nan)
+        return cls(means, accumulator.pooled_covariance)
+
+    @property
+    def nr_of_classes(self):
+        return len(self.means)
+
+    def log_likelihoods(self, observations):
+        """
+        :param observations: An (N, P) matrix with an observation in every row (or a single observation)
+        :return: An (N, C) matrix with the log-likelihood of every observation under every class (or a vector of C
+        log-likelihoods for a single observation), -inf for classes without a mean
+        """
+        single_observation = np.ndim(observations) == 1
+        whitened = np.atleast_2d(np.asarray(observations, dtype=np.float64)) @ self._whitening.T
+        squared_distances = (np.sum(np.square(whitened), axis=1)[:, np.newaxis] + self._squared_norms_of_means -
+                             2 * whitened @ self._whitened_means.T)
+        log_likelihoods = self._normalization - 0.5 * np.maximum(squared_distances, 0)
+        log_likelihoods = np.where(np.isnan(log_likelihoods), -np.inf, log_likelihoods)
+        return log_likelihoods[0] if single_observation else log_likelihoods
+
+    def classify(self, observations):
+        """
+        :return: The most likely class of every observation
+        """
+        return np.argmax(np.atleast_2d(self.log_likelihoods(observations)), axis=1)
+
+
+def save_templates(dbl_templates, add_templates, dbl_pois, add_pois, path=DEFAULT_TEMPLATES_PATH):
+    """
+    Store the templates of every DBL and ADD operation, together with the points of interest they are built at.
+    :param dbl_templates: A list with the GaussianTemplates of every DBL operation
+    :param add_templates: A list with the GaussianTemplates of every ADD operation
+    :param dbl_pois: The points of interest (relative to the start of the operation) of every DBL operation
+    :param add_pois: The points of interest (relative to the start of the operation) of every ADD operation
+    :param path: The path of the .npz file
+    """
+    arrays = {}
+    for name, templates, pois in (("dbl", dbl_templates, dbl_pois), ("add", add_templates, add_pois)):
+        for idx, (operation_templates, operation_pois) in enumerate(zip(templates, pois)):
+            arrays["{}_{}_means".format(name, idx)] = operation_templates.means
+            arrays["{}_{}_covariance".format(name, idx)] = operation_templates.pooled_covariance
+            arrays["{}_{}_pois".format(name, idx)] = np.asarray(operation_pois, dtype=np.int64)
+    np.savez(path, nr_of_dbl=len(dbl_templates), nr_of_add=len(add_templates), **arrays)
+
+
+def load_templates(path=DEFAULT_TEMPLATES_PATH):
+    """
+    :param path: The path of the .npz file
+    :return: (dbl_templates, add_templates, dbl_pois, add_pois) as stored by save_templates
+    """
+    loaded = {}
+    with np.load(path) as stored:
+        for name in ("dbl", "add"):
+            nr_of_operations = int(stored["nr_of_{}".format(name)])
+            loaded[name] = ([GaussianTemplates(stored["{}_{}_means".format(name, idx)],
+                                               stored["{}_{}_covariance".format(name, idx)])
+                             for idx in range(nr_of_operations)],
+                            [stored["{}_{}_pois".format(name, idx)] for idx in range(nr_of_operations)])
+    return loaded["dbl"][0], loaded["add"][0], loaded["dbl"][1], loaded["add"][1]
@@ -0,0 +1,119 @@
+import numpy as np
+
+# The (start, duration) of an operation in the power trace, in samples
+OFFSET_DTYPE = np.dtype([("start", np.int64), ("duration", np.int64)])
+
+
+def _hysteresis_state(trigger_trace, low_threshold, high_threshold):
+    """
+    Threshold the trigger trace with hysteresis: the state only becomes high at or above the high threshold and only
+    becomes low at or below the low threshold. Samples in between keep the state of the last sample outside of this band
+    (low at the start of the trace).
+    :return: A boolean array with the state of every sample
+    """
+    above = trigger_trace >= high_threshold
+    defined = above | (trigger_trace <= low_threshold)
+    # Index of the last sample with a defined state, -1 if there is none yet
+    last_defined = np.maximum.accumulate(np.where(defined, np.arange(len(trigger_trace)), -1))
+    return (last_defined >= 0) & above[np.maximum(last_defined, 0)]
+
+
+def detect_pulses(trigger_trace, low_threshold=None, high_threshold=None, min_pulse_width=1, decimation=1):
+    """
+    Detect the high pulses in a trigger trace (the operation trigger of the FPGA). Pulses that are not completely
+    captured (i.e. already high at the start or still high at the end of the trace) are ignored.
+    :param trigger_trace: The trigger trace (which is not modified)
+    :param low_threshold: The low threshold of the hysteresis, by default 30% between the low and high level
+    :param high_threshold: The high threshold of the hysteresis, by default 70% between the low and high level
+    :param min_pulse_width: Glitches (high or low) shorter than this number of samples (of the original trace) are
+    ignored: low glitches within a pulse are merged into the pulse, after which high glitches are dropped
+    :param decimation: The factor by which the trigger trace was decimated (e.g. trace[::decimation]), the detected
+    offsets are scaled back to samples of the original trace
+    :return: A structured array (OFFSET_DTYPE) with the start and duration of every pulse
+    """
+    trigger_trace = np.asarray(trigger_trace)
+    if len(trigger_trace) == 0:
+        return np.empty(0, dtype=OFFSET_DTYPE)
+    min_val, max_val = np.min(trigger_trace), np.max(trigger_trace)
+    if max_val == min_val:
+        return np.empty(0, dtype=OFFSET_DTYPE)
+    # The low and high level are the medians of the samples below and above the middle of the range, which (unlike the
+    # minimum and maximum) are not affected by noise
+    middle = (min_val + max_val) / 2.0
+    low_level = np.median(trigger_trace[trigger_trace <= middle])
+    high_level = np.median(trigger_trace[trigger_trace > middle])
+    if low_threshold is None:
+        low_threshold = low_level + 0.3 * (high_level - low_level)
+    if high_threshold is None:
+        high_threshold = low_level + 0.7 * (high_level - low_level)
+    if low_threshold > high_threshold:
+        raise Exception("The low threshold ({}) is above the high threshold ({})".format(low_threshold, high_threshold))
+
+    state = _hysteresis_state(trigger_trace, low_threshold, high_threshold).astype(np.int8)
+    edges = np.flatnonzero(np.diff(state)) + 1
+    rising_edges = edges[state[edges] == 1]
+    falling_edges = edges[state[edges] == 0]
+    # Ignore a falling edge before the first rising edge and a rising edge after the last falling edge
+    if len(falling_edges) > 0 and len(rising_edges) > 0 and falling_edges[0] < rising_edges[0]:
+        falling_edges = falling_edges[1:]
+    rising_edges = rising_edges[:len(falling_edges)]
+
+    # Merge the pulses separated by low glitches, then drop the high glitches
+    min_width = int(np.ceil(min_pulse_width / decimation))
+    is_gap_kept = rising_edges[1:] - falling_edges[:-1] >= min_width
+    rising_edges = rising_edges[np.concatenate(([True], is_gap_kept))]
+    falling_edges = falling_edges[np.concatenate((is_gap_kept, [True]))]
+    is_pulse_kept = falling_edges - rising_edges >= min_width
+
+    pulses = np.empty(np.count_nonzero(is_pulse_kept), dtype=OFFSET_DTYPE)
+    pulses["start"] = rising_edges[is_pulse_kept] * decimation
+    pulses["duration"] = (falling_edges - rising_edges)[is_pulse_kept] * decimation
+    return pulses
+
+
+def split_operations(pulses, nr_of_iterations=64, max_duration_deviation=0.25):
+    """
+    Split the pulses of the operation trigger into the doubling and addition operations, which alternate (DBL, ADD,
+    DBL, ..., DBL, ADD), and validate them against the expected pattern.
+    :param pulses: The pulses of the operation trigger (see detect_pulses)
+    :param nr_of_iterations: The number of iterations of the main loop, each consisting of a DBL and an ADD
+    :param max_duration_deviation: The maximum relative deviation of the duration of an operation from the median
+    duration of that operation (FourQ runs in constant time, so all DBL and all ADD operations take equally long)
+    :return: (dbl_offsets, add_offsets), structured arrays (OFFSET_DTYPE) with nr_of_iterations offsets each
+    """
+    if len(pulses) != 2 * nr_of_iterations:
+        raise Exception("Expected {} DBL and {} ADD operations, but found {} pulses in the trigger trace".format(
+            nr_of_iterations, nr_of_iterations, len(pulses)))
+    dbl_offsets, add_offsets = pulses[0::2], pulses[1::2]
+    for name, operation_offsets in (("DBL", dbl_offsets), ("ADD", add_offsets)):
+        durations = operation_offsets["duration"]
+        median_duration = np.median(durations)
+        deviating = np.flatnonzero(np.abs(durations - median_duration) > max_duration_deviation * median_duration)
+        if len(deviating) > 0:
+            raise Exception("The duration of {} operation(s) {} deviates from the median duration of {} samples".format(
+                name, deviating.tolist(), median_duration))
+    return dbl_offsets, add_offsets
+
+
+def determine_operation_offsets(trigger_trace, nr_of_iterations=64, min_pulse_width=1, decimation=1, **kwargs):
+    """
+    Determine the offsets of the doubling and addition operations from the operation trigger trace.
+    :param trigger_trace: The operation trigger trace (channel C2)
+    :param nr_of_iterations: The number of iterations of the main loop
+    :param min_pulse_width: See detect_pulses
+    :param decimation: See detect_pulses
+    :param kwargs: The thresholds passed to detect_pulses
+    :return: (dbl_offsets, add_offsets), structured arrays (OFFSET_DTYPE) with nr_of_iterations offsets each
+    """
+    pulses = detect_pulses(trigger_trace, min_pulse_width=min_pulse_width, decimation=decimation, **kwargs)
+    return split_operations(pulses, nr_of_iterations)
+
+
+def interleave_offsets(dbl_offsets, add_offsets):
+    """
+    :return: The offsets as a list of (start, duration) tuples in the order DBL, ADD, DBL, ..., DBL, ADD
+    """
+    offsets = np.empty(len(dbl_offsets) + len(add_offsets), dtype=OFFSET_DTYPE)
+    offsets[0::2] = dbl_offsets
+    offsets[1::2] = add_offsets
+    return [(int(start), int(duration)) for start, duration in offsets]
@@ -11,17 +11,75 @@ from fourq_hardware import fourq_scalar_mult
 from fourq_software import scalar_recoding, scalar_decomposition
 from lecroy import lecroy_interface
 from lecroy import trace_set_coding
+from online_template_attack import adaptive_acquisition, board_pool, capture_pipeline, gaussian_templates, \
+    operation_offsets, points_of_interest, scoring, template_scalar_cache, trace_statistics, trace_store
 from sakura_g import ftdi_interface
 from utils import files
 
 lecroy_if = None  # type: lecroy_interface.Lecroy
-trace_set_encoder = trace_set_coding.TraceSetCoding()
+# Cache with the multi-scalars of the templates, opened in prepare_ota
+template_scalars = None  # type: template_scalar_cache.TemplateScalarCache
 
 nr_of_additional_traces = None
+# Whether to overlap loading the scalar, capturing and decoding of the template traces (see capture_pipeline)
+use_capture_pipeline = True
+# Whether to capture the additional template traces in a single sequence mode acquisition, which takes precedence over
+# the capture pipeline
+use_sequence_mode = False
+# The captured traces of a campaign are stored in a trace store in this directory (if set), which is opened on first use
+campaign_directory = None
+campaign_store = None  # type: trace_store.TraceStore
+# The oscilloscope settings stored with the traces of the campaign
+scope_settings = None
+# The floating point type used to calculate the correlation coefficients (np.float32 or np.float64)
+correlation_dtype = np.float64
+# The maximum shift (in samples) of the target window when searching for the best aligned correlation, 0 disables the
+# lag search (which is not used in combination with FFT)
+max_lag_in_samples = 0
+# Stop averaging template traces once the standard error of every sample of the average is at most this value (in ADC
+# units), None always captures nr_of_additional_traces
+averaging_max_standard_error = None
+# The number of traces captured per template in every round of the pipelined capture, after which the templates whose
+# average has converged (see averaging_max_standard_error) are no longer captured
+averaging_batch_size = 5
+# When averaging the template traces, capture them adaptively until the best template beats the runner-up by the
+# margin plus a number of standard errors (see adaptive_acquisition), instead of capturing nr_of_additional_traces for
+# every template
+use_adaptive_acquisition = False
+adaptive_margin = 0.0
+adaptive_confidence = 3.0
+# The number of traces captured per ambiguous template in every round of the adaptive acquisition
+adaptive_batch_size = 2
+# The points of interest (dbl_pois, add_pois) of every operation, relative to the start of the operation, which are
+# loaded (or determined) when attacking with points of interest
+operation_pois = None
+# The Gaussian templates (dbl_templates, add_templates, dbl_pois, add_pois) of every operation, which are loaded (or
+# built) when attacking with Gaussian templates instead of capturing templates for every guess
+operation_templates = None
+# The maximum number of seconds to wait for an operation of the FPGA
+operation_timeout = 10.0
+# The last measured duration (in seconds) of every operation of the FPGA, of which this fraction is used as the expected
+# duration of the next run of the operation, during which the busy flag is not polled
+operation_durations = {}
+expected_duration_fraction = 0.9
+# Whether to wait for the acquisition of the oscilloscope (instead of polling the busy flag) while the scalar
+# multiplication of a captured trace runs, which keeps the USB bus quiet during the acquisition
+wait_for_scope_acquisition = False
+# Whether to capture the template traces on the other connected boards in parallel (see board_pool), each with its own
+# oscilloscope (IP address) and channel, whenever they are captured with capture_average_traces_pipelined. The board
+# of the target trace stays connected in this process and captures its share of every template as well. The traces of
+# every template are split evenly over all boards, so the templates are comparable among each other, but this assumes
+# the leakage of the boards (and their probes) is similar enough to match the target trace of a single board. The
+# oscilloscope channels of the pool must not include the one of the target board.
+use_board_pool = False
+board_pool_scope_addresses = []
+board_pool_channels = ("C3",)
+template_board_pool = None  # type: board_pool.BoardPool
 
 
 def online_template_attack(base_point, secret_scalar, use_decomposed_scalar=True, average_template_signals=False,
-                           max_nr_of_iterations=64, enable_output=True, recapture_target_trace=False, plot_intermediate_templates=False):
+                           max_nr_of_iterations=64, enable_output=True, recapture_target_trace=False, plot_intermediate_templates=False,
+                           use_points_of_interest=False, use_gaussian_templates=False):
     """
     This function does the following:
     - load the base point onto the FourQ implementation
@@ -62,6 +120,9 @@ def online_template_attack(base_point, secret_scalar, use_decomposed_scalar=True
     y0, y1 = base_point[1]
     fourq_scalar_mult.fourq_write_base_point(sakura, x0, x1, y0, y1)
 
+    if use_board_pool:
+        start_template_board_pool(sakura, base_point)
+
     # Load secret scalar
     load_scalar(sakura, secret_scalar, use_decomposed_scalar)
     # capture_trace(sakura)
@@ -72,42 +133,59 @@ def online_template_attack(base_point, secret_scalar, use_decomposed_scalar=True
         save_target_trace(target_trace_interpreted)
     else:
         target_trace_interpreted = load_target_trace()
+    # The campaign needs the target trace to be replayed, a loaded target trace is only stored once per campaign
+    if recapture_target_trace or campaign_store is None or not campaign_store.select(label="target"):
+        store_campaign_trace(target_trace_interpreted, label="target",
+                             multi_scalar=decomposed_secret_scalar, channel="C3")
 
     # Determine offsets
     oper_trigger_trace = capture_trace(sakura, channel="C2", save_to_file=False,
                                        file_name="oper_trigger_trace")
+    store_campaign_trace(oper_trigger_trace, label="trigger", channel="C2")
 
     # The offsets containing offsets for both the doubling and addition operations.
-    offsets = determine_offsets_static(oper_trigger_trace, nth_diff=1)
+    offsets = determine_offsets_static(oper_trigger_trace)
     # The order of the offsets is: [DBL, ADD, DBL, ..., DBL, ADD]
     # Even elements contain the DBL offsets, odd elements the ADD offsets
     # There are 64 DBL and 64 ADD operations, giving 128 offsets in total (if the whole main loop was captured)
 
+    # Only correlate the points of interest of the operations if necessary
+    global operation_pois
+    if use_points_of_interest and operation_pois is None:
+        operation_pois = load_points_of_interest(sakura, offsets, use_decomposed_scalar=use_decomposed_scalar)
+    # Or classify the target trace using Gaussian templates built from profiling traces
+    global operation_templates
+    if use_gaussian_templates and operation_templates is None:
+        operation_templates = load_gaussian_templates(sakura, offsets, use_decomposed_scalar=use_decomposed_scalar)
+
     rank_per_iter = []
 
     attacked_digit_columns = None
     # We are now going to attack the digit columns iteratively (starting from digit column 64)
     for iteration in reversed(range(64)):
-        corr_results = attack_digit_column(sakura, iteration, offsets, target_trace_interpreted, attacked_digit_columns,
-                                           use_decomposed_scalar=use_decomposed_scalar,
-                                           average_template_signals=average_template_signals,
-                                           plot_intermediate_templates=plot_intermediate_templates,
-                                           use_points_of_interest=False,
-                                           use_fft=False)
+        if use_gaussian_templates:
+            corr_results = classify_digit_column(iteration, offsets, target_trace_interpreted, attacked_digit_columns)
+        else:
+            corr_results = attack_digit_column(sakura, iteration, offsets, target_trace_interpreted,
+                                               attacked_digit_columns, use_decomposed_scalar=use_decomposed_scalar,
+                                               average_template_signals=average_template_signals,
+                                               plot_intermediate_templates=plot_intermediate_templates,
+                                               use_points_of_interest=use_points_of_interest,
+                                               use_fft=False, enable_output=enable_output)
         # Determine which (template digit column, correlation value) had the highest correlation value
-        template_digit_column, max_corr_coeff = max(corr_results, key=operator.itemgetter(1))
+        template_digit_column, max_corr_coeff, lag = max(corr_results, key=operator.itemgetter(1))
 
         if enable_output:
             print("Iteration: {}. Attacking d{}".format(iteration, iteration + 1))
             print("Expected digit column: \t{}".format(recoded_secret_scalar_matrix[:, 63 - iteration]))
-            print("Digit column guess: \t{}".format(template_digit_column[:, 0]))
+            print("Digit column guess: \t{} (lag: {})".format(template_digit_column[:, 0], lag))
             print("Correlation results (from lowest to highest:")
-        for idx, (tmpl_digit_col, corr_coeff) in enumerate(sorted(corr_results, key=operator.itemgetter(1))):
+        rank = scoring.rank_of_expected(corr_results, recoded_secret_scalar_matrix[:, 63 - iteration])
+        if rank is not None:
+            rank_per_iter.append(rank)
+        for tmpl_digit_col, corr_coeff, _ in sorted(corr_results, key=operator.itemgetter(1)):
             equals_correct_template = np.array_equal(tmpl_digit_col[:, 0],
                                                      recoded_secret_scalar_matrix[:, 63 - iteration])
-            if equals_correct_template:
-                rank = len(corr_results) - idx
-                rank_per_iter.append(rank)
             if enable_output:
                 print("{}: \t {}{} ".format(tmpl_digit_col[:, 0], corr_coeff, "*" if equals_correct_template else ""))
         if enable_output:
@@ -145,42 +223,23 @@ def obtain_template_traces(sakura, is_first_iteration, attacked_digit_columns, u
     :param attacked_digit_columns: The previously attacked digit columns
     :return: A list of template traces
     """
-    sign_vals = [1] if is_first_iteration else [1, -1]
-
     template_traces = []
-    template_digit_columns = []
-
-    for s_i in sign_vals:
-        for d_i in range(8):
-            # Generate template with expected digit column(s)
-            template_digit_column = scalar_recoding.generate_digit_column_for_value(d_i, s_i)
-            digit_columns_guess = template_digit_column
-
-            # If it is not the first iteration, we append our previously attacked digit columns with our current guess
-            if not is_first_iteration:
-                digit_columns_guess = np.concatenate((attacked_digit_columns, template_digit_column), axis=1)
-
-            # Determine corresponding multi-scalar: inverse the decomposition or take the decomposed scalar
-            if use_decomposed_scalar:
-                recoded_matrix, is_valid_template = scalar_recoding.get_valid_recoded_matrix(
-                    digit_columns_guess, 65)
-                scalar = scalar_recoding.matrix_to_scalars(recoded_matrix) if is_valid_template else None
-
-            else:
-                # TODO inverse decomposition is a work in progress!
-                scalar = None
-                is_valid_template = False
-
-            # If the current configuration of values cannot produce a valid set of scalars, we continue with the next
-            # iteration
-            if not is_valid_template:
-                continue
-
+    template_digit_columns, template_multi_scalars = determine_template_multi_scalars(
+        is_first_iteration, attacked_digit_columns, use_decomposed_scalar=use_decomposed_scalar)
+
+    # The templates are captured at once, such that the capture of one template overlaps with the next
+    if use_capture_pipeline and not use_sequence_mode:
+        nr_of_traces_per_template = 1 + (nr_of_additional_traces if average_template_signals else 0)
+        template_traces = capture_average_traces_pipelined(sakura, template_multi_scalars,
+                                                           nr_of_traces_per_template, use_decomposed_scalar,
+                                                           max_standard_error=averaging_max_standard_error)
+    else:
+        for d_i, scalar in enumerate(template_multi_scalars):
             # Load scalar
             load_scalar(sakura, scalar, use_decomposed_scalar)
 
             # Capture template trace
-            file_name = "template_trace_k{}_{}".format(64, d_i)
+            file_name = "template_trace_k{}_{}".format(64, d_i % 8)
             template_trace = capture_trace(sakura, save_to_file=False, file_name=file_name)
             # screen_capture(file_name)
 
@@ -188,20 +247,120 @@ def obtain_template_traces(sakura, is_first_iteration, attacked_digit_columns, u
             if average_template_signals:
                 template_trace = capture_average_from_multiple_traces(sakura, template_trace, nr_of_additional_traces,
                                                                       channel="C3")
-
-            # Store template trace and corresponding digit column + sign
             template_traces.append(template_trace)
-            template_digit_columns.append(template_digit_column)
+
+    store_template_traces(template_traces, template_digit_columns, template_multi_scalars, is_first_iteration,
+                          attacked_digit_columns, use_decomposed_scalar)
+    return template_traces, template_digit_columns
+
+
+def obtain_template_traces_adaptively(sakura, is_first_iteration, attacked_digit_columns, score_templates,
+                                      nr_of_scored_samples, use_decomposed_scalar=True, enable_output=True):
+    """
+    Obtain the average template traces given the previously attacked digit columns, where the traces are only
+    captured for the templates that are still ambiguous (see adaptive_acquisition.AdaptiveTemplateAcquisition)
+    :param sakura: The interface with the Sakura-G FPGA
+    :param is_first_iteration: Whether this is the first iteration of FourQ
+    :param attacked_digit_columns: The previously attacked digit columns
+    :param score_templates: Function returning the correlation of every given template trace with the target trace
+    :param nr_of_scored_samples: The number of samples correlated by score_templates
+    :param use_decomposed_scalar:
+    :param enable_output: Whether to print the number of captured template traces
+    :return: A list of template traces and a list of the corresponding template digit columns
+    """
+    template_digit_columns, template_multi_scalars = determine_template_multi_scalars(
+        is_first_iteration, attacked_digit_columns, use_decomposed_scalar=use_decomposed_scalar)
+
+    def capture_traces(candidate_indices):
+        scalars = [template_multi_scalars[idx] for idx in candidate_indices]
+        if use_capture_pipeline:
+            return capture_average_traces_pipelined(sakura, scalars, 1, use_decomposed_scalar)
+        captured_traces = []
+        for idx, scalar in enumerate(scalars):
+            if idx == 0 or scalar != scalars[idx - 1]:
+                load_scalar(sakura, scalar, use_decomposed_scalar)
+            captured_traces.append(capture_trace(sakura))
+        return captured_traces
+
+    max_traces_per_candidate = 1 + nr_of_additional_traces
+    acquisition = adaptive_acquisition.AdaptiveTemplateAcquisition(
+        score_templates, margin=adaptive_margin, confidence=adaptive_confidence, batch_size=adaptive_batch_size,
+        min_traces_per_candidate=min(2, max_traces_per_candidate), max_traces_per_candidate=max_traces_per_candidate,
+        nr_of_scored_samples=nr_of_scored_samples)
+    mean_traces, _, nr_of_traces = acquisition.run(len(template_multi_scalars), capture_traces)
+    if enable_output:
+        print("Captured {} template traces (instead of {})".format(
+            nr_of_traces.sum(), len(template_multi_scalars) * max_traces_per_candidate))
+    template_traces = [np.asarray(mean_trace, dtype=np.int32) for mean_trace in mean_traces]
+    store_template_traces(template_traces, template_digit_columns, template_multi_scalars, is_first_iteration,
+                          attacked_digit_columns, use_decomposed_scalar)
     return template_traces, template_digit_columns
 
 
+def determine_template_multi_scalars(is_first_iteration, attacked_digit_columns, use_decomposed_scalar=True):
+    """
+    Determine the multi-scalars of the templates given the previously attacked digit columns
+    :param is_first_iteration: Whether this is the first iteration of FourQ
+    :param attacked_digit_columns: The previously attacked digit columns
+    :param use_decomposed_scalar:
+    :return: A list with the template digit columns and a list with the corresponding multi-scalars, for all templates
+    that can be produced by a valid multi-scalar
+    """
+    template_digit_columns = []
+    template_multi_scalars = []
+
+    # Generate templates with expected digit column(s): if it is not the first iteration, we append our previously
+    # attacked digit columns with our current guess
+    guesses = template_scalar_cache.template_digit_column_guesses(None if is_first_iteration else attacked_digit_columns)
+    for template_digit_column, digit_columns_guess in guesses:
+        # Determine corresponding multi-scalar: inverse the decomposition or take the decomposed scalar
+        if use_decomposed_scalar:
+            if template_scalars is not None:
+                scalar, is_valid_template = template_scalars.get(digit_columns_guess)
+            else:
+                recoded_matrix, is_valid_template = scalar_recoding.get_valid_recoded_matrix(
+                    digit_columns_guess, 65)
+                scalar = scalar_recoding.matrix_to_scalars(recoded_matrix) if is_valid_template else None
+
+        else:
+            # TODO inverse decomposition is a work in progress!
+            scalar = None
+            is_valid_template = False
+
+        # If the current configuration of values cannot produce a valid set of scalars, we continue with the next
+        # iteration
+        if not is_valid_template:
+            continue
+
+        # Store corresponding digit column + sign
+        template_digit_columns.append(template_digit_column)
+        template_multi_scalars.append(scalar)
+    return template_digit_columns, template_multi_scalars
+
+
+def store_template_traces(template_traces, template_digit_columns, template_multi_scalars, is_first_iteration,
+                          attacked_digit_columns, use_decomposed_scalar=True):
+    """
+    Store the template traces of an iteration in the trace store of the campaign (if any)
+    """
+    iteration = 63 if is_first_iteration else 63 - attacked_digit_columns.shape[1]
+    for template_trace, template_digit_column, multi_scalar in zip(template_traces, template_digit_columns,
+                                                                   template_multi_scalars):
+        store_campaign_trace(template_trace, label="template", iteration=iteration,
+                             sign=int(template_digit_column[0, 0]),
+                             digit_column=scalar_recoding.digit_column_value(template_digit_column),
+                             multi_scalar=multi_scalar if use_decomposed_scalar else None, channel="C3")
+
+
 def attack_digit_column(sakura, iteration, offsets, target_trace, attacked_digit_columns, use_decomposed_scalar=True,
-                        average_template_signals=False, use_fft=False, use_points_of_interest=False, plot_intermediate_templates=False):
+                        average_template_signals=False, use_fft=False, use_points_of_interest=False, plot_intermediate_templates=False,
+                        enable_output=True):
     """
     Perform the Online Template Attack to attack the digit columns and signs used in the given target trace
     :param average_template_signals:
     :param use_decomposed_scalar:
     :param use_points_of_interest: Whether to perform the correlation between template and target traces at Points of Interests (POIs)
+    only (see operation_pois), which takes precedence over FFT and the lag search
     :param use_fft: Whether to use FFT before correlating the template traces with the target trace
     :param attacked_digit_columns: The previously attacked digit columns
     :param target_trace: The target trace
@@ -209,6 +368,7 @@ def attack_digit_column(sakura, iteration, offsets, target_trace, attacked_digit
     :param iteration: Indicates which digit column we are currently attacking (0 indicates digit column 63, 63 indicates
     digit column 0)
     :param offsets: The offsets in the target trace to the doubling operations
+    :param enable_output: Whether to print the progress of the template acquisition
     :return: The recoded scalars aligned in matrix format that represent the scalar used in the scalar multiplication
     that resulted in the given target trace.
     """
@@ -224,10 +384,6 @@ def attack_digit_column(sakura, iteration, offsets, target_trace, attacked_digit
     dbl_offsets = [dbl_offset for idx, dbl_offset in enumerate(offsets) if idx % 2 == 0]
     add_offsets = [add_offset for idx, add_offset in enumerate(offsets) if idx % 2 == 1]
 
-    # Obtain the template traces
-    template_traces, template_digit_columns = obtain_template_traces(sakura, is_first_iteration, attacked_digit_columns,
-                                                                     use_decomposed_scalar=use_decomposed_scalar,
-                                                                     average_template_signals=average_template_signals)
     # Store the 'guessed' digit columns and their corresponding correlation coefficient
     correlation_results = []
 
@@ -235,84 +391,75 @@ def attack_digit_column(sakura, iteration, offsets, target_trace, attacked_digit
 
     offset_to_oper, duration_of_oper = dbl_offsets[offset_idx] if not is_last_iteration else add_offsets[offset_idx]
 
-    # Determine Points of Interests if necessary
-    # if use_points_of_interest:
-    #     # TODO not sure if this is correct, as POIs need to be determined when taking all operations into account
-    #     # TODO Currently, we only take operations in the current iteration into account
-    #     # When need to make a deepcopy of the template traces, otherwise FFT will be applied two times
-    #     # You can see that this happens by taking a look at the plot
-    #     if use_fft:
-    #         template_traces_for_oper = copy.deepcopy(template_traces)
-    #         template_traces_for_oper = [apply_fft(template_trace[offset_to_oper:offset_to_oper + duration_of_oper]) for
-    #                                     template_trace in template_traces_for_oper]
-    #         points_of_interest = find_points_of_interest(np.asarray(template_traces_for_oper))
-    #     else:
-    #         template_traces_for_oper = copy.deepcopy(template_traces)
-    #         template_traces_for_oper = [template_trace[offset_to_oper:offset_to_oper + duration_of_oper] for
-    #                                     template_trace in template_traces_for_oper]
-    #         points_of_interest = find_points_of_interest(np.asarray(template_traces_for_oper))
-
     saved_dbl_oper = not plot_intermediate_templates
     ctr = 0
 
-    for template_trace, template_digit_column in zip(template_traces, template_digit_columns):
-        # Experimenting with offsets into offsets
-        offset_into_start = 0
-        offset_from_end = 0
-        # Determine which samples of the target and template trace will be correlated
-        template_trace_dbl_oper = template_trace[
-                                  offset_to_oper + offset_into_start: offset_to_oper + duration_of_oper - offset_from_end]
-        target_trace_dbl_oper = target_trace[
-                                offset_to_oper + offset_into_start: offset_to_oper + duration_of_oper - offset_from_end]
+    # Experimenting with offsets into offsets
+    offset_into_start = 0
+    offset_from_end = 0
+
+    """
+    if not the first and last iteration of the main loop, we can also use the addition operation
+    in template matching.
+    """
+    dbl_window, add_window = scoring.operation_windows(offsets, iteration, offset_into_start, offset_from_end)
+
+    # The samples to correlate if we only use the Points of Interests (POIs) of the operations, which are determined
+    # from profiling traces (see determine_points_of_interest)
+    dbl_samples = add_samples = None
+    if use_points_of_interest:
+        if operation_pois is None:
+            raise Exception("The points of interest have not been loaded")
+        dbl_samples, add_samples = scoring.operation_samples(offsets, iteration, operation_pois)
 
-        if use_fft:
-            template_trace_dbl_oper = apply_fft(template_trace_dbl_oper)
-            target_trace_dbl_oper = apply_fft(target_trace_dbl_oper)
+    def correlate_templates(traces):
+        return scoring.correlate_digit_column(traces, target_trace, dbl_window, add_window, use_fft=use_fft,
+                                              max_lag=max_lag_in_samples, dbl_samples=dbl_samples,
+                                              add_samples=add_samples, dtype=correlation_dtype)
 
+    # Obtain the template traces
+    if average_template_signals and use_adaptive_acquisition:
+        if use_points_of_interest:
+            nr_of_scored_samples = len(dbl_samples) + (len(add_samples) if add_samples is not None else 0)
+        else:
+            nr_of_scored_samples = dbl_window[1] + (add_window[1] if add_window is not None else 0)
+        template_traces, template_digit_columns = obtain_template_traces_adaptively(
+            sakura, is_first_iteration, attacked_digit_columns, lambda traces: correlate_templates(traces)[0],
+            nr_of_scored_samples, use_decomposed_scalar=use_decomposed_scalar, enable_output=enable_output)
+    else:
+        template_traces, template_digit_columns = obtain_template_traces(
+            sakura, is_first_iteration, attacked_digit_columns, use_decomposed_scalar=use_decomposed_scalar,
+            average_template_signals=average_template_signals)
+    correlation_coeffs, lags = correlate_templates(template_traces)
+
+    for template_trace, template_digit_column, correlation_coeff, lag in zip(template_traces, template_digit_columns,
+                                                                             correlation_coeffs, lags):
         # Store current doubling operation as a tsc file
         positive_digit_column = template_digit_column[0, 0] == 1
         file_name = "template_trace_dbl_oper_{}d{}_{}".format("+" if positive_digit_column else "-", iteration + 1, ctr)
         ctr += 1
-        encoded_trace = _encode_as_trs(template_trace_dbl_oper, file_name)
         if plot_intermediate_templates:
-            _store_trs_encoded_trace(encoded_trace, file_name)
+            template_trace_dbl_oper = template_trace[
+                                      offset_to_oper + offset_into_start: offset_to_oper + duration_of_oper - offset_from_end]
+            target_trace_dbl_oper = target_trace[
+                                    offset_to_oper + offset_into_start: offset_to_oper + duration_of_oper - offset_from_end]
+
+            if use_fft:
+                template_trace_dbl_oper = apply_fft(template_trace_dbl_oper)
+                target_trace_dbl_oper = apply_fft(target_trace_dbl_oper)
+
+            _store_as_trs(template_trace_dbl_oper, file_name)
             save_as_csv(template_trace_dbl_oper, file_name)
 
-        # Save the corresponding doubling operation
-        if not saved_dbl_oper and plot_intermediate_templates:
-            file_name = "target_trace_dbl_oper_d{}".format(iteration + 1)
-            encoded_trace = _encode_as_trs(target_trace_dbl_oper, file_name)
-            _store_trs_encoded_trace(encoded_trace, file_name)
-            save_as_csv(target_trace_dbl_oper, file_name)
-            saved_dbl_oper = True
-
-        # Only select samples at the Points of Interests if necessary
-        # if use_points_of_interest:
-        #     template_trace_dbl_oper = [sample for idx, sample in enumerate(template_trace_dbl_oper) if
-        #                                idx in points_of_interest]
-        #     target_trace_dbl_oper = [sample for idx, sample in enumerate(target_trace_dbl_oper) if
-        #                              idx in points_of_interest]
-
-        # Calculate the Pearson correlation coefficient between the template and target trace
-        correlation_coeff = correlate(template_trace_dbl_oper, target_trace_dbl_oper)
-
-        """
-        if not the first and last iteration of the main loop, we can also use the addition operation
-        in template matching.
-        """
-        if not is_first_iteration and not is_last_iteration:
-            offset_to_add_oper, duration_of_add_oper = add_offsets[offset_idx - 1]
-            template_trace_add_oper = template_trace[
-                                      offset_to_add_oper + offset_into_start: offset_to_add_oper + duration_of_add_oper - offset_from_end]
-            target_trace_add_oper = target_trace[
-                                    offset_to_add_oper + offset_into_start: offset_to_add_oper + duration_of_add_oper - offset_from_end]
-            add_correlation_coeff = correlate(template_trace_add_oper, target_trace_add_oper)
-
-            correlation_coeff += add_correlation_coeff
-            correlation_coeff /= 2
+            # Save the corresponding doubling operation
+            if not saved_dbl_oper:
+                file_name = "target_trace_dbl_oper_d{}".format(iteration + 1)
+                _store_as_trs(target_trace_dbl_oper, file_name)
+                save_as_csv(target_trace_dbl_oper, file_name)
+                saved_dbl_oper = True
 
         # Save result such that we can determine later on which template had the highest correlation
-        correlation_results.append((template_digit_column, correlation_coeff))
+        correlation_results.append((template_digit_column, correlation_coeff, lag))
 
     # print(points_of_interest)
     if plot_intermediate_templates:
@@ -326,132 +473,204 @@ def attack_digit_column(sakura, iteration, offsets, target_trace, attacked_digit
     return correlation_results
 
 
-# TODO verify this function
-def determine_points_of_interest(sakura, offsets, use_decomposed_scalar):
+def determine_points_of_interest(sakura, offsets, use_decomposed_scalar=True, nr_of_profiling_traces=1000, nr_of_pois=20,
+                                 min_spacing=20, statistic="snr", path=points_of_interest.DEFAULT_POI_PATH):
     """
-    Determine the points of interest for the power trace for iteration 63 downto 0.
+    Determine the points of interest of the DBL and ADD operations of iteration 63 downto 0, using profiling traces of
+    random multi-scalars. The samples of each operation are classified by the digit column (sign and value) it
+    processes: the DBL operation of iteration i processes digit column i and the ADD operation processes digit column
+    i + 1 (counting from digit column 64). The points of interest are stored, such that they can be reused.
+    :param sakura: The interface with the Sakura-G FPGA
+    :param offsets: The offsets to each operation (DBL, ADD, DBL, ..., DBL, ADD)
     :param use_decomposed_scalar:
-    :param offsets: The offsets to each iteration
+    :param nr_of_profiling_traces: The number of profiling traces to capture
+    :param nr_of_pois: The number of points of interest per operation
+    :param min_spacing: The minimum distance (in samples) between two points of interest
+    :param statistic: The statistic used to rank the samples ("snr", "sost" or "ttest")
+    :param path: The path to store the points of interest at
+    :return: (dbl_pois, add_pois), the points of interest (relative to the start of the operation) of every operation
+    """
+    dbl_offsets = [dbl_offset for idx, dbl_offset in enumerate(offsets) if idx % 2 == 0]
+    add_offsets = [add_offset for idx, add_offset in enumerate(offsets) if idx % 2 == 1]
+
+    profiler = points_of_interest.PoiProfiler(dbl_offsets + add_offsets, nr_of_classes=16)
+    capture_profiling_traces(sakura, nr_of_profiling_traces, len(dbl_offsets), len(add_offsets), profiler.add_trace,
+                             use_decomposed_scalar=use_decomposed_scalar)
+
+    pois = profiler.select(nr_of_pois, min_spacing=min_spacing, statistic=statistic)
+    dbl_pois, add_pois = pois[:len(dbl_offsets)], pois[len(dbl_offsets):]
+    points_of_interest.save_points_of_interest(dbl_pois, add_pois, path, statistic=statistic,
+                                               nr_of_profiling_traces=nr_of_profiling_traces, min_spacing=min_spacing)
+    return dbl_pois, add_pois
+
+
+def capture_profiling_traces(sakura, nr_of_profiling_traces, nr_of_dbl_operations, nr_of_add_operations, on_trace,
+                             use_decomposed_scalar=True):
+    """
+    Capture power traces of random multi-scalars for profiling the DBL and ADD operations. The operations are labeled
+    by the digit column (sign and value) they process: the DBL operation of iteration i processes digit column i and the
+    ADD operation processes digit column i + 1 (counting from digit column 64).
     :param sakura: The interface with the Sakura-G FPGA
-    :return: The points of interest
+    :param nr_of_profiling_traces: The number of profiling traces to capture
+    :param nr_of_dbl_operations: The number of DBL operations to label
+    :param nr_of_add_operations: The number of ADD operations to label
+    :param on_trace: Called as on_trace(power_trace, labels) for every profiling trace, with the labels of the DBL
+    operations followed by those of the ADD operations
+    :param use_decomposed_scalar:
     """
-    # Generate 1000 random scalars m, and determine the points of interest using these scalars
-    # We first group the ADD and DBL operations for each operation together
-    # Then we determine the POIs for these grouped operations
+    if not use_decomposed_scalar:
+        # TODO inverse decomposition is a work in progress!
+        raise Exception("Profiling is only supported using decomposed scalars")
+    # Random multi-scalars, where the sign aligner a1 has to be odd
+    multi_scalars = np.random.default_rng().integers(0, 2 ** 64, size=(nr_of_profiling_traces, 4), dtype=np.uint64)
+    multi_scalars[:, 0] |= np.uint64(1)
+    _, signs, digit_column_values = scalar_recoding.recode_multi_scalars(multi_scalars)
+    # The class of digit column k (k = 0 is digit column 64)
+    digit_column_classes = scalar_recoding.digit_column_class(digit_column_values, signs)[:, ::-1]
+    labels = np.concatenate((digit_column_classes[:, :nr_of_dbl_operations],
+                             digit_column_classes[:, 1:nr_of_add_operations + 1]), axis=1)
+
+    scalars = [[int(ai) for ai in multi_scalar] for multi_scalar in multi_scalars]
+    if use_capture_pipeline:
+        pipeline = capture_pipeline.CapturePipeline(lecroy_if,
+                                                    lambda scalar: load_scalar(sakura, scalar, use_decomposed_scalar),
+                                                    lambda: perform_scalar_mult(sakura))
+        pipeline.run(scalars, lambda idx, power_trace: on_trace(power_trace, labels[idx]))
+    else:
+        for idx, scalar in enumerate(scalars):
+            load_scalar(sakura, scalar, use_decomposed_scalar)
+            on_trace(capture_trace(sakura), labels[idx])
 
-    # A list containing tuples of lists
-    grouped_operations = [([], [])] * 64
 
+def build_gaussian_templates(sakura, offsets, pois, use_decomposed_scalar=True, nr_of_profiling_traces=5000,
+                             path=gaussian_templates.DEFAULT_TEMPLATES_PATH):
+    """
+    Build (and store) the pooled Gaussian templates of the 16 digit column classes for every DBL and ADD operation at
+    their points of interest, using profiling traces of random multi-scalars (see capture_profiling_traces).
+    :param sakura: The interface with the Sakura-G FPGA
+    :param offsets: The offsets to each operation (DBL, ADD, DBL, ..., DBL, ADD)
+    :param pois: (dbl_pois, add_pois), the points of interest of every operation (see determine_points_of_interest)
+    :param use_decomposed_scalar:
+    :param nr_of_profiling_traces: The number of profiling traces to capture
+    :param path: The path to store the templates at
+    :return: (dbl_templates, add_templates, dbl_pois, add_pois)
+    """
     dbl_offsets = [dbl_offset for idx, dbl_offset in enumerate(offsets) if idx % 2 == 0]
     add_offsets = [add_offset for idx, add_offset in enumerate(offsets) if idx % 2 == 1]
-    scalars = np.arange(0, 1000)
-    for scalar in scalars:
-        # Load the scalar to the FPGA
-        load_scalar(sakura, scalar, use_decomposed_scalar)
-        # Capture the power trace
-        power_trace = capture_trace(sakura)
-        for i in range(64):
-            # Extract the power trace of the DBL and ADD operations for the current iteration (0 is start)
-            dbl_start, dbl_duration = dbl_offsets[i]
-            add_start, add_duration = add_offsets[i]
-            dbl_trace = power_trace[dbl_start:dbl_start + dbl_duration]
-            add_trace = power_trace[add_start:add_start + add_duration]
-            # First element in the tuple contains the DBL traces
-            grouped_operations[i][0].append(dbl_trace)
-            # Second element in the tuple contains the ADD traces
-            grouped_operations[i][1].append(add_trace)
-
-    # Now we can determine the points of interest in each iteration
-    points_of_interest = []
-    for dbl_opers, add_opers in grouped_operations:
-        dbl_opers = np.asarray(dbl_opers)
-        add_opers = np.asarray(add_opers)
-        # Calculate POIs
-        pois_dbl = find_points_of_interest(dbl_opers)
-        pois_add = find_points_of_interest(add_opers)
-        # Store POIs
-        points_of_interest.append((pois_dbl, pois_add))
-
-
-def find_points_of_interest(template_traces: np.ndarray):
-    """
-    Find the average power of the given template traces, and try to find the interesting points
-    This is not according to the paper of Template Attacks, as we only have one operation for which we have multiple
-    templates.
-    :param template_traces: The template traces
-    :return: The points of interest (as indices) for the given template traces
-    """
-
-    nr_of_traces = len(template_traces)
-    sum_of_all_traces = np.sum(template_traces, axis=0)
-    avg_power = 1 / nr_of_traces * sum_of_all_traces
-
-    # # We only consider the real part of the imaginary number (if the traces have been processed by FFT)
-    # avg_power = np.asarray(avg_power, dtype=np.int32)
-
-    # Compute summation of difference between each trace and the avery.
-    # Interesting points should have a higher spike in the result
-    sum_of_diffs = np.zeros((len(avg_power),)) if template_traces.dtype != np.complex128 else np.zeros(
-        (len(avg_power),), dtype=np.complex128)
-    for template_trace in template_traces:
-        all_positive = lambda sample: -sample if sample < 0 else sample
-        template_trace = np.asarray(list(map(all_positive, template_trace)))
-        template_trace = np.asarray(template_trace) if template_trace.dtype != np.complex128 else np.asarray(
-            template_trace, dtype=np.complex128)
-        sum_of_diffs += (template_trace - avg_power)
-
-    file_name = "sum_of_diffs"
-    encoded_trace = _encode_as_trs(sum_of_diffs, file_name)
-    _store_trs_encoded_trace(encoded_trace, file_name)
-
-    # TODO Determine which points are interesting and how many to select
-    # TODO use clock period i.c.w sampling rate to determine samples per clock cycle
-    argmax = np.argmax(sum_of_diffs)
-    sum_of_diffs[argmax] = 0
-    indices_points_of_interest = [argmax]
-    points_to_select = 10
-    min_spacing = 20
-    while len(indices_points_of_interest) < points_to_select:
-        argmax = np.argmax(sum_of_diffs)
-        smallest_idx_distance = np.min(np.abs(indices_points_of_interest - argmax))
-        if smallest_idx_distance >= min_spacing:
-            indices_points_of_interest.append(argmax)
-        sum_of_diffs[argmax] = 0
-
-    return indices_points_of_interest
-
-
-def perform_scalar_mult(sakura, without_cfk=True):
+    dbl_pois, add_pois = pois
+    # The absolute sample indices of the points of interest of every operation
+    operation_samples = [offset + np.asarray(operation_pois) for (offset, _), operation_pois in
+                         zip(dbl_offsets + add_offsets, list(dbl_pois) + list(add_pois))]
+    accumulators = [gaussian_templates.ClassCovarianceAccumulator(16, len(samples)) for samples in operation_samples]
+
+    def add_trace(power_trace, labels):
+        for accumulator, samples, label in zip(accumulators, operation_samples, labels):
+            accumulator.add(power_trace[samples], label)
+
+    capture_profiling_traces(sakura, nr_of_profiling_traces, len(dbl_offsets), len(add_offsets), add_trace,
+                             use_decomposed_scalar=use_decomposed_scalar)
+    templates = [gaussian_templates.GaussianTemplates.from_accumulator(accumulator) for accumulator in accumulators]
+    dbl_templates, add_templates = templates[:len(dbl_offsets)], templates[len(dbl_offsets):]
+    gaussian_templates.save_templates(dbl_templates, add_templates, dbl_pois, add_pois, path)
+    return dbl_templates, add_templates, dbl_pois, add_pois
+
+
+def load_gaussian_templates(sakura, offsets, use_decomposed_scalar=True, path=gaussian_templates.DEFAULT_TEMPLATES_PATH):
+    """
+    Load the stored Gaussian templates, or build them (at the stored points of interest) if there are none yet
+    :return: (dbl_templates, add_templates, dbl_pois, add_pois)
+    """
+    if os.path.exists(path):
+        return gaussian_templates.load_templates(path)
+    pois = load_points_of_interest(sakura, offsets, use_decomposed_scalar=use_decomposed_scalar)
+    return build_gaussian_templates(sakura, offsets, pois, use_decomposed_scalar=use_decomposed_scalar, path=path)
+
+
+def classify_digit_column(iteration, offsets, target_trace, attacked_digit_columns):
+    """
+    Rank the guesses for a digit column by the log-likelihood of the target trace under the Gaussian templates of the
+    DBL operation processing this digit column (and the ADD operation processing it, if any), so no templates need to be
+    captured
+    :param iteration: Indicates which digit column we are currently attacking (63 indicates digit column 64)
+    :param offsets: The offsets to each operation (DBL, ADD, DBL, ..., DBL, ADD)
+    :param target_trace: The target trace
+    :param attacked_digit_columns: The previously attacked digit columns
+    :return: A list of (template digit column, log-likelihood, lag) tuples, where the lag is always 0
+    """
+    if operation_templates is None:
+        raise Exception("The Gaussian templates have not been loaded")
+    dbl_templates, add_templates, dbl_pois, add_pois = operation_templates
+    offset_idx = 63 - iteration
+    target_trace = np.asarray(target_trace)
+    dbl_offset, _ = offsets[2 * offset_idx]
+    log_likelihoods = dbl_templates[offset_idx].log_likelihoods(target_trace[dbl_offset + dbl_pois[offset_idx]])
+    if offset_idx > 0:
+        add_offset, _ = offsets[2 * (offset_idx - 1) + 1]
+        log_likelihoods = log_likelihoods + add_templates[offset_idx - 1].log_likelihoods(
+            target_trace[add_offset + add_pois[offset_idx - 1]])
+
+    is_first_iteration = iteration == 63
+    guesses = template_scalar_cache.template_digit_column_guesses(None if is_first_iteration else attacked_digit_columns)
+    return [(template_digit_column, log_likelihoods[scalar_recoding.digit_column_class(
+        scalar_recoding.digit_column_value(template_digit_column), template_digit_column[0, 0])], 0)
+            for template_digit_column, _ in guesses]
+
+
+def load_points_of_interest(sakura, offsets, use_decomposed_scalar=True, path=points_of_interest.DEFAULT_POI_PATH):
+    """
+    Load the stored points of interest, or determine them if there are none yet
+    :return: (dbl_pois, add_pois)
+    """
+    if os.path.exists(path):
+        dbl_pois, add_pois, _ = points_of_interest.load_points_of_interest(path)
+        return dbl_pois, add_pois
+    return determine_points_of_interest(sakura, offsets, use_decomposed_scalar=use_decomposed_scalar, path=path)
+
+
+def perform_scalar_mult(sakura, without_cfk=True, wait_for_completion=None):
     """
     Perform the FourQ scalar multiplication by sending the appropriate instructions to the hardware implementation of
     FourQ.
     :param sakura: The interface with the Sakura-G FPGA
     :param without_cfk: Whether we perform the scalar multiplication with co-factor killing.
+    :param wait_for_completion: Optional function blocking until the scalar multiplication is done (see
+    ftdi_interface.wait_while_busy), e.g. the acquisition of the oscilloscope
     :return: The result point of the scalar multiplication.
     """
     # Initialize
-    sakura.write_operation(0x00, 0x01)
-
-    # Wait until busy is done
-    while sakura.is_busy():
-        continue
+    run_operation(sakura, 0x01)
 
     if not without_cfk:
         # Cofactor killing
-        sakura.write_operation(0x00, 0x06)
-        while sakura.is_busy():
-            continue
+        run_operation(sakura, 0x06)
 
     # Pre-computation + Scalar multiplication + Affine
-    sakura.write_operation(0x00, 0x02)
-
-    while sakura.is_busy():
-        continue
+    run_operation(sakura, 0x02, wait_for_completion=wait_for_completion)
 
     result_point = fourq_scalar_mult.fourq_read_result_point(sakura)
     return result_point
 
 
+def run_operation(sakura, operation, wait_for_completion=None):
+    """
+    Start an operation of the FPGA and wait until it is done, expecting it to take about as long as its previous run
+    :param sakura: The interface with the Sakura-G FPGA
+    :param operation: The operation (LSB of the operation register)
+    :param wait_for_completion: See ftdi_interface.wait_while_busy
+    """
+    sakura.write_operation(0x00, operation)
+    operation_durations[operation] = sakura.wait_until_done(
+        expected_duration=expected_duration_fraction * operation_durations.get(operation, 0.0),
+        timeout=operation_timeout, wait_for_completion=wait_for_completion)
+
+
+def _wait_for_scope_acquisition(timeout):
+    """
+    Block until the armed acquisition of the oscilloscope has completed, for at most the given number of seconds
+    """
+    return bool(lecroy_if.wait_lecroy(timeout=timeout))
+
+
 def load_scalar(sakura, scalar, use_decomposed_scalar):
     """
     Load the given scalar to the FPGA
@@ -492,10 +711,51 @@ def load_target_trace(file_name="target_trace", directory="inspector_traces"):
     :return:
     """
     path = files.get_full_path(directory, file_name + ".npy")
+    if not os.path.exists(path):
+        # The target trace is also stored as a trace set when it is captured (see capture_trace)
+        with load_trace_set(file_name, directory) as trs_reader:
+            return np.asarray(trs_reader[0], dtype=int)
     target_trace = np.load(path)
     return target_trace
 
 
+def store_campaign_trace(trace, **metadata):
+    """
+    Append a trace to the trace store of the campaign (if a campaign directory is set), together with its metadata and
+    the oscilloscope settings of the campaign. See trace_store.TraceStore.append for the metadata.
+    :param trace: The captured trace
+    """
+    global campaign_store
+    if campaign_directory is None:
+        return
+    if campaign_store is None:
+        # The traces of a campaign are expected to have the length of the first trace
+        campaign_store = trace_store.TraceStore(campaign_directory, samples_per_trace=len(trace))
+    campaign_store.append(trace, scope_settings=scope_settings, **metadata)
+
+
+def close_campaign():
+    """
+    Close the trace store of the campaign (if any), after which no traces are stored until a new campaign directory is
+    set
+    """
+    global campaign_directory, campaign_store
+    if campaign_store is not None:
+        campaign_store.close()
+        campaign_store = None
+    campaign_directory = None
+
+
+def load_trace_set(file_name, directory="inspector_traces"):
+    """
+    Open a stored trace set (trs file) without loading it into memory.
+    :param file_name: The file name of the trace set (without extension)
+    :param directory: The directory of the trace set
+    :return: A trace_set_coding.TrsReader for the trace set
+    """
+    return trace_set_coding.TrsReader(files.get_full_path(directory, file_name + ".trs"))
+
+
 def save_as_csv(trace, file_name, directory="inspector_traces"):
     csv_content = []
     for sample, value in enumerate(trace):
@@ -521,64 +781,250 @@ def capture_trace(sakura, channel="C3", without_cfk=True, save_to_file=False, fi
     """
     # Prepare for capture
     lecroy_if.prepare_for_trace_capture()
-    perform_scalar_mult(sakura, without_cfk)
-    lecroy_if.wait_lecroy()
+    perform_scalar_mult(sakura, without_cfk,
+                        wait_for_completion=_wait_for_scope_acquisition if wait_for_scope_acquisition else None)
+    if not wait_for_scope_acquisition:
+        lecroy_if.wait_lecroy()
     channel_out_interpreted = lecroy_if.acquire_trace(channel)
     # Store trace to file
     if save_to_file:
         # Store in *.tsc format (Format specified by Inspector, see Appendix K of the Inspector manual)
-        trs_file_content = _encode_as_trs(channel_out_interpreted, file_name)
-        as_type = "byte"
-        _store_trs_encoded_trace(trs_file_content, file_name)
+        _store_as_trs(channel_out_interpreted, file_name)
 
     return channel_out_interpreted
 
 
+def capture_segmented_traces(sakura, nr_of_traces, channel="C3", without_cfk=True):
+    """
+    Capture multiple power traces of the loaded scalar using the sequence mode of the oscilloscope: the scalar
+    multiplications are performed back-to-back, after which all traces are transferred at once.
+    :param sakura: The FPGA interface
+    :param nr_of_traces: The number of traces to capture
+    :param channel: The channel to capture from
+    :param without_cfk: Whether to capture the traces with or without FourQ's cofactor killing enabled
+    :return: An (nr_of_traces, samples) array with the captured traces
+    """
+    lecroy_if.prepare_for_segmented_capture(nr_of_traces)
+    try:
+        for _ in range(nr_of_traces):
+            perform_scalar_mult(sakura, without_cfk)
+        lecroy_if.wait_lecroy()
+        captured_traces = lecroy_if.acquire_segmented_traces(channel, nr_of_traces)
+    finally:
+        lecroy_if.disable_sequence_mode()
+    return captured_traces
+
+
 def capture_average_from_multiple_traces(sakura, org_power_trace, nr_of_additional_traces, channel):
     """
-    Capture a power trace multiple times and return the average signal
+    Capture a power trace multiple times and return the average signal. When averaging_max_standard_error is set, the
+    capturing stops as soon as the average has converged.
     :param sakura:
     :param org_power_trace:
-    :param nr_of_additional_traces:
+    :param nr_of_additional_traces: The maximum number of additional traces to capture
     :param channel:
     :return:
     """
-    for i in range(nr_of_additional_traces):
-        captured_trace = capture_trace(sakura, channel)
-        min_lenght = min(len(captured_trace), len(org_power_trace))
-        np.add(org_power_trace[:min_lenght], captured_trace[:min_lenght], out=org_power_trace[:min_lenght])
-    org_power_trace = np.asarray(org_power_trace / (nr_of_additional_traces + 1), dtype=np.int32)
-    return org_power_trace
+    accumulator = trace_statistics.TraceAccumulator()
+    accumulator.add(org_power_trace)
+    if use_sequence_mode:
+        accumulator.add_traces(capture_segmented_traces(sakura, nr_of_additional_traces, channel))
+    else:
+        for i in range(nr_of_additional_traces):
+            accumulator.add(capture_trace(sakura, channel))
+            if averaging_max_standard_error is not None and \
+                    accumulator.has_converged(averaging_max_standard_error):
+                break
+    return np.asarray(accumulator.mean, dtype=np.int32)
 
 
-def _encode_as_trs(trace: np.ndarray, file_name="my_power_trace"):
+def capture_average_traces_pipelined(sakura, scalars, nr_of_traces_per_scalar, use_decomposed_scalar, channel="C3",
+                                     without_cfk=True, max_standard_error=None):
     """
-    Encode a power trace in trs format
-    :param trace:  The numpy array containing the power trace
-    :param file_name:  The file name to be encoded into the trace
-    :return:
+    Capture the (average) power trace for each of the given scalars, where the scalar loading and waveform decoding
+    are overlapped with the captures (see capture_pipeline.CapturePipeline). If the template board pool is running, the
+    traces of every scalar are split evenly over the given board and the boards of the pool (see
+    capture_round_on_all_boards).
+    With a maximum standard error, the traces are captured in rounds of averaging_batch_size traces per scalar, and a
+    scalar whose average has converged is left out of the next rounds.
+    :param sakura: The FPGA interface
+    :param scalars: The scalars to capture the power traces for
+    :param nr_of_traces_per_scalar: The number of traces to capture (and average) per scalar
+    :param use_decomposed_scalar: Whether the scalars are decomposed scalars
+    :param channel: The channel to capture from
+    :param without_cfk: Whether to capture the traces with or without FourQ's cofactor killing enabled
+    :param max_standard_error: Stop capturing a scalar once the standard error of its average is at most this value
+    (see trace_statistics.TraceAccumulator.has_converged), None always captures nr_of_traces_per_scalar traces
+    :return: A list with the (average) power trace of each scalar
+    """
+    if nr_of_traces_per_scalar == 1 and template_board_pool is None:
+        captured_traces = [None] * len(scalars)
+
+        def add_trace(idx, captured_trace):
+            captured_traces[idx] = captured_trace
+
+        capture_pipeline.CapturePipeline(lecroy_if, lambda scalar: load_scalar(sakura, scalar, use_decomposed_scalar),
+                                         lambda: perform_scalar_mult(sakura, without_cfk),
+                                         channel=channel).run(scalars, add_trace)
+        return captured_traces
+
+    accumulators = [trace_statistics.TraceAccumulator() for _ in scalars]
+    # Without a maximum standard error, all traces are captured in a single round
+    batch_size = nr_of_traces_per_scalar if max_standard_error is None else averaging_batch_size
+    while True:
+        round_indices = [idx for idx, accumulator in enumerate(accumulators)
+                         if len(accumulator) < nr_of_traces_per_scalar and
+                         (max_standard_error is None or not accumulator.has_converged(max_standard_error))]
+        if not round_indices:
+            break
+        round_scalars = [scalars[idx] for idx in round_indices]
+        nr_of_round_traces = [min(batch_size, nr_of_traces_per_scalar - len(accumulators[idx]))
+                              for idx in round_indices]
+        if template_board_pool is None:
+            round_accumulators = capture_round(sakura, round_scalars, nr_of_round_traces, use_decomposed_scalar,
+                                               channel, without_cfk)
+        else:
+            round_accumulators = capture_round_on_all_boards(sakura, round_scalars, nr_of_round_traces,
+                                                             use_decomposed_scalar, channel, without_cfk)
+        for idx, round_accumulator in zip(round_indices, round_accumulators):
+            accumulators[idx].merge(round_accumulator)
+    return [np.asarray(accumulator.mean, dtype=np.int32) for accumulator in accumulators]
+
+
+def capture_round(sakura, scalars, nr_of_traces, use_decomposed_scalar, channel="C3", without_cfk=True):
+    """
+    Capture the given number of traces of every scalar with the capture pipeline
+    :param sakura: The FPGA interface
+    :param scalars: The scalars to capture the power traces for
+    :param nr_of_traces: The number of traces to capture of every scalar
+    :param use_decomposed_scalar: Whether the scalars are decomposed scalars
+    :param channel: The channel to capture from
+    :param without_cfk: Whether to capture the traces with or without FourQ's cofactor killing enabled
+    :return: A trace_statistics.TraceAccumulator with the captured traces of every scalar
     """
-    # Store in *.tsc format (Format specified by Inspector, see Appendix K of the Inspector manual)
-    trs_file_content = trace_set_encoder.to_trs_format([trace], [], [file_name],
-                                                       len(trace),
-                                                       0,  # integer format
-                                                       1  # Sample length in bytes
-                                                       )
-    return trs_file_content
+    accumulators = [trace_statistics.TraceAccumulator() for _ in scalars]
+    # The index of the scalar of every capture
+    captures = [idx for idx, nr in enumerate(nr_of_traces) for _ in range(nr)]
+
+    def add_trace(capture_idx, captured_trace):
+        accumulators[captures[capture_idx]].add(captured_trace)
 
+    pipeline = capture_pipeline.CapturePipeline(lecroy_if,
+                                                lambda scalar: load_scalar(sakura, scalar, use_decomposed_scalar),
+                                                lambda: perform_scalar_mult(sakura, without_cfk),
+                                                channel=channel)
+    pipeline.run([scalars[idx] for idx in captures], add_trace)
+    return accumulators
 
-def _store_trs_encoded_trace(trs_encoded_trace, file_name):
+
+def capture_round_on_all_boards(sakura, scalars, nr_of_traces, use_decomposed_scalar, channel="C3", without_cfk=True):
+    """
+    Capture the given number of traces of every scalar, split evenly over the given board (in this process) and the
+    boards of the template board pool. Every share is a job covering all scalars, such that the average trace of every
+    scalar contains the same mix of boards (and oscilloscope channels), and their differences do not rank one template
+    above the other.
+    :param sakura: The FPGA interface of this process
+    :param scalars: The scalars to capture the power traces for
+    :param nr_of_traces: The number of traces to capture of every scalar
+    :param use_decomposed_scalar: Whether the scalars are decomposed scalars
+    :param channel: The channel of this process to capture from
+    :param without_cfk: Whether to capture the traces with or without FourQ's cofactor killing enabled
+    :return: A trace_statistics.TraceAccumulator with the captured traces of every scalar
+    """
+    nr_of_boards = len(template_board_pool) + 1
+    # The share of board b (0 being the board of this process) of every scalar
+    shares = [[nr // nr_of_boards + int(board_idx < nr % nr_of_boards) for nr in nr_of_traces]
+              for board_idx in range(nr_of_boards)]
+    local_accumulators = []
+
+    def capture_local_share():
+        local_accumulators.extend(capture_round(sakura, scalars, shares[0], use_decomposed_scalar, channel,
+                                                without_cfk))
+
+    pool_accumulators = template_board_pool.run([(scalars, share, use_decomposed_scalar, without_cfk)
+                                                 for share in shares[1:] if any(share)],
+                                                in_parallel=capture_local_share)
+    for board_accumulators in pool_accumulators:
+        for accumulator, board_accumulator in zip(local_accumulators, board_accumulators):
+            accumulator.merge(board_accumulator)
+    return local_accumulators
+
+
+def start_template_board_pool(sakura, base_point):
+    """
+    Start the pool of the other connected boards (see use_board_pool), unless it is already running for this base
+    point. Without other boards, the templates are captured on the given board.
+    :param sakura: The FPGA interface of this process, whose board is not part of the pool (but captures its share of
+    the templates in this process)
+    :param base_point: The base point of the attack
+    """
+    global template_board_pool
+    if template_board_pool is not None and template_board_pool.setup_args == (base_point,):
+        return
+    stop_template_board_pool()
+    boards = board_pool.discover_boards(board_pool_scope_addresses, board_pool_channels, exclude=(sakura.serial_no,))
+    if not boards:
+        print("[*] No other boards found, the templates are captured on a single board")
+        return
+    print("[*] Capturing the templates on {} additional board(s): {}".format(len(boards), boards))
+    template_board_pool = board_pool.BoardPool(boards, setup_pool_board, capture_pool_job, setup_args=(base_point,))
+    template_board_pool.start()
+
+
+def stop_template_board_pool():
+    global template_board_pool
+    if template_board_pool is not None:
+        template_board_pool.close()
+        template_board_pool = None
+
+
+def setup_pool_board(board, base_point):
+    """
+    Connect to a board of the pool and its oscilloscope, and load the ROM constants and base point (in the worker
+    process of the board)
+    :param board: The board_pool.Board
+    :param base_point: The base point of the attack
+    :return: The FPGA interface of the board
     """
-    Store a TRS encoded trace
-    :param trs_encoded_trace: the powertrace encoded as TRC
-    :param file_name: The file name to use when storing the file
+    global lecroy_if
+    sakura = ftdi_interface.SaseboGii(serial_no=board.serial_no)
+    lecroy_if = lecroy_interface.Lecroy(board.scope_address)
+    fourq_scalar_mult.fourq_initialize_rom(sakura)
+    x0, x1 = base_point[0]
+    y0, y1 = base_point[1]
+    fourq_scalar_mult.fourq_write_base_point(sakura, x0, x1, y0, y1)
+    return sakura
+
+
+def capture_pool_job(sakura, board, job):
+    """
+    Capture a share of the traces of a round (see capture_round_on_all_boards) on a board of the pool (in the worker
+    process of the board)
+    :param sakura: The FPGA interface of the board
+    :param board: The board_pool.Board
+    :param job: (scalars, nr_of_traces, use_decomposed_scalar, without_cfk)
+    :return: A trace_statistics.TraceAccumulator with the captured traces of every scalar
+    """
+    scalars, nr_of_traces, use_decomposed_scalar, without_cfk = job
+    return capture_round(sakura, scalars, nr_of_traces, use_decomposed_scalar, channel=board.channel,
+                         without_cfk=without_cfk)
+
+
+def _store_as_trs(trace: np.ndarray, file_name="my_power_trace"):
+    """
+    Store a power trace in trs format (Format specified by Inspector, see Appendix K of the Inspector manual)
+    :param trace: The numpy array containing the power trace
+    :param file_name: The file name to use when storing the file, which is also encoded into the trace as its title
     """
     dir = "inspector_traces"
     extension = ".trs"
     abs_path = files.get_full_path(dir, file_name + extension)
     os.makedirs(os.path.dirname(abs_path), exist_ok=True)
-    with open(abs_path, "wb+") as f:
-        f.write(trs_encoded_trace)
+    with trace_set_coding.TrsWriter(abs_path, len(trace),
+                                    0,  # integer format
+                                    1,  # Sample length in bytes
+                                    title_space_len=len(file_name.encode("utf8"))) as trs_writer:
+        trs_writer.write_trace(trace, file_name)
 
 
 def save_trace_as_file(power_trace, file_name):
@@ -588,78 +1034,26 @@ def save_trace_as_file(power_trace, file_name):
     :param file_name:
     :return:
     """
-    encoded_trace = _encode_as_trs(power_trace, file_name)
-    _store_trs_encoded_trace(encoded_trace, file_name)
-
-
-def _get_min_max_indices(trace: np.ndarray, threshold, nth_diff):
-    """
-    Determine the min and max indices for a given power trace using the given threshold
-    :param trace: The power trace
-    :param threshold: The threshold to use when determining the rising and falling edges
-    :return: The local min and max indices for the given power trace
-    """
-    # Calculate the differences between consecutive elements of an array.
-    diff_consec_vals = np.diff(trace, n=nth_diff)
-    # Determine which values indicate a rising/falling edge (i.e. the start or end of a trigger)
-    min_and_max_indices = np.where(abs(diff_consec_vals) > threshold)[0]
-    # These indices are off by nth-diff compared to the values in the trigger trace,
-    # out[n] = a[n+1] - a[n] thus we add n to each element in the array
-    min_and_max_indices += nth_diff
-    return min_and_max_indices
+    _store_as_trs(power_trace, file_name)
 
 
-def determine_offsets_static(oper_trigger_trace, nth_diff):
+def determine_offsets_static(oper_trigger_trace, min_pulse_width=1, decimation=1):
     """
      If we generate a template for the corresponding operation in the target trace, we need to deal with offsets and such:
     * the offset to the first iteration
     * the offset after the start of an iteration to the operation we want to consider (i.e. the DLB operation)
     * the offset from the beginning to the end of the operation
-    This function does exactly calculate these offsets
-    :return:
+    This function does exactly calculate these offsets (see operation_offsets), and raises an exception if the trigger
+    trace does not contain the expected 64 DBL and 64 ADD operations
+    :param oper_trigger_trace: The operation trigger trace (channel C2), which may be decimated
+    :param min_pulse_width: Trigger pulses (and gaps between them) shorter than this number of samples are ignored
+    :param decimation: The factor by which the trigger trace was decimated
+    :return: The offsets as a list of (start, duration) tuples in the order DBL, ADD, DBL, ..., DBL, ADD
     """
-    # Determine the min and max indices for the operation trigger trace (indicating start/end of DBL/ADD)
-    # First we zero out all low values in the trace
-    # Average min and max values in the power trace
-    min_val = np.min(oper_trigger_trace)
-    max_val = np.max(oper_trigger_trace)
-    min_max_avg = (min_val + max_val) / 2.0
-
-    # Determine all values lower and higher than this average
-    high_values_flag = oper_trigger_trace > min_max_avg
-    low_values_flag = oper_trigger_trace <= min_max_avg
-    trace_high = oper_trigger_trace[high_values_flag]
-    trace_low = oper_trigger_trace[low_values_flag]
-
-    # Determine Least Upper Bound and Greatest Lower Bound
-    lub = np.min(trace_high)
-    glb = np.max(trace_low)
-
-    threshold = (lub + glb) / 2.0
-
-    # Clip values above threshold to max and below to min
-    above_threshold_flag = oper_trigger_trace > threshold
-    below_threshold_flag = oper_trigger_trace <= threshold
-    oper_trigger_trace[above_threshold_flag] = max_val
-    oper_trigger_trace[below_threshold_flag] = min_val
-
-    # save_trace_as_file(oper_trigger_trace, "oper_trigger_trace_modified")
-
-    min_and_max_indices = _get_min_max_indices(oper_trigger_trace, threshold, nth_diff)
-
-    # Calculate the offsets for both rising edges and their duration
-    offsets = []
-    for idx, min_max_idx in enumerate(min_and_max_indices):
-        # Stop if we hit the last element in the list
-        if idx == len(min_and_max_indices) - 1:
-            break
-        # Determine the between the two successive min/max indices
-        next_min_max_idx = min_and_max_indices[idx + 1]
-        duration = next_min_max_idx - min_max_idx
-        # Only store the offsets if they belong to a rising edge
-        if oper_trigger_trace[min_max_idx] >= threshold:
-            offsets.append((min_max_idx, duration))
-    return offsets
+    dbl_offsets, add_offsets = operation_offsets.determine_operation_offsets(oper_trigger_trace,
+                                                                             min_pulse_width=min_pulse_width,
+                                                                             decimation=decimation)
+    return operation_offsets.interleave_offsets(dbl_offsets, add_offsets)
 
 
 def apply_fft(power_trace):
@@ -672,23 +1066,6 @@ def apply_fft(power_trace):
     return result
 
 
-def correlate(template_doubling_trace, target_doubling_trace):
-    """
-    Correlate the template trace containing the doubling operation with the target trace and the corresponding doubling
-    operation
-    :param template_doubling_trace: The template trace of the doubling operation we want to attack.
-    :param target_doubling_trace: The target trace of the doubling operation we want to attack.
-    :return:
-    """
-    correlation_matrix = np.corrcoef(template_doubling_trace, target_doubling_trace)
-    """
-    This correlation matrix have 2 rows and 2 columns (with 1's on the diagonal).
-    Its symmetric in the diagonal and both the second row and the first element or the first row and the second element
-    contain the wanted correlation coefficient of the two input arrays.
-    """
-    return correlation_matrix[1, 0]
-
-
 def plot_traces_to_pdf(digit_col: str, dir="inspector_traces", overlap=False, overlap_file_name="plot_templates_overlap"):
     """
     Plot a trace and store as PDF using Matplotlib
@@ -785,6 +1162,8 @@ def prepare_ota():
     recapture_target_trace = False
     average_template_signals = True
     plot_intermediate_templates = False
+    use_points_of_interest = False
+    use_gaussian_templates = False
 
     # First test vector in the test vectors provided by the hardware implementation
     p_x = (4278750285544105074676860908476659235, 129913138569548007992917457078809919071)
@@ -799,79 +1178,73 @@ def prepare_ota():
         # k1, k2, k3, k4 = [5592475829050469997, 13327419138273583453, 2309149956473561138, 5859400630064857171]
         scalar_to_attack = k4 << 192 | k3 << 128 | k2 << 64 | k1
 
-    start_time = time.time()
-    print("Time start: {}".format(datetime.datetime.now().strftime("%a, %d %B %Y %H:%M:%S")))
-
-    # Best way to verify these values is to call the "get_panel" method and lookup the values for a given channel
-    # (bandwidth, VerScale, VerOffset
-    # set_bandwidth, set_volt_per_div, set_vertical_offset
-    settings = [
-        ("20MHZ", 3.4e-3, 7.0e-3),
-        ("200MHZ", 4.0e-3, 8.2e-3),
-        ("OFF", 5.10e-3, 6.0e-3)
-    ]
-
-    for oscilloscope_settings in settings[:1]:
-        bandwidth, ver_scale, ver_offset = oscilloscope_settings
-        # Set the appropriate settings
-        # lecroy_if.set_bandwidth_limit("C3", bandwidth)
-        # lecroy_if.set_volts_div("C3", ver_scale)
-        # lecroy_if.set_vertical_offset("C3", ver_scale)
-        for additional_traces in [50]:
-            global nr_of_additional_traces
-            nr_of_additional_traces = additional_traces
-            ranks_per_iter = []
-            if average_template_signals:
-                print("Nr of additional template traces: {}".format(nr_of_additional_traces))
-            if recapture_target_trace:
-                print("Recapture target trace: {}".format(recapture_target_trace))
-            for i in range(10):
-                # online_template_attack launches the attack
-                rank_per_iter = online_template_attack(base_point, scalar_to_attack,
-                                                       use_decomposed_scalar=use_decomposed_scalar,
-                                                       average_template_signals=average_template_signals,
-                                                       max_nr_of_iterations=4,
-                                                       recapture_target_trace=recapture_target_trace,
-                                                       plot_intermediate_templates=plot_intermediate_templates,
-                                                       enable_output=False
-                                                       )
-                gc.collect()
-                ranks_per_iter.append(rank_per_iter)
-                recapture_target_trace &= False
-                print("Iteration {}, Recapture target trace: {}".format(i, recapture_target_trace))
-            ranks_per_iter = np.array(ranks_per_iter)
-
-            # Group ranks of same iteration together, print there standard deviation and average
-            print("Time end: {}".format(datetime.datetime.now().strftime("%a, %d %B %Y %H:%M:%S")))
-            print("Elapsed time: {}".format((time.time() - start_time) / 60))
-            print("\nSTART OF RESULTS")
-            for i in range(ranks_per_iter.shape[1]):
-                column = ranks_per_iter[:, i]
-                avg = np.average(column)
-                print("Average rank of ranks in iteration {} : {}".format(63 - i, avg))
-                median = np.median(column)
-                print("Median rank of ranks in iteration {} : {}".format(63 - i, median))
-                std_dev = np.std(column)
-                print("Standard deviation of rank in ranks of iteration {} : {}".format(63 - i, std_dev))
-                print("Min value: {}".format(np.min(column)))
-                print("Max value: {}".format(np.max(column)))
-
-            # Statistics for the settings as a whole
-            ranks_per_iter = ranks_per_iter.flatten()
-            avg = np.average(ranks_per_iter)
-            median = np.median(ranks_per_iter)
-            std_dev = np.std(ranks_per_iter)
-            min_val = np.min(ranks_per_iter)
-            max_val = np.max(ranks_per_iter)
-            print()
-            print("--------------------------")
-            print("FINAL RESULTS")
-            print("--------------------------")
-            print("Average:\t {}".format(avg))
-            print("Median: \t {}".format(median))
-            print("Standard dev:\t {}".format(std_dev))
-            print("Nr of times guessed correctly:\t {}".format(np.count_nonzero(ranks_per_iter == 1)))
-            print("END OF RESULTS")
+    # Precompute the multi-scalars of all templates offline, such that repeated attacks only pay for the captures
+    global template_scalars
+    template_scalars = template_scalar_cache.TemplateScalarCache()
+    try:
+        recoded_target_matrix = scalar_recoding.recode_multi_scalar_general_unoptimized(
+            np.asarray(decomposed_scalar, dtype=np.uint64), 2 ** 256)
+        template_scalars.precompute(recoded_target_matrix)
+
+        start_time = time.time()
+        print("Time start: {}".format(datetime.datetime.now().strftime("%a, %d %B %Y %H:%M:%S")))
+
+        # Store all captured traces of this campaign in a single trace store
+        global campaign_directory
+        campaign_directory = files.get_full_path("campaigns", datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
+
+        # Best way to verify these values is to call the "get_panel" method and lookup the values for a given channel
+        # (bandwidth, VerScale, VerOffset
+        # set_bandwidth, set_volt_per_div, set_vertical_offset
+        settings = [
+            ("20MHZ", 3.4e-3, 7.0e-3),
+            ("200MHZ", 4.0e-3, 8.2e-3),
+            ("OFF", 5.10e-3, 6.0e-3)
+        ]
+
+        for oscilloscope_settings in settings[:1]:
+            bandwidth, ver_scale, ver_offset = oscilloscope_settings
+            global scope_settings
+            scope_settings = {"bandwidth": bandwidth, "ver_scale": ver_scale, "ver_offset": ver_offset}
+            # Set the appropriate settings
+            # lecroy_if.set_bandwidth_limit("C3", bandwidth)
+            # lecroy_if.set_volts_div("C3", ver_scale)
+            # lecroy_if.set_vertical_offset("C3", ver_scale)
+            for additional_traces in [50]:
+                global nr_of_additional_traces
+                nr_of_additional_traces = additional_traces
+                ranks_per_iter = []
+                if average_template_signals:
+                    print("Nr of additional template traces: {}".format(nr_of_additional_traces))
+                if recapture_target_trace:
+                    print("Recapture target trace: {}".format(recapture_target_trace))
+                for i in range(10):
+                    # online_template_attack launches the attack
+                    rank_per_iter = online_template_attack(base_point, scalar_to_attack,
+                                                           use_decomposed_scalar=use_decomposed_scalar,
+                                                           average_template_signals=average_template_signals,
+                                                           max_nr_of_iterations=4,
+                                                           recapture_target_trace=recapture_target_trace,
+                                                           plot_intermediate_templates=plot_intermediate_templates,
+                                                           enable_output=False,
+                                                           use_points_of_interest=use_points_of_interest,
+                                                           use_gaussian_templates=use_gaussian_templates
+                                                           )
+                    gc.collect()
+                    ranks_per_iter.append(rank_per_iter)
+                    recapture_target_trace &= False
+                    print("Iteration {}, Recapture target trace: {}".format(i, recapture_target_trace))
+                ranks_per_iter = np.array(ranks_per_iter)
+
+                # Group ranks of same iteration together, print there standard deviation and average
+                print("Time end: {}".format(datetime.datetime.now().strftime("%a, %d %B %Y %H:%M:%S")))
+                print("Elapsed time: {}".format((time.time() - start_time) / 60))
+                scoring.print_rank_statistics(ranks_per_iter)
+    finally:
+        template_scalars.close()
+        template_scalars = None
+        stop_template_board_pool()
+        close_campaign()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+import numpy as np
+
+from online_template_attack import trace_statistics
+from utils import files
+
+DEFAULT_POI_PATH = files.get_full_path("online_template_attack", "points_of_interest.npz")
+
+# The statistics that can be used to rank the samples of an operation window
+STATISTICS = ("snr", "sost", "ttest")
+
+
+def snr(means, variances):
+    """
+    Signal-to-noise ratio: the variance of the class means over the average variance within the classes.
+    :param means: A (C, S) matrix with the mean of every class
+    :param variances: A (C, S) matrix with the variance of every class
+    :return: The SNR of every sample
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.var(means, axis=0) / np.mean(variances, axis=0)
+
+
+def _pairwise_t_squared(means, variances, counts):
+    """
+    :return: A (P, S) matrix with the squared Welch t-statistic of every pair of classes and every sample
+    """
+    first, second = np.triu_indices(len(means), k=1)
+    standard_errors = variances / counts[:, np.newaxis]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.square(means[first] - means[second]) / (standard_errors[first] + standard_errors[second])
+
+
+def sost(means, variances, counts):
+    """
+    Sum of squared pairwise t-differences (Gierlichs et al.).
+    :param means: A (C, S) matrix with the mean of every class
+    :param variances: A (C, S) matrix with the variance of every class
+    :param counts: The number of traces of every class
+    :return: The SOST of every sample
+    """
+    return np.sum(_pairwise_t_squared(means, variances, counts), axis=0)
+
+
+def t_test(means, variances, counts):
+    """
+    :param means: A (C, S) matrix with the mean of every class
+    :param variances: A (C, S) matrix with the variance of every class
+    :param counts: The number of traces of every class
+    :return: The largest absolute Welch t-statistic of all pairs of classes for every sample
+    """
+    return np.sqrt(np.max(_pairwise_t_squared(means, variances, counts), axis=0))
+
+
+def select_points_of_interest(statistic, nr_of_pois, min_spacing=1):
+    """
+    Select the samples with the highest statistic, such that the selected samples are at least min_spacing samples
+    apart (neighbouring samples of the same clock cycle carry the same information).
+    :param statistic: The statistic of every sample (NaN is never selected)
+    :param nr_of_pois: The (maximum) number of samples to select
+    :param min_spacing: The minimum distance between two selected samples
+    :return: The sorted indices of the selected samples (fewer than nr_of_pois if the spacing does not allow more)
+    """
+    remaining = np.nan_to_num(np.asarray(statistic, dtype=np.float64), nan=-np.inf, posinf=np.finfo(np.float64).max)
+    pois = []
+    for _ in range(nr_of_pois):
+        poi = int(np.argmax(remaining))
+        if remaining[poi] == -np.inf:
+            break
+        pois.append(poi)
+        # Exclude all samples within the spacing of the selected sample
+        remaining[max(poi - min_spacing + 1, 0):poi + min_spacing] = -np.inf
+    return np.sort(np.array(pois, dtype=np.int64))
+
+
+class PoiProfiler:
+    """
+    Determine the points of interest of a set of operation windows from profiling traces. The samples of every window
+    are streamed into per-class accumulators (one per class label, e.g. the value of the processed digit column), so
+    that the profiling traces themselves do not need to be kept.
+    """
+
+    def __init__(self, windows, nr_of_classes):
+        """
+        :param windows: A list of (offset, duration) tuples with the operation windows in the traces
+        :param nr_of_classes: The number of classes (labels are 0, ..., nr_of_classes - 1)
+        """
+        self.windows = list(windows)
+        self.nr_of_classes = nr_of_classes
+        self._accumulators = [[trace_statistics.TraceAccumulator(duration) for _ in range(nr_of_classes)]
+                              for _, duration in self.windows]
+
+    def add_trace(self, trace, labels):
+        """
+        Add a profiling trace.
+        :param trace: The profiling trace
+        :param labels: The class label of every window in this trace
+        """
+        if len(labels) != len(self.windows):
+            raise Exception("Expected {} labels (one per window), got {}".format(len(self.windows), len(labels)))
+        for (offset, duration), accumulators, label in zip(self.windows, self._accumulators, labels):
+            accumulators[label].add(trace[offset:offset + duration])
+
+    def class_statistics(self, window_idx):
+        """
+        :param window_idx: The index of the window
+        :return: (means, variances, counts) of the classes with at least two traces in this window
+        """
+        accumulators = [accumulator for accumulator in self._accumulators[window_idx] if accumulator.count >= 2]
+        if len(accumulators) < 2:
+            raise Exception("At least two classes with two traces are needed, window {} has {}".format(
+                window_idx, len(accumulators)))
+        nr_of_samples = min(accumulator.nr_of_samples for accumulator in accumulators)
+        means = np.array([accumulator.mean[:nr_of_samples] for accumulator in accumulators])
+        variances = np.array([accumulator.variance[:nr_of_samples] for accumulator in accumulators])
+        counts = np.array([accumulator.count for accumulator in accumulators])
+        return means, variances, counts
+
+    def statistic(self, window_idx, statistic="snr"):
+        """
+        :param window_idx: The index of the window
+        :param statistic: "snr", "sost" or "ttest"
+        :return: The statistic of every sample of the window
+        """
+        means, variances, counts = self.class_statistics(window_idx)
+        if statistic == "snr":
+            return snr(means, variances)
+        if statistic == "sost":
+            return sost(means, variances, counts)
+        if statistic == "ttest":
+            return t_test(means, variances, counts)
+        raise Exception("Unknown statistic {}, valid statistics are: {}".format(statistic, STATISTICS))
+
+    def select(self, nr_of_pois, min_spacing=1, statistic="snr"):
+        """
+        :return: A list with the points of interest (relative to the start of the window) of every window
+        """
+        return [select_points_of_interest(self.statistic(window_idx, statistic), nr_of_pois, min_spacing)
+                for window_idx in range(len(self.windows))]
+
+
+def save_points_of_interest(dbl_pois, add_pois, path=DEFAULT_POI_PATH, **settings):
+    """
+    Store the points of interest of the DBL and ADD operations.
+    :param dbl_pois: A list with the points of interest (relative to the start of the window) of every DBL operation
+    :param add_pois: A list with the points of interest (relative to the start of the window) of every ADD operation
+    :param path: The path of the .npz file
+    :param settings: The settings used to determine the points of interest (e.g. statistic="snr"), stored along
+    """
+    arrays = {"dbl_{}".format(idx): np.asarray(pois, dtype=np.int64) for idx, pois in enumerate(dbl_pois)}
+    arrays.update({"add_{}".format(idx): np.asarray(pois, dtype=np.int64) for idx, pois in enumerate(add_pois)})
+    arrays.update({"setting_{}".format(name): np.asarray(value) for name, value in settings.items()})
+    np.savez(path, nr_of_dbl=len(dbl_pois), nr_of_add=len(add_pois), **arrays)
+
+
+def load_points_of_interest(path=DEFAULT_POI_PATH):
+    """
+    :param path: The path of the .npz file
+    :return: (dbl_pois, add_pois, settings) as stored by save_points_of_interest
+    """
+    with np.load(path) as stored:
+        dbl_pois = [stored["dbl_{}".format(idx)] for idx in range(int(stored["nr_of_dbl"]))]
+        add_pois = [stored["add_{}".format(idx)] for idx in range(int(stored["nr_of_add"]))]
+        settings = {name[len("setting_"):]: stored[name].item() for name in stored.files if name.startswith("setting_")}
+    return dbl_pois, add_pois, settings
@@ -0,0 +1,219 @@
+import collections
+import concurrent.futures
+
+import numpy as np
+
+from fourq_software import scalar_recoding
+from online_template_attack import operation_offsets, scoring, trace_store
+
+# The settings of the attack that can be varied when replaying a campaign:
+# - use_fft: Whether to correlate the FFT of the doubling operation
+# - offset_into_start / offset_from_end: The number of samples to trim at the start / end of every operation
+# - nr_of_averaged_templates: The number of stored template traces that are averaged into one template
+# - max_lag: The maximum lag (in samples) of the alignment search, 0 to disable it
+ReplaySettings = collections.namedtuple("ReplaySettings", ["use_fft", "offset_into_start", "offset_from_end",
+                                                           "nr_of_averaged_templates", "max_lag"])
+
+DEFAULT_SETTINGS = ReplaySettings(use_fft=False, offset_into_start=0, offset_from_end=0, nr_of_averaged_templates=1,
+                                  max_lag=0)
+
+
+class Campaign:
+    """
+    The target trace, operation offsets and template traces of a campaign stored in a trace store (see
+    ota.store_campaign_trace), from which the attack can be replayed without the hardware.
+    """
+
+    def __init__(self, directory, offsets=None, min_pulse_width=1, decimation=1):
+        """
+        :param directory: The directory of the trace store of the campaign
+        :param offsets: The offsets to each operation (DBL, ADD, DBL, ..., DBL, ADD), by default determined from the
+        stored operation trigger trace
+        :param min_pulse_width: See operation_offsets.detect_pulses
+        :param decimation: See operation_offsets.detect_pulses
+        """
+        self.store = trace_store.TraceStore(directory)
+        target_indices = self.store.select(label="target")
+        if not target_indices:
+            self.store.close()
+            raise Exception("The campaign in {} does not contain a target trace".format(directory))
+        # The last captured target trace is the one the templates were captured for
+        target_metadata = self.store.get_metadata(target_indices[-1])
+        if target_metadata["multi_scalar"] is None:
+            self.store.close()
+            raise Exception("The multi-scalar of the target trace is not stored, so the attack can not be ranked")
+        self.target_trace = self._stored_trace(target_metadata)
+        self.recoded_secret_scalar_matrix = scalar_recoding.recode_multi_scalar_general_unoptimized(
+            np.asarray(target_metadata["multi_scalar"], dtype=np.uint64), 2 ** 256)
+
+        if offsets is None:
+            trigger_indices = self.store.select(label="trigger")
+            if not trigger_indices:
+                self.store.close()
+                raise Exception("The campaign in {} does not contain an operation trigger trace".format(directory))
+            trigger_trace = self._stored_trace(self.store.get_metadata(trigger_indices[-1]))
+            dbl_offsets, add_offsets = operation_offsets.determine_operation_offsets(
+                trigger_trace, min_pulse_width=min_pulse_width, decimation=decimation)
+            offsets = operation_offsets.interleave_offsets(dbl_offsets, add_offsets)
+        self.offsets = offsets
+
+        # The indices of the template traces per iteration and per (sign, digit column value)
+        self.template_indices = collections.defaultdict(collections.OrderedDict)
+        for idx in self.store.select(label="template"):
+            metadata = self.store.get_metadata(idx)
+            self.template_indices[metadata["iteration"]].setdefault(
+                (metadata["sign"], metadata["digit_column"]), []).append(idx)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _stored_trace(self, metadata):
+        """
+        :return: The samples of a stored trace without the padding of the trace store
+        """
+        return self.store.traces[metadata["idx"], :metadata["nr_of_samples"]]
+
+    @property
+    def iterations(self):
+        """
+        :return: The iterations with template traces, starting from iteration 63
+        """
+        return sorted(self.template_indices, reverse=True)
+
+    def expected_digit_column(self, iteration):
+        """
+        :return: The digit column of the secret scalar that is attacked in the given iteration
+        """
+        return self.recoded_secret_scalar_matrix[:, 63 - iteration]
+
+    def nr_of_runs(self, iteration, nr_of_averaged_templates=1):
+        """
+        :return: The number of times the given iteration can be attacked with distinct template traces
+        """
+        templates = self.template_indices.get(iteration)
+        if not templates:
+            return 0
+        return min(len(indices) for indices in templates.values()) // nr_of_averaged_templates
+
+    def template_traces(self, iteration, nr_of_averaged_templates=1, run=0):
+        """
+        :param iteration: The iteration
+        :param nr_of_averaged_templates: The number of stored template traces that are averaged into one template
+        :param run: Which template traces to use, run r averages the stored traces r * n, ..., (r + 1) * n - 1 of
+        every digit column
+        :return: (template_traces, template_digit_columns) of the given iteration, with the templates of the digit
+        columns that do not have enough stored traces left out
+        """
+        template_traces = []
+        template_digit_columns = []
+        for (sign, value), indices in self.template_indices.get(iteration, {}).items():
+            selected = indices[run * nr_of_averaged_templates:(run + 1) * nr_of_averaged_templates]
+            if not selected:
+                continue
+            template_traces.append(np.mean(self.store.traces[selected], axis=0))
+            template_digit_columns.append(scalar_recoding.generate_digit_column_for_value(value, sign))
+        return template_traces, template_digit_columns
+
+    def close(self):
+        self.store.close()
+
+
+def replay_digit_column(campaign, iteration, settings=DEFAULT_SETTINGS, run=0, dtype=np.float64):
+    """
+    Attack a digit column with the stored template traces, like ota.attack_digit_column.
+    :param campaign: The Campaign
+    :param iteration: Indicates which digit column we are attacking (63 indicates digit column 64)
+    :param settings: The ReplaySettings
+    :param run: Which template traces to use (see Campaign.template_traces)
+    :param dtype: The floating point type to correlate in
+    :return: A list of (template digit column, correlation coefficient, lag) tuples
+    """
+    template_traces, template_digit_columns = campaign.template_traces(iteration, settings.nr_of_averaged_templates,
+                                                                       run)
+    if not template_traces:
+        return []
+    dbl_window, add_window = scoring.operation_windows(campaign.offsets, iteration, settings.offset_into_start,
+                                                       settings.offset_from_end)
+    coeffs, lags = scoring.correlate_digit_column(template_traces, campaign.target_trace, dbl_window, add_window,
+                                                  use_fft=settings.use_fft, max_lag=settings.max_lag, dtype=dtype)
+    return list(zip(template_digit_columns, coeffs, lags))
+
+
+def replay_iteration(campaign, iteration, settings=DEFAULT_SETTINGS, nr_of_runs=None):
+    """
+    :param campaign: The Campaign
+    :param iteration: The iteration to attack
+    :param settings: The ReplaySettings
+    :param nr_of_runs: The number of runs (each with distinct template traces), by default as many as possible
+    :return: The rank of the correct digit column in every run. If the correct digit column has no template (the
+    templates of a campaign follow the digit columns guessed during the attack), it is ranked after all templates.
+    """
+    if nr_of_runs is None:
+        nr_of_runs = campaign.nr_of_runs(iteration, settings.nr_of_averaged_templates)
+    ranks = []
+    for run in range(nr_of_runs):
+        results = replay_digit_column(campaign, iteration, settings, run)
+        rank = scoring.rank_of_expected(results, campaign.expected_digit_column(iteration))
+        ranks.append(rank if rank is not None else len(results) + 1)
+    return ranks
+
+
+def replay_attack(campaign, settings=DEFAULT_SETTINGS, iterations=None, nr_of_runs=None):
+    """
+    Replay the attack of a campaign with the given settings.
+    :param campaign: The Campaign
+    :param settings: The ReplaySettings
+    :param iterations: The iterations to attack, by default all iterations with template traces
+    :param nr_of_runs: The number of runs, by default the largest number of runs all iterations support
+    :return: An (R, I) matrix with the rank of the correct digit column in each of the I iterations for each of R runs,
+    as used by scoring.rank_statistics
+    """
+    iterations = campaign.iterations if iterations is None else iterations
+    if nr_of_runs is None:
+        nr_of_runs = min(campaign.nr_of_runs(iteration, settings.nr_of_averaged_templates) for iteration in iterations)
+    ranks_per_iter = [replay_iteration(campaign, iteration, settings, nr_of_runs) for iteration in iterations]
+    return np.array(ranks_per_iter, dtype=np.int64).reshape(len(iterations), nr_of_runs).T
+
+
+# The campaign opened by every worker process of a sweep
+_worker_campaign = None  # type: Campaign
+
+
+def _open_worker_campaign(directory, offsets):
+    global _worker_campaign
+    _worker_campaign = Campaign(directory, offsets=offsets)
+
+
+def _replay_worker_iteration(iteration, settings, nr_of_runs):
+    return replay_iteration(_worker_campaign, iteration, settings, nr_of_runs)
+
+
+def sweep(directory, settings_list, iterations=None, max_workers=None, offsets=None):
+    """
+    Replay the attack of a campaign for every given setting, distributing the iterations of all settings over a pool of
+    worker processes (each of which opens the campaign once).
+    :param directory: The directory of the trace store of the campaign
+    :param settings_list: A list of ReplaySettings
+    :param iterations: The iterations to attack, by default all iterations with template traces
+    :param max_workers: The number of worker processes (by default the number of processors), 1 replays in this process
+    :param offsets: The offsets to each operation, by default determined from the stored operation trigger trace
+    :return: A list with the (R, I) rank matrix (see replay_attack) of every setting
+    """
+    with Campaign(directory, offsets=offsets) as campaign:
+        iterations = campaign.iterations if iterations is None else iterations
+        runs_per_settings = [min(campaign.nr_of_runs(iteration, settings.nr_of_averaged_templates)
+                                 for iteration in iterations) for settings in settings_list]
+        if max_workers == 1:
+            return [replay_attack(campaign, settings, iterations, nr_of_runs)
+                    for settings, nr_of_runs in zip(settings_list, runs_per_settings)]
+        offsets = campaign.offsets
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_open_worker_campaign,
+                                                initargs=(directory, offsets)) as executor:
+        futures = [[executor.submit(_replay_worker_iteration, iteration, settings, nr_of_runs)
+                    for iteration in iterations] for settings, nr_of_runs in zip(settings_list, runs_per_settings)]
+        return [np.array([future.result() for future in settings_futures], dtype=np.int64).reshape(
+            len(iterations), nr_of_runs).T for settings_futures, nr_of_runs in zip(futures, runs_per_settings)]
@@ -0,0 +1,151 @@
+import operator
+
+import numpy as np
+
+from online_template_attack import correlation
+
+
+def operation_windows(offsets, iteration, offset_into_start=0, offset_from_end=0):
+    """
+    Determine the windows of the target trace that are used to attack a digit column: the doubling operation processing
+    the digit column and, if not the first and last iteration of the main loop, the preceding addition operation.
+    :param offsets: The offsets to each operation (DBL, ADD, DBL, ..., DBL, ADD)
+    :param iteration: Indicates which digit column we are attacking (63 indicates digit column 64)
+    :param offset_into_start: The number of samples to skip at the start of each operation
+    :param offset_from_end: The number of samples to skip at the end of each operation
+    :return: (dbl_window, add_window) as (offset, duration) tuples, where add_window is None if it is not used (in the
+    last iteration, the addition operation is used instead of the doubling operation)
+    """
+    dbl_offsets = offsets[0::2]
+    add_offsets = offsets[1::2]
+    offset_idx = 63 - iteration
+    is_first_iteration = iteration == 63
+    is_last_iteration = iteration == 0
+
+    offset_to_oper, duration_of_oper = dbl_offsets[offset_idx] if not is_last_iteration else add_offsets[offset_idx]
+    dbl_window = (offset_to_oper + offset_into_start, duration_of_oper - offset_into_start - offset_from_end)
+    add_window = None
+    if not is_first_iteration and not is_last_iteration:
+        offset_to_add_oper, duration_of_add_oper = add_offsets[offset_idx - 1]
+        add_window = (offset_to_add_oper + offset_into_start,
+                      duration_of_add_oper - offset_into_start - offset_from_end)
+    return dbl_window, add_window
+
+
+def operation_samples(offsets, iteration, pois):
+    """
+    Determine the samples of the target trace that are used to attack a digit column when only the Points of Interests
+    (POIs) of the operations are correlated (see operation_windows for the operations that are used).
+    :param offsets: The offsets to each operation (DBL, ADD, DBL, ..., DBL, ADD)
+    :param iteration: Indicates which digit column we are attacking (63 indicates digit column 64)
+    :param pois: (dbl_pois, add_pois), the POIs of every operation relative to its start
+    :return: (dbl_samples, add_samples), where add_samples is None if the addition operation is not used
+    """
+    dbl_pois, add_pois = pois
+    offset_idx = 63 - iteration
+    is_first_iteration = iteration == 63
+    is_last_iteration = iteration == 0
+    if not is_last_iteration:
+        dbl_samples = offsets[2 * offset_idx][0] + np.asarray(dbl_pois[offset_idx])
+    else:
+        dbl_samples = offsets[2 * offset_idx + 1][0] + np.asarray(add_pois[offset_idx])
+    add_samples = None
+    if not is_first_iteration and not is_last_iteration:
+        add_samples = offsets[2 * (offset_idx - 1) + 1][0] + np.asarray(add_pois[offset_idx - 1])
+    return dbl_samples, add_samples
+
+
+def correlate_digit_column(template_traces, target_trace, dbl_window, add_window=None, use_fft=False, max_lag=0,
+                           dbl_samples=None, add_samples=None, dtype=np.float64):
+    """
+    Calculate the Pearson correlation coefficients between all template traces and the target trace at once, averaged
+    over the doubling and addition window (if any).
+    :param template_traces: The template traces
+    :param target_trace: The target trace
+    :param dbl_window: The (offset, duration) of the doubling operation
+    :param add_window: The (offset, duration) of the addition operation, or None
+    :param use_fft: Whether to correlate the FFT of the doubling operation
+    :param max_lag: If larger than 0 (and FFT is not used), search the best aligned correlation within this many
+    samples
+    :param dbl_samples: If given, only these samples of the doubling operation (and add_samples of the addition
+    operation) are correlated, which takes precedence over FFT and the lag search
+    :param add_samples: The samples of the addition operation, or None
+    :param dtype: The floating point type to compute in (np.float32 or np.float64)
+    :return: The correlation coefficients and the lags (of the doubling operation) of the templates
+    """
+    if dbl_samples is not None:
+        coeffs = correlation.correlate_samples(template_traces, target_trace, dbl_samples, dtype=dtype)
+        if add_samples is not None:
+            coeffs = (coeffs + correlation.correlate_samples(template_traces, target_trace, add_samples,
+                                                             dtype=dtype)) / 2
+        return coeffs, np.zeros(len(template_traces), dtype=int)
+    use_lag_search = max_lag > 0 and not use_fft
+    if use_lag_search:
+        coeffs, lags = correlation.lag_search_correlations(template_traces, target_trace, *dbl_window, max_lag,
+                                                           dtype=dtype)
+    else:
+        coeffs = correlation.correlate_windows(template_traces, target_trace, [dbl_window], dtype=dtype,
+                                               transform=np.fft.fft if use_fft else None)[0]
+        lags = np.zeros(len(template_traces), dtype=int)
+    if add_window is not None:
+        if use_lag_search:
+            add_coeffs, _ = correlation.lag_search_correlations(template_traces, target_trace, *add_window, max_lag,
+                                                                dtype=dtype)
+        else:
+            add_coeffs = correlation.correlate_windows(template_traces, target_trace, [add_window], dtype=dtype)[0]
+        coeffs = (coeffs + add_coeffs) / 2
+    return coeffs, lags
+
+
+def rank_of_expected(results, expected_digit_column):
+    """
+    :param results: A list of (template digit column, score, ...) tuples, where a higher score is better
+    :param expected_digit_column: The correct digit column (a vector of 4 values)
+    :return: The rank of the correct digit column (1 is the best), or None if it is not in the results
+    """
+    for idx, result in enumerate(sorted(results, key=operator.itemgetter(1))):
+        if np.array_equal(result[0][:, 0], expected_digit_column):
+            return len(results) - idx
+    return None
+
+
+def rank_statistics(ranks_per_iter):
+    """
+    :param ranks_per_iter: An (R, I) matrix with the rank of the correct digit column in each of I iterations (starting
+    from iteration 63) for each of R attacks
+    :return: A dictionary with the statistics ("average", "median", "std", "min", "max" and "nr_correct", the number of
+    times the correct digit column was ranked first) of the ranks per iteration (as a list, under "per_iteration") and
+    of all ranks
+    """
+    ranks_per_iter = np.asarray(ranks_per_iter)
+
+    def _statistics(ranks):
+        return {"average": float(np.average(ranks)), "median": float(np.median(ranks)), "std": float(np.std(ranks)),
+                "min": int(np.min(ranks)), "max": int(np.max(ranks)), "nr_correct": int(np.count_nonzero(ranks == 1))}
+
+    statistics = _statistics(ranks_per_iter.flatten())
+    statistics["per_iteration"] = [_statistics(ranks_per_iter[:, i]) for i in range(ranks_per_iter.shape[1])]
+    return statistics
+
+
+def print_rank_statistics(ranks_per_iter):
+    """
+    Print the statistics of the ranks of the correct digit columns (see rank_statistics).
+    """
+    statistics = rank_statistics(ranks_per_iter)
+    print("\nSTART OF RESULTS")
+    for i, iteration_statistics in enumerate(statistics["per_iteration"]):
+        print("Average rank of ranks in iteration {} : {}".format(63 - i, iteration_statistics["average"]))
+        print("Median rank of ranks in iteration {} : {}".format(63 - i, iteration_statistics["median"]))
+        print("Standard deviation of rank in ranks of iteration {} : {}".format(63 - i, iteration_statistics["std"]))
+        print("Min value: {}".format(iteration_statistics["min"]))
+        print("Max value: {}".format(iteration_statistics["max"]))
+    print()
+    print("--------------------------")
+    print("FINAL RESULTS")
+    print("--------------------------")
+    print("Average:\t {}".format(statistics["average"]))
+    print("Median: \t {}".format(statistics["median"]))
+    print("Standard dev:\t {}".format(statistics["std"]))
+    print("Nr of times guessed correctly:\t {}".format(statistics["nr_correct"]))
+    print("END OF RESULTS")
@@ -0,0 +1,135 @@
+import sqlite3
+
+import numpy as np
+
+from fourq_software import scalar_recoding
+from utils import files
+
+DEFAULT_CACHE_PATH = files.get_full_path("online_template_attack", "template_scalars.sqlite")
+
+
+def template_digit_column_guesses(attacked_digit_columns):
+    """
+    Generate the digit columns that are guessed when attacking the digit column following the attacked digit columns.
+    :param attacked_digit_columns: The previously attacked digit columns (None in the first iteration)
+    :return: A list of (template digit column, digit columns guess) tuples, where the guess is the template digit column
+    appended to the attacked digit columns
+    """
+    is_first_iteration = attacked_digit_columns is None or attacked_digit_columns.shape[1] == 0
+    # s_64 is always positive
+    sign_vals = [1] if is_first_iteration else [1, -1]
+    guesses = []
+    for s_i in sign_vals:
+        for d_i in range(8):
+            template_digit_column = scalar_recoding.generate_digit_column_for_value(d_i, s_i)
+            digit_columns_guess = template_digit_column
+            if not is_first_iteration:
+                digit_columns_guess = np.concatenate((attacked_digit_columns, template_digit_column), axis=1)
+            guesses.append((template_digit_column, digit_columns_guess))
+    return guesses
+
+
+class TemplateScalarCache:
+    """
+    Persistent (SQLite) cache mapping digit-column prefixes to the multi-scalar that is loaded to obtain the template
+    trace for this prefix. Prefixes for which no valid multi-scalar exists are cached as well.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, length=65):
+        """
+        :param path: The path of the SQLite database (":memory:" for a cache that is not persisted)
+        :param length: The length of the recoded matrices
+        """
+        self.length = length
+        self._connection = sqlite3.connect(path)
+        # The sub-scalars do not fit in a signed 64 bit SQLite integer, so the multi-scalar is stored as text
+        self._connection.execute("CREATE TABLE IF NOT EXISTS template_scalars ("
+                                 "length INTEGER NOT NULL, "
+                                 "digit_columns BLOB NOT NULL, "
+                                 "multi_scalar TEXT, "
+                                 "PRIMARY KEY (length, digit_columns))")
+        self._connection.commit()
+        self._entries = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM template_scalars WHERE length = ?",
+                                        (self.length,)).fetchone()[0]
+
+    @staticmethod
+    def _to_key(digit_columns):
+        """
+        :param digit_columns: The digit columns (a 4 x k matrix)
+        :return: The digit columns as bytes, column after column
+        """
+        return np.asarray(digit_columns, dtype=np.int8).tobytes(order="F")
+
+    def _lookup(self, key):
+        """
+        :param key: The key of the digit columns
+        :return: The cached multi-scalar (None if there is none) and whether the key was found in the cache
+        """
+        if key in self._entries:
+            return self._entries[key], True
+        row = self._connection.execute("SELECT multi_scalar FROM template_scalars WHERE length = ? AND digit_columns = ?",
+                                       (self.length, key)).fetchone()
+        if row is None:
+            return None, False
+        multi_scalar = [int(scalar) for scalar in row[0].split(",")] if row[0] is not None else None
+        self._entries[key] = multi_scalar
+        return multi_scalar, True
+
+    def _compute(self, key, digit_columns):
+        """
+        Determine the multi-scalar for the given digit columns and add it to the cache (without committing).
+        :return: The multi-scalar, or None if no valid multi-scalar exists
+        """
+        recoded_matrix, is_valid = scalar_recoding.get_valid_recoded_matrix(np.asarray(digit_columns), self.length)
+        multi_scalar = scalar_recoding.matrix_to_scalars(recoded_matrix) if is_valid else None
+        encoded = ",".join(str(scalar) for scalar in multi_scalar) if is_valid else None
+        self._connection.execute("INSERT OR REPLACE INTO template_scalars VALUES (?, ?, ?)",
+                                 (self.length, key, encoded))
+        self._entries[key] = multi_scalar
+        return multi_scalar
+
+    def get(self, digit_columns):
+        """
+        Get the multi-scalar that produces the given digit columns, determining (and storing) it if it is not cached.
+        :param digit_columns: The wanted digit columns (a 4 x k matrix, starting with digit column 64)
+        :return: (multi_scalar, is_valid), where multi_scalar is a list of 4 integers or None if is_valid is False
+        """
+        key = self._to_key(digit_columns)
+        multi_scalar, found = self._lookup(key)
+        if not found:
+            multi_scalar = self._compute(key, digit_columns)
+            self._connection.commit()
+        return multi_scalar, multi_scalar is not None
+
+    def precompute(self, recoded_matrix, nr_of_iterations=64):
+        """
+        Precompute the multi-scalars of all templates used when attacking a target with the given recoded matrix
+        (assuming that every digit column is guessed correctly).
+        :param recoded_matrix: The recoded matrix of the target multi-scalar
+        :param nr_of_iterations: The number of attacked digit columns (starting from digit column 64)
+        :return: The number of multi-scalars that had to be determined (i.e. were not cached yet)
+        """
+        nr_of_computed = 0
+        for nr_of_attacked_cols in range(nr_of_iterations):
+            attacked_digit_columns = recoded_matrix[:, :nr_of_attacked_cols] if nr_of_attacked_cols > 0 else None
+            for _, digit_columns_guess in template_digit_column_guesses(attacked_digit_columns):
+                key = self._to_key(digit_columns_guess)
+                _, found = self._lookup(key)
+                if not found:
+                    self._compute(key, digit_columns_guess)
+                    nr_of_computed += 1
+        self._connection.commit()
+        return nr_of_computed
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
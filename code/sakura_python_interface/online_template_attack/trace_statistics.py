@@ -0,0 +1,131 @@
+import numpy as np
+
+
+class TraceAccumulator:
+    """
+    Accumulate the per-sample mean and variance of a set of power traces with Welford's online algorithm, in float64 and
+    with constant memory (independent of the number of traces). Traces of different lengths are truncated to the
+    shortest length seen so far. Accumulators of traces captured in parallel can be combined with merge().
+    """
+
+    def __init__(self, nr_of_samples=None):
+        """
+        :param nr_of_samples: The (maximum) number of samples per trace, by default the length of the first trace
+        """
+        self.count = 0
+        self.nr_of_samples = nr_of_samples
+        self._mean = None
+        # The sum of the squared deviations from the mean (M2 in Welford's algorithm)
+        self._m2 = None
+
+    def __len__(self):
+        return self.count
+
+    def _truncate(self, nr_of_samples):
+        """
+        Truncate the accumulated statistics to the given number of samples (if it is shorter).
+        """
+        if self.nr_of_samples is None or nr_of_samples < self.nr_of_samples:
+            self.nr_of_samples = nr_of_samples
+        if self._mean is not None and len(self._mean) > self.nr_of_samples:
+            self._mean = self._mean[:self.nr_of_samples]
+            self._m2 = self._m2[:self.nr_of_samples]
+
+    def add(self, trace):
+        """
+        Add a single trace.
+        :param trace: The samples of the trace
+        """
+        trace = np.asarray(trace)
+        self._truncate(len(trace))
+        trace = trace[:self.nr_of_samples]
+        self.count += 1
+        if self._mean is None:
+            self._mean = trace.astype(np.float64)
+            self._m2 = np.zeros(len(trace), dtype=np.float64)
+            return
+        delta = trace - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (trace - self._mean)
+
+    def add_traces(self, traces):
+        """
+        Add a batch of traces at once (e.g. the segments of a sequence mode acquisition).
+        :param traces: An (N, S) matrix with N traces
+        """
+        traces = np.atleast_2d(np.asarray(traces))
+        if len(traces) == 0:
+            return
+        batch = TraceAccumulator()
+        batch.count = len(traces)
+        batch.nr_of_samples = traces.shape[1]
+        batch._mean = traces.mean(axis=0, dtype=np.float64)
+        batch._m2 = np.square(traces - batch._mean).sum(axis=0)
+        self.merge(batch)
+
+    def merge(self, other):
+        """
+        Merge the statistics of another accumulator into this one (Chan et al.'s parallel algorithm).
+        :param other: The other accumulator
+        :return: This accumulator
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self._truncate(other.nr_of_samples)
+            self.count = other.count
+            self._mean = other._mean[:self.nr_of_samples].copy()
+            self._m2 = other._m2[:self.nr_of_samples].copy()
+            return self
+        self._truncate(other.nr_of_samples)
+        other_mean = other._mean[:self.nr_of_samples]
+        count = self.count + other.count
+        delta = other_mean - self._mean
+        self._mean += delta * (other.count / count)
+        self._m2 += other._m2[:self.nr_of_samples] + np.square(delta) * (self.count * other.count / count)
+        self.count = count
+        return self
+
+    @property
+    def mean(self) -> np.ndarray:
+        """
+        :return: The per-sample mean (the average trace)
+        """
+        if self.count == 0:
+            raise Exception("No traces have been added to the accumulator")
+        return self._mean
+
+    @property
+    def variance(self) -> np.ndarray:
+        """
+        :return: The per-sample (unbiased) variance, which is 0 for a single trace
+        """
+        if self.count == 0:
+            raise Exception("No traces have been added to the accumulator")
+        return self._m2 / max(self.count - 1, 1)
+
+    @property
+    def standard_error(self) -> np.ndarray:
+        """
+        :return: The per-sample standard error of the mean, i.e. how much the average trace is still expected to change
+        """
+        return np.sqrt(self.variance / self.count)
+
+    @property
+    def snr(self) -> np.ndarray:
+        """
+        :return: The per-sample signal-to-noise ratio of the average trace (the squared mean over the variance of the
+        mean), which grows linearly with the number of traces
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.square(self.mean) / np.square(self.standard_error)
+
+    def has_converged(self, max_standard_error, min_nr_of_traces=2):
+        """
+        Whether the average trace has stabilized, i.e. the standard error of every sample is at most the given value.
+        :param max_standard_error: The maximum standard error (in ADC units, e.g. 0.5 as the average is truncated to
+        integers)
+        :param min_nr_of_traces: The minimum number of traces before the variance is trusted
+        :return: True if the average trace has converged
+        """
+        return self.count >= max(min_nr_of_traces, 2) and np.max(self.standard_error) <= max_standard_error
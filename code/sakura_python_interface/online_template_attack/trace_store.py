@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+
+class TraceStore:
+    """
+    Append-only store for the traces of a campaign, kept in a single directory:
+    - samples.dat: a preallocated sample matrix (one row per trace) that is memory-mapped and grown when full
+    - metadata.sqlite: a table with the metadata of every trace (iteration, sign, digit column, multi-scalar, channel
+    and scope settings)
+    A trace is only part of the store once its metadata is committed, which happens after its samples have been flushed
+    to disk. A crash while appending therefore never leaves a trace with incomplete samples in the store.
+    """
+
+    samples_file_name = "samples.dat"
+    metadata_file_name = "metadata.sqlite"
+
+    def __init__(self, directory, samples_per_trace=None, dtype=np.int8, initial_capacity=1024):
+        """
+        Open the trace store in the given directory, creating it if it does not exist yet.
+        :param directory: The directory of the trace store
+        :param samples_per_trace: The number of samples per trace (only needed when creating the store), longer traces
+        are truncated and shorter traces are padded with zeros
+        :param dtype: The data type of the samples (only used when creating the store)
+        :param initial_capacity: The number of traces to preallocate space for (only used when creating the store)
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._connection = sqlite3.connect(os.path.join(directory, self.metadata_file_name))
+        self._connection.execute("CREATE TABLE IF NOT EXISTS campaign (samples_per_trace INTEGER, dtype TEXT)")
+        # The sub-scalars do not fit in a signed 64 bit SQLite integer, so the multi-scalar is stored as text
+        self._connection.execute("CREATE TABLE IF NOT EXISTS traces ("
+                                 "idx INTEGER PRIMARY KEY, "
+                                 "label TEXT, "
+                                 "iteration INTEGER, "
+                                 "sign INTEGER, "
+                                 "digit_column INTEGER, "
+                                 "multi_scalar TEXT, "
+                                 "channel TEXT, "
+                                 "scope_settings TEXT, "
+                                 "nr_of_samples INTEGER)")
+        campaign = self._connection.execute("SELECT samples_per_trace, dtype FROM campaign").fetchone()
+        if campaign is None:
+            if samples_per_trace is None:
+                self._connection.close()
+                raise Exception("The number of samples per trace is needed to create a new trace store")
+            campaign = (samples_per_trace, np.dtype(dtype).str)
+            self._connection.execute("INSERT INTO campaign VALUES (?, ?)", campaign)
+        self._connection.commit()
+        self.samples_per_trace = campaign[0]
+        self.dtype = np.dtype(campaign[1])
+        self.nr_of_traces = self._connection.execute("SELECT COUNT(*) FROM traces").fetchone()[0]
+
+        samples_path = os.path.join(directory, self.samples_file_name)
+        if not os.path.exists(samples_path):
+            open(samples_path, "wb").close()
+        row_size = self.samples_per_trace * self.dtype.itemsize
+        capacity = os.path.getsize(samples_path) // row_size if row_size > 0 else 0
+        self._samples = None
+        self._map_samples(max(capacity, self.nr_of_traces, initial_capacity, 1))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.nr_of_traces
+
+    def __getitem__(self, item):
+        return self.traces[item]
+
+    def _map_samples(self, capacity):
+        """
+        (Re)map the sample matrix with room for the given number of traces, growing the file if needed.
+        :param capacity: The number of traces
+        """
+        if self._samples is not None:
+            self._samples.flush()
+        samples_path = os.path.join(self.directory, self.samples_file_name)
+        size = capacity * self.samples_per_trace * self.dtype.itemsize
+        if os.path.getsize(samples_path) < size:
+            with open(samples_path, "r+b") as f:
+                f.truncate(size)
+        self._samples = np.memmap(samples_path, dtype=self.dtype, mode="r+",
+                                  shape=(capacity, self.samples_per_trace))
+
+    @property
+    def capacity(self):
+        return self._samples.shape[0]
+
+    @property
+    def traces(self) -> np.ndarray:
+        """
+        :return: An (nr_of_traces, samples_per_trace) view on the stored samples
+        """
+        return self._samples[:self.nr_of_traces]
+
+    def append(self, trace, label=None, iteration=None, sign=None, digit_column=None, multi_scalar=None,
+               channel=None, scope_settings=None):
+        """
+        Append a trace and its metadata to the store.
+        :param trace: The samples of the trace
+        :param label: The kind of trace (e.g. "template" or "target")
+        :param iteration: The iteration of the attack (63 for digit column 64)
+        :param sign: The sign of the (template) digit column
+        :param digit_column: The value of the (template) digit column
+        :param multi_scalar: The multi-scalar that was loaded when capturing the trace
+        :param channel: The channel the trace was captured from
+        :param scope_settings: A (JSON serializable) dictionary with the oscilloscope settings
+        :return: The index of the trace in the store
+        """
+        if self.nr_of_traces == self.capacity:
+            # Double the capacity, such that the file only needs to grow a logarithmic number of times
+            self._map_samples(2 * self.capacity)
+        idx = self.nr_of_traces
+        trace = np.asarray(trace)
+        nr_of_samples = min(len(trace), self.samples_per_trace)
+        row = self._samples[idx]
+        row[:nr_of_samples] = trace[:nr_of_samples]
+        row[nr_of_samples:] = 0
+        # The samples are on disk before the metadata is committed
+        self._samples.flush()
+        self._connection.execute("INSERT INTO traces VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (idx, label, iteration, sign, digit_column,
+                                  ",".join(str(int(scalar)) for scalar in multi_scalar)
+                                  if multi_scalar is not None else None,
+                                  channel,
+                                  json.dumps(scope_settings, sort_keys=True) if scope_settings is not None else None,
+                                  len(trace)))
+        self._connection.commit()
+        self.nr_of_traces += 1
+        return idx
+
+    @staticmethod
+    def _to_metadata(row):
+        idx, label, iteration, sign, digit_column, multi_scalar, channel, scope_settings, nr_of_samples = row
+        return {
+            "idx": idx,
+            "label": label,
+            "iteration": iteration,
+            "sign": sign,
+            "digit_column": digit_column,
+            "multi_scalar": [int(scalar) for scalar in multi_scalar.split(",")] if multi_scalar is not None else None,
+            "channel": channel,
+            "scope_settings": json.loads(scope_settings) if scope_settings is not None else None,
+            "nr_of_samples": nr_of_samples,
+        }
+
+    def get_metadata(self, idx):
+        """
+        :param idx: The index of the trace
+        :return: A dictionary with the metadata of the trace
+        """
+        row = self._connection.execute("SELECT * FROM traces WHERE idx = ?", (idx,)).fetchone()
+        if row is None:
+            raise IndexError("There is no trace with index {}".format(idx))
+        return self._to_metadata(row)
+
+    def select(self, **conditions):
+        """
+        Select the traces whose metadata matches all given conditions, e.g. select(label="template", iteration=63).
+        :return: The indices of the matching traces (in order of appending)
+        """
+        columns = ["label", "iteration", "sign", "digit_column", "channel"]
+        for column in conditions:
+            if column not in columns:
+                raise Exception("Can not select on {}, valid columns are: {}".format(column, columns))
+        query = "SELECT idx FROM traces"
+        if conditions:
+            query += " WHERE " + " AND ".join("{} = ?".format(column) for column in conditions)
+        query += " ORDER BY idx"
+        return [row[0] for row in self._connection.execute(query, tuple(conditions.values()))]
+
+    def close(self):
+        if self._samples is not None:
+            self._samples.flush()
+            self._samples = None
+        self._connection.close()
@@ -1,10 +1,205 @@
+import time
 from binascii import hexlify, unhexlify
+from contextlib import contextmanager
+
 from utils.classes import Singleton
 
 
+def encode_write(address: int, msb: int, lsb: int) -> bytes:
+    """
+    Encode the command to write at the address (16 bits) of the main FPGA the MSB and LSB
+    :param address: The address (main FPGA specific)
+    :param msb: The MSB of the data
+    :param lsb: The LSB of the data
+    :return: The 5 bytes of the write command
+    """
+    msg = bytearray(5)
+    msg[0] = 0x02  # Enable writing
+    msg[1] = (address >> 8) & 0xFF  # MSB address
+    msg[2] = address & 0xFF  # LSB address
+    msg[3] = msb  # MSB data
+    msg[4] = lsb  # LSB data
+    return bytes(msg)
+
+
+def encode_read(address: int) -> bytes:
+    """
+    Encode the command to read the 16 bits at the address of the main FPGA
+    :param address: The address (main FPGA specific)
+    :return: The 3 bytes of the read command
+    """
+    msg = bytearray(3)
+    msg[0] = 0x01  # Enable reading
+    msg[1] = (address >> 8) & 0xFF  # MSB address
+    msg[2] = address & 0xFF  # LSB address
+    return bytes(msg)
+
+
+def wait_while_busy(is_busy, expected_duration=0.0, timeout=10.0, initial_poll_interval=1e-4,
+                    max_poll_interval=1e-2, backoff=2.0, wait_for_completion=None) -> float:
+    """
+    Wait until an operation is done, without flooding the USB bus (and the power measurements) with busy polls: the
+    wait first sleeps for the expected duration of the operation, after which it polls with an exponentially
+    increasing interval.
+    :param is_busy: Function returning whether the operation is still busy
+    :param expected_duration: The expected duration of the operation in seconds, during which is_busy is not polled
+    :param timeout: The maximum number of seconds to wait
+    :param initial_poll_interval: The number of seconds between the first two polls
+    :param max_poll_interval: The maximum number of seconds between two polls
+    :param backoff: The factor by which the poll interval grows after every poll
+    :param wait_for_completion: Optional function called as wait_for_completion(timeout), which blocks until an
+    external completion event (e.g. the acquisition of the oscilloscope or a status pin) and returns whether it occurred
+    before the timeout. Polling only starts after this event, to confirm the operation is done.
+    :return: The number of seconds waited
+    """
+    start = time.perf_counter()
+    deadline = start + timeout
+    if wait_for_completion is not None and not wait_for_completion(timeout):
+        raise Exception("[*] No completion event within {} seconds".format(timeout))
+    remaining_expected_duration = expected_duration - (time.perf_counter() - start)
+    if remaining_expected_duration > 0:
+        time.sleep(remaining_expected_duration)
+    poll_interval = initial_poll_interval
+    while is_busy():
+        now = time.perf_counter()
+        if now >= deadline:
+            raise Exception("[*] Still busy after {} seconds".format(timeout))
+        time.sleep(min(poll_interval, deadline - now))
+        poll_interval = min(poll_interval * backoff, max_poll_interval)
+    return time.perf_counter() - start
+
+
+class CommandBatch:
+    """
+    A buffer of write and read commands for the main FPGA, which is sent to the control FPGA in a single USB transaction
+    (see SaseboGii.send). The control FPGA executes the commands in order and answers every read with two bytes, so the
+    responses of all reads are collected with a single bulk read afterwards. A batch has the same effect as issuing its
+    commands one by one, without paying the latency of a USB transaction (and turnaround) per 16-bit register.
+    """
+
+    def __init__(self, shadow=None):
+        """
+        :param shadow: The shadow copy of the RAM of the device (see SaseboGii.shadow), used to skip unchanged writes
+        """
+        self.commands = bytearray()
+        self.nr_of_commands = 0
+        self.nr_of_reads = 0
+        # The bytes read in response to the read commands, set once the batch has been sent
+        self.responses = None
+        self.shadow = shadow
+        # The changes to the shadow copy, applied once the batch has been sent (None removes an entry)
+        self.shadow_updates = {}
+
+    def __len__(self):
+        """
+        :return: The number of commands in the batch
+        """
+        return self.nr_of_commands
+
+    def write(self, address: int, msb: int, lsb: int):
+        """
+        Add a write of the MSB and LSB at the address (see SaseboGii.write)
+        """
+        self.commands += encode_write(address, msb, lsb)
+        self.nr_of_commands += 1
+
+    def read(self, address: int):
+        """
+        Add a read of the 16 bits at the address, whose two bytes are appended to the responses
+        """
+        self.commands += encode_read(address)
+        self.nr_of_commands += 1
+        self.nr_of_reads += 1
+
+    def read64(self, address: int):
+        """
+        Add the reads of the 64 bits starting from the address, whose eight bytes are appended to the responses
+        """
+        for i in range(4):
+            self.read(((address >> 8) << 8) | ((address & 0xFF) + i * 2))
+
+    def read_internal_data_register(self):
+        self.read64(0x0296)
+
+    def read_result(self):
+        self.read64(0x0186)
+
+    def responses64(self) -> list:
+        """
+        :return: The responses split into 64-bit words (as HEX strings), e.g. of consecutive read64 commands
+        """
+        if self.responses is None:
+            raise Exception("[*] The batch has not been sent yet")
+        return [self.responses[i:i + 8].hex() for i in range(0, len(self.responses), 8)]
+
+    def write64(self, rom_value_64bits: str, rom_address: int, main_fpga_internal_address: int,
+                is_upper_half: bool, data_enable: bool = True, skip_unchanged: bool = False):
+        """
+        Add the writes of a 64-bit value and its ROM address (see SaseboGii.write64)
+        :param skip_unchanged: Whether the value stays in RAM until it is written again (i.e. the operations of the
+        design do not overwrite it, like the ROM constants), such that the writes can be skipped if the shadow copy
+        shows the same value was written before
+        """
+        key = (rom_address, is_upper_half)
+        rom_value_64bits = rom_value_64bits.lower()
+        if data_enable and skip_unchanged and self.shadow is not None and self.shadow.get(key) == rom_value_64bits \
+                and key not in self.shadow_updates:
+            return
+        if data_enable:
+            self.shadow_updates[key] = rom_value_64bits if skip_unchanged else None
+        hex_bytes_values = unhexlify(rom_value_64bits)
+        for i in range(0, len(hex_bytes_values), 2):
+            self.write(main_fpga_internal_address + i, hex_bytes_values[i], hex_bytes_values[i + 1])
+
+        # Write the corresponding address at which this value has to be loaded in RAM
+        self.write_rom_address(rom_address, 0x01 if is_upper_half else 0x00)
+        if data_enable:
+            self.set_data_valid()
+
+    def apply_shadow_updates(self):
+        """
+        Apply the writes of the batch to the shadow copy (once the batch has been sent)
+        """
+        if self.shadow is not None:
+            for key, value in self.shadow_updates.items():
+                if value is None:
+                    self.shadow.pop(key, None)
+                else:
+                    self.shadow[key] = value
+        self.shadow_updates = {}
+
+    def write_operation(self, msb: int, lsb: int):
+        self.write(0x0136, msb, lsb)
+
+    def write_rom_address(self, msb: int, lsb: int):
+        self.write(0x0138, msb, lsb)
+
+    def set_data_valid(self):
+        self.write(0x0002, 0x00, 0x02)
+
+
+def list_control_fpgas() -> list:
+    """
+    :return: The serial numbers of the control FPGAs (FTDI channel "A") of all connected SAKURA-G boards
+    """
+    import ftd2xx as ft
+    ftdi_devices = ft.listDevices()
+    if ftdi_devices is None:
+        return []
+    return [ftdi_device for ftdi_device in ftdi_devices if ftdi_device.decode("utf-8")[-1] == 'A']
+
+
 class SaseboGii(metaclass=Singleton):
 
-    def __init__(self):
+    def __init__(self, serial_no: bytes = None):
+        """
+        :param serial_no: The serial number of the control FPGA to connect to, by default the first one found. Note that
+        there is one instance per process, so a process can only drive a single board (see board_pool to drive several)
+        """
+        self.serial_no = serial_no
+        # Shadow copy of the values last written to the RAM of the main FPGA that are not overwritten by its operations,
+        # as {(rom_address, is_upper_half): HEX value}
+        self.shadow = {}
         result = self._init()
         if result == -1:
             raise Exception("[*] Failed to connected to control FTDI")
@@ -53,8 +248,9 @@ class SaseboGii(metaclass=Singleton):
             return -1
         self._print_ftdi_devices()
         # Select the control FPGA ("A", the control FPGA)
-        control_fpga = self._determine_control_fpga(ft.listDevices())
-        result = self._connect_to_control_fpga(control_fpga)
+        if self.serial_no is None:
+            self.serial_no = self._determine_control_fpga(ft.listDevices())
+        result = self._connect_to_control_fpga(self.serial_no)
         if not result:
             return -1
 
@@ -95,14 +291,75 @@ class SaseboGii(metaclass=Singleton):
         :param lsb: The LSB of the data
         :return:
         """
-        msg = bytearray(5)
-        msg[0] = 0x02  # Enable writing
-        msg[1] = (address >> 8) & 0xFF  # MSB address
-        msg[2] = address & 0xFF  # LSB address
-        msg[3] = msb  # MSB data
-        msg[4] = lsb  # LSB data
-        msg = bytes(msg)
-        self.sasebo.write(msg)
+        self.sasebo.write(encode_write(address, msb, lsb))
+
+    def send(self, batch: CommandBatch, verify: bool = False) -> bytearray:
+        """
+        Send all commands of the batch in a single USB transaction and collect the responses of its reads in a single
+        bulk read
+        :param batch: The batch of commands
+        :param verify: Whether to wait until the main FPGA has executed the writes (see barrier)
+        :return: The bytes read in response to the read commands (also stored in batch.responses)
+        """
+        if batch.nr_of_reads > 0:
+            self.flush()
+        if len(batch) > 0:
+            nr_of_bytes_written = self.sasebo.write(bytes(batch.commands))
+            if nr_of_bytes_written != len(batch.commands):
+                raise Exception("[*] Only {} of the {} bytes of the command batch were sent".format(
+                    nr_of_bytes_written, len(batch.commands)))
+        responses = bytearray(self.sasebo.read(2 * batch.nr_of_reads)) if batch.nr_of_reads > 0 else bytearray()
+        if len(responses) != 2 * batch.nr_of_reads:
+            raise Exception("[*] Only {} of the {} response bytes of the command batch were received".format(
+                len(responses), 2 * batch.nr_of_reads))
+        batch.responses = responses
+        batch.apply_shadow_updates()
+        if verify:
+            self.barrier()
+        return responses
+
+    @contextmanager
+    def batch(self, verify: bool = False):
+        """
+        Collect the commands within the context in a CommandBatch, which is sent when leaving the context
+        (e.g. with sakura.batch() as batch: batch.write64(...)), after which the responses are in batch.responses
+        :param verify: Whether to wait until the main FPGA has executed the writes (see barrier)
+        """
+        batch = CommandBatch(shadow=self.shadow)
+        yield batch
+        self.send(batch, verify=verify)
+
+    def barrier(self):
+        """
+        Wait until all previously sent commands have been executed: the commands are executed in order, so the answer to
+        a read of the hardcoded test register only arrives after all earlier writes have been executed
+        """
+        result = int(hexlify(self.read(0xFFFF)), 16)
+        if result != 0x1337:
+            raise Exception("[*] Write barrier failed, read 0x{:04x} instead of 0x1337".format(result))
+
+    def verify_shadow(self) -> list:
+        """
+        Read back the values of the shadow copy from the RAM of the device (in a single batch), e.g. to detect that the
+        SAKURA-G has been power-cycled. Mismatching entries are removed from the shadow copy, such that they are written
+        again.
+        :return: The (rom_address, is_upper_half) keys of the mismatching entries
+        """
+        keys = sorted(self.shadow)
+        with self.batch() as batch:
+            for rom_address, is_upper_half in keys:
+                batch.write_rom_address(rom_address, 0x01 if is_upper_half else 0x00)
+                batch.read_result()
+        mismatches = [key for key, value in zip(keys, batch.responses64()) if self.shadow[key] != value]
+        for key in mismatches:
+            del self.shadow[key]
+        return mismatches
+
+    def invalidate_shadow(self):
+        """
+        Forget the shadow copy, such that all values are written again (e.g. after resetting the device)
+        """
+        self.shadow.clear()
 
     def read(self, address: int) -> bytearray:
         """
@@ -111,16 +368,9 @@ class SaseboGii(metaclass=Singleton):
         :type: int
         :return:
         """
-        self.flush()
-        msg = bytearray(3)
-        msg[0] = 0x01  # Enable reading
-        msg[1] = (address >> 8) & 0xFF  # MSB address
-        msg[2] = address & 0xFF  # LSB address
-        msg = bytes(msg)
-        self.sasebo.write(msg)
-        msg = self.sasebo.read(2)  # Read two bytes
-        msg = bytearray(msg)
-        return msg
+        with self.batch() as batch:
+            batch.read(address)
+        return batch.responses
 
     def read64(self, address: int) -> bytearray:
         """
@@ -128,18 +378,9 @@ class SaseboGii(metaclass=Singleton):
         :param address: The internal address (main FPGA specific)
         :return: The bytes read from the FPGA starting from the specified address
         """
-        response_msg = bytearray(8)
-        for i in range(4):
-            # Write address to read from
-            addr_msb = (address >> 8) & 0xFF
-            addr_lsb = (address & 0xFF) + (i * 2)
-            addr = (addr_msb << 8) | addr_lsb
-            # Read bytes at the address
-            bytes_read = self.read(addr)
-            # Store results at correct position
-            response_msg[i * 2] = bytes_read[0]
-            response_msg[i * 2 + 1] = bytes_read[1]
-        return response_msg
+        with self.batch() as batch:
+            batch.read64(address)
+        return batch.responses
 
     def close(self):
         """
@@ -159,21 +400,8 @@ class SaseboGii(metaclass=Singleton):
         :param is_upper_half: Whether te 64 bits value to write is the lower or upper half of the whole message.
         :param data_enable: Whether the write enable within the FourQ design should be enabled
         """
-        # Return the binary data represented by the hexadecimal string
-        hex_bytes = bytearray(unhexlify(rom_value_64bits))
-        hex_bytes = hex_bytes.decode("latin-1")
-        # ord() returns the value of the byte when the argument is an 8-bit string
-        hex_bytes_values = list(map(ord, hex_bytes))
-        for i in range(0, len(hex_bytes_values), 2):
-            # print(hex(main_fpga_internal_address + i))
-            self.write(main_fpga_internal_address + i, hex_bytes_values[i], hex_bytes_values[i + 1])
-
-        # Write the corresponding address at which this value has to be loaded in RAM
-        msb = rom_address
-        lsb = 0x01 if is_upper_half else 0x00
-        self.write_rom_address(msb, lsb)
-        if data_enable:
-            self.set_data_valid()
+        with self.batch() as batch:
+            batch.write64(rom_value_64bits, rom_address, main_fpga_internal_address, is_upper_half, data_enable)
 
     def is_busy(self) -> bool:
         """
@@ -188,6 +416,16 @@ class SaseboGii(metaclass=Singleton):
 
         return bool(busy)
 
+    def wait_until_done(self, expected_duration=0.0, timeout=10.0, initial_poll_interval=1e-4, max_poll_interval=1e-2,
+                        backoff=2.0, wait_for_completion=None) -> float:
+        """
+        Wait until the algorithm running on the FPGA is done, see wait_while_busy for the parameters
+        :return: The number of seconds waited
+        """
+        return wait_while_busy(self.is_busy, expected_duration=expected_duration, timeout=timeout,
+                               initial_poll_interval=initial_poll_interval, max_poll_interval=max_poll_interval,
+                               backoff=backoff, wait_for_completion=wait_for_completion)
+
     def read_internal_data_register(self) -> str:
         """
         Read the internal data register (64 bits)
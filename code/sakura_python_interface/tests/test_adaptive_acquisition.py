@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+
+from online_template_attack import adaptive_acquisition, correlation
+
+
+class TestAdaptiveAcquisition(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(1)
+        self.target = self.rng.normal(0, 10, size=400)
+        # The first candidate matches the target, the others only partially
+        self.signals = [self.target] + [self.target * weight + self.rng.normal(0, 10, size=400)
+                                        for weight in (0.2, 0.5, 0.9, 1.0)]
+        self.captured = []
+
+    def capture_traces(self, candidate_indices):
+        self.captured += candidate_indices
+        return [self.signals[idx] + self.rng.normal(0, 40, size=400) for idx in candidate_indices]
+
+    def score_templates(self, traces):
+        return correlation.pearson_correlations(np.asarray(traces), self.target)
+
+    def test_early_stopping(self):
+        acquisition = adaptive_acquisition.AdaptiveTemplateAcquisition(self.score_templates,
+                                                                       max_traces_per_candidate=64)
+        mean_traces, scores, nr_of_traces = acquisition.run(len(self.signals), self.capture_traces)
+        self.assertEqual(np.argmax(scores), 0)
+        self.assertEqual(len(self.captured), nr_of_traces.sum())
+        self.assertTrue(np.all(nr_of_traces >= 2))
+        self.assertTrue(np.all(nr_of_traces <= 64))
+        # Clearly wrong candidates are discarded early, so far less than the full budget is captured
+        self.assertTrue(nr_of_traces.sum() < len(self.signals) * 64 / 2)
+        self.assertTrue(nr_of_traces[1] < nr_of_traces[0])
+        self.assertTrue(np.allclose(scores, self.score_templates(mean_traces)))
+        # The best candidate beats the runner-up with confidence
+        self.assertEqual(acquisition.ambiguous_candidates(scores), [0])
+        self.assertEqual(acquisition.ambiguous_candidates([0.5, 0.4, np.nan], [0.01, 0.01, 0]), [0])
+        self.assertEqual(acquisition.ambiguous_candidates([0.5, 0.48, 0.3], [0.01, 0.01, 0.01]), [0, 1])
+
+    def test_budget(self):
+        # Identical candidates can never be told apart, so the full budget is used
+        self.signals = [self.target] * 3
+        acquisition = adaptive_acquisition.AdaptiveTemplateAcquisition(self.score_templates, margin=0.1, batch_size=3,
+                                                                       max_traces_per_candidate=10)
+        _, _, nr_of_traces = acquisition.run(3, self.capture_traces)
+        self.assertEqual(list(nr_of_traces), [10, 10, 10])
+        # The batches are round-robin over the candidates
+        self.assertEqual(self.captured[:9], [0, 0, 0, 1, 1, 1, 2, 2, 2])
+
+        self.captured = []
+        mean_traces, _, nr_of_traces = acquisition.run(1, self.capture_traces)
+        self.assertEqual(list(nr_of_traces), [3])
+        self.assertEqual(len(acquisition.run(0, self.capture_traces)[0]), 0)
+        self.assertRaises(Exception, adaptive_acquisition.AdaptiveTemplateAcquisition, self.score_templates,
+                          min_traces_per_candidate=4, max_traces_per_candidate=2)
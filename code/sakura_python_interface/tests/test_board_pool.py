@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from online_template_attack import board_pool
+from online_template_attack.trace_store import TraceStore
+
+
+def setup_board(board, offset):
+    """
+    Simulated board, whose captures are offset by a board specific value
+    """
+    if board.serial_no == b"BROKENA":
+        raise Exception("Unable to connect")
+    return {"offset": offset + int(board.serial_no[-2:-1])}
+
+
+def capture(state, board, scalar):
+    if scalar < 0:
+        raise Exception("Invalid scalar")
+    # Give the other boards the chance to take jobs
+    time.sleep(0.01)
+    return np.full(8, scalar + state["offset"], dtype=np.int8)
+
+
+class TestBoardPool(unittest.TestCase):
+
+    def setUp(self):
+        self.boards = [board_pool.Board(b"SAKURA1A", "192.168.0.1", "C3"),
+                       board_pool.Board(b"SAKURA2A", "192.168.0.2", "C3"),
+                       board_pool.Board(b"SAKURA3A", "192.168.0.2", "C4")]
+
+    def test_run(self):
+        directory = tempfile.TemporaryDirectory()
+        captured_by = {}
+        with board_pool.BoardPool(self.boards, setup_board, capture, setup_args=(10,)) as pool, \
+                TraceStore(os.path.join(directory.name, "campaign"), samples_per_trace=8) as store:
+            def on_result(idx, board, trace):
+                captured_by[idx] = board
+                store.append(trace, label="template", iteration=63, digit_column=idx, channel=board.channel)
+
+            traces = pool.run(range(30), on_result)
+            # The results are in the order of the jobs, and the results of all boards are merged into one store
+            self.assertEqual(len(store), 30)
+            for scalar, trace in enumerate(traces):
+                board_offset = 10 + int(captured_by[scalar].serial_no[-2:-1])
+                self.assertTrue(np.array_equal(trace, np.full(8, scalar + board_offset)))
+                self.assertTrue(np.array_equal(store[store.select(digit_column=scalar)[0]], trace))
+            self.assertGreater(len(set(captured_by.values())), 1)
+
+            # The pool keeps running for the next jobs, while the main process does its own work
+            in_parallel_calls = []
+            self.assertEqual(len(pool.run([1, 2], in_parallel=lambda: in_parallel_calls.append(len(store)))), 2)
+            self.assertEqual(in_parallel_calls, [30])
+        directory.cleanup()
+
+    def test_errors(self):
+        with board_pool.BoardPool(self.boards[:2], setup_board, capture, setup_args=(0,)) as pool:
+            self.assertRaises(Exception, pool.run, [1, -1, 2])
+            self.assertRaises(ZeroDivisionError, pool.run, [1, 2], in_parallel=lambda: 1 / 0)
+            # The jobs of the failed run are dropped
+            self.assertEqual(len(pool.run([3, 4])), 2)
+        with board_pool.BoardPool([board_pool.Board(b"BROKENA", "192.168.0.1", "C3")], setup_board, capture,
+                                  setup_args=(0,)) as pool:
+            self.assertRaises(Exception, pool.run, [1])
+        self.assertRaises(Exception, board_pool.BoardPool, [], setup_board, capture)
+
+
+if __name__ == '__main__':
+    unittest.main()
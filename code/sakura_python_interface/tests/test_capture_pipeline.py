@@ -0,0 +1,93 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from online_template_attack.capture_pipeline import CapturePipeline
+
+
+class FakeScope:
+    """
+    Records the calls made to the oscilloscope, the waveform of a run is the scalar that was loaded at that time.
+    """
+
+    def __init__(self, board, transfer_time=0.0):
+        self.board = board
+        self.transfer_time = transfer_time
+        self.events = board.events
+
+    def prepare_for_trace_capture(self):
+        self.events.append("arm")
+
+    def wait_lecroy(self):
+        pass
+
+    def transfer_trace(self, channel):
+        self.events.append("transfer start")
+        time.sleep(self.transfer_time)
+        self.events.append("transfer end")
+        return bytes([self.board.captured_scalar + 128])
+
+    @staticmethod
+    def decode_trace(channel_out):
+        return np.frombuffer(channel_out, dtype="uint8").astype(int) - 128
+
+
+class FakeBoard:
+
+    def __init__(self):
+        self.events = []
+        self.loaded_scalar = None
+        self.captured_scalar = None
+        self.lock = threading.Lock()
+
+    def load_scalar(self, scalar):
+        with self.lock:
+            self.events.append("load {}".format(scalar))
+            self.loaded_scalar = scalar
+
+    def perform_scalar_mult(self):
+        with self.lock:
+            self.events.append("run")
+            self.captured_scalar = self.loaded_scalar
+
+
+class TestCapturePipeline(unittest.TestCase):
+
+    def test_traces_in_order(self):
+        board = FakeBoard()
+        scope = FakeScope(board)
+        pipeline = CapturePipeline(scope, board.load_scalar, board.perform_scalar_mult, max_queued_traces=2)
+        scalars = [1, 1, 2, 3, 3, 3, 4]
+        traces = []
+        pipeline.run(scalars, lambda idx, trace: traces.append((idx, int(trace[0]))))
+        self.assertEqual(traces, list(enumerate(scalars)))
+        # Equal consecutive scalars are only loaded once
+        self.assertEqual([event for event in board.events if event.startswith("load")],
+                         ["load 1", "load 2", "load 3", "load 4"])
+
+    def test_load_overlaps_transfer(self):
+        board = FakeBoard()
+        scope = FakeScope(board, transfer_time=0.05)
+        pipeline = CapturePipeline(scope, board.load_scalar, board.perform_scalar_mult)
+        pipeline.run([1, 2], lambda idx, trace: None)
+        # The second scalar is loaded while the first waveform is transferred
+        self.assertLess(board.events.index("load 2"), board.events.index("transfer end"))
+        self.assertGreater(board.events.index("load 2"), board.events.index("run"))
+
+    def test_errors_are_raised(self):
+        board = FakeBoard()
+        scope = FakeScope(board)
+
+        def on_trace(idx, trace):
+            raise ValueError("consumer failed")
+
+        pipeline = CapturePipeline(scope, board.load_scalar, board.perform_scalar_mult)
+        self.assertRaises(ValueError, pipeline.run, range(10), on_trace)
+
+        def load_scalar(scalar):
+            raise IOError("loading failed")
+
+        pipeline = CapturePipeline(scope, load_scalar, board.perform_scalar_mult)
+        self.assertRaises(IOError, pipeline.run, range(10), lambda idx, trace: None)
@@ -0,0 +1,91 @@
+import unittest
+
+import numpy as np
+
+from online_template_attack import correlation
+
+
+class TestCorrelation(unittest.TestCase):
+
+    def test_pearson_correlations(self):
+        templates = np.random.randint(-128, 127, size=(16, 500))
+        targets = np.random.randint(-128, 127, size=(3, 500))
+        targets[1] = templates[5] * 2 + 3
+        correlations = correlation.pearson_correlations(templates, targets)
+        self.assertEqual(correlations.shape, (3, 16))
+        for w, target in enumerate(targets):
+            for t, template in enumerate(templates):
+                self.assertAlmostEqual(correlations[w, t], np.corrcoef(template, target)[1, 0])
+        self.assertAlmostEqual(correlations[1, 5], 1.0)
+
+        # A single target window gives a vector, float32 gives the same coefficients up to its precision
+        correlations = correlation.pearson_correlations(templates, targets[0], dtype=np.float32)
+        self.assertEqual(correlations.shape, (16,))
+        self.assertEqual(correlations.dtype, np.float32)
+        self.assertTrue(np.allclose(correlations, correlation.pearson_correlations(templates, targets)[0], atol=1e-5))
+
+        # Mismatching lengths and traces without variance
+        self.assertRaises(Exception, correlation.pearson_correlations, templates, targets[:, :10])
+        with np.errstate(invalid="ignore"):
+            self.assertTrue(np.isnan(correlation.pearson_correlations(np.ones((1, 500)), targets[0])[0]))
+
+    def test_complex_correlations(self):
+        templates = np.fft.fft(np.random.randint(-128, 127, size=(4, 64)))
+        target = np.fft.fft(np.random.randint(-128, 127, size=64))
+        correlations = correlation.pearson_correlations(templates, target)
+        for t, template in enumerate(templates):
+            self.assertAlmostEqual(correlations[t], np.corrcoef(template, target)[1, 0])
+
+    def test_correlate_windows(self):
+        templates = [np.random.randint(-128, 127, size=1000) for _ in range(8)]
+        target = np.random.randint(-128, 127, size=1000)
+        windows = [(100, 200), (500, 50)]
+        correlations = correlation.correlate_windows(templates, target, windows)
+        self.assertEqual(correlations.shape, (2, 8))
+        for w, (offset, duration) in enumerate(windows):
+            for t, template in enumerate(templates):
+                expected = np.corrcoef(template[offset:offset + duration], target[offset:offset + duration])[1, 0]
+                self.assertAlmostEqual(correlations[w, t], expected)
+        self.assertEqual(correlation.correlate_windows([], target, windows).shape, (2, 0))
+
+    def test_sliding_correlations(self):
+        templates = np.random.randint(-128, 127, size=(4, 100))
+        target_segment = np.random.randint(-128, 127, size=120)
+        correlations = correlation.sliding_correlations(templates, target_segment)
+        self.assertEqual(correlations.shape, (4, 21))
+        for t, template in enumerate(templates):
+            for lag in range(21):
+                expected = np.corrcoef(template, target_segment[lag:lag + 100])[1, 0]
+                self.assertAlmostEqual(correlations[t, lag], expected)
+        self.assertRaises(Exception, correlation.sliding_correlations, templates, target_segment[:99])
+
+    def test_lag_search_correlations(self):
+        templates = [np.random.randint(-128, 127, size=1000) for _ in range(8)]
+        # The target contains template 3 shifted by 7 samples to the right
+        target = np.random.randint(-128, 127, size=1000)
+        target[7:] = templates[3][:-7]
+        peak_correlations, lags = correlation.lag_search_correlations(templates, target, 200, 300, max_lag=20)
+        self.assertEqual(peak_correlations.shape, (8,))
+        self.assertEqual(lags[3], 7)
+        self.assertAlmostEqual(peak_correlations[3], 1.0)
+        self.assertEqual(np.argmax(peak_correlations), 3)
+        for t, (template, lag) in enumerate(zip(templates, lags)):
+            self.assertTrue(-20 <= lag <= 20)
+            expected = np.corrcoef(template[200:500], target[200 + lag:500 + lag])[1, 0]
+            self.assertAlmostEqual(peak_correlations[t], expected)
+
+        # The lags are limited by the bounds of the target
+        _, lags = correlation.lag_search_correlations(templates, target, 5, 300, max_lag=20)
+        self.assertTrue(np.all(lags >= -5))
+        _, lags = correlation.lag_search_correlations(templates, target, 690, 300, max_lag=20)
+        self.assertTrue(np.all(lags <= 10))
+        self.assertEqual(len(correlation.lag_search_correlations([], target, 200, 300, max_lag=20)[0]), 0)
+
+    def test_correlate_samples(self):
+        templates = np.random.randint(-128, 127, size=(6, 1000))
+        target = np.random.randint(-128, 127, size=1000)
+        sample_indices = [3, 50, 51, 400, 999]
+        correlations = correlation.correlate_samples(templates, target, sample_indices)
+        for t, template in enumerate(templates):
+            self.assertAlmostEqual(correlations[t], np.corrcoef(template[sample_indices], target[sample_indices])[1, 0])
+        self.assertEqual(len(correlation.correlate_samples([], target, sample_indices)), 0)
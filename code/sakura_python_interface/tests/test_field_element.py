@@ -25,3 +25,24 @@ class TestBaseFieldElement(unittest.TestCase):
         p_pow_4_alt_2 **= 4
         self.assertEqual(p_pow_4, p_pow_4_alt)
 
+    def test_mersenne_reduce(self):
+        for value in [0, 1, constants.p - 1, constants.p, constants.p + 1, 2 ** 127, 2 ** 254 - 1,
+                      (constants.p - 1) ** 2, -1, -(2 ** 130) + 5]:
+            self.assertEqual(field_element.mersenne_reduce(value), value % constants.p)
+
+    def test_base_field_elem_arithmetic(self):
+        # Compare against schoolbook arithmetic in GF(p^2) = GF(p)[i] / (i^2 + 1)
+        a, b = 0x1A3472237C2FB305286592AD7B3833AA, 0x1E1F553F2878AA9C96869FB360AC77F6
+        c, d = 0x0E3FEE9BA120785AB924A2462BCBB287, 0x6E1C4AF8630E024249A7C344844C8B5C
+        x = field_element.FieldElement(a, b)
+        y = field_element.FieldElement(c, d)
+        p = constants.p
+        self.assertEqual(x * y, field_element.FieldElement((a * c - b * d) % p, (a * d + b * c) % p))
+        self.assertEqual(x + y, field_element.FieldElement((a + c) % p, (b + d) % p))
+        self.assertEqual(x - y, field_element.FieldElement((a - c) % p, (b - d) % p))
+        self.assertEqual(2 - x, field_element.FieldElement((2 - a) % p, -b % p))
+        self.assertEqual(x.square(), x * x)
+        self.assertEqual((x / y) * y, x)
+        self.assertEqual(x * x.mult_inv_complex(), field_element.FieldElement(1, 0))
+        # Operands given as (mpmath) complex numbers are interpreted as elements of GF(p^2)
+        self.assertEqual(constants.d * x, field_element.FieldElement(constants.d.real, constants.d.imag) * x)
@@ -78,18 +78,15 @@ class TestFourQImplementationHardware(unittest.TestCase):
                 sakura.write_operation(0x00, 0x01)
                 print("[*] Wait busy done [1/2]")
                 # Wait until busy is done
-                while sakura.is_busy():
-                    continue
+                sakura.wait_until_done()
                 if not test_without_cfk:
                     # Cofactor killing
                     sakura.write_operation(0x00, 0x06)
-                    while sakura.is_busy():
-                        continue
+                    sakura.wait_until_done()
                 # Precomputation + Scalar multiplication + Affine
                 sakura.write_operation(0x00, 0x02)
                 print("[*] Wait busy done [2/2]")
-                while sakura.is_busy():
-                    continue
+                sakura.wait_until_done()
 
                 self.fourq_read_result_point(sakura, i, test_without_cfk)
 
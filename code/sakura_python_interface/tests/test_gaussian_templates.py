@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from online_template_attack import gaussian_templates
+
+
+class TestGaussianTemplates(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(5)
+        self.nr_of_classes = 16
+        self.nr_of_samples = 6
+        self.class_means = self.rng.normal(0, 2, size=(self.nr_of_classes, self.nr_of_samples))
+        # Correlated noise
+        mixing = self.rng.normal(0, 1, size=(self.nr_of_samples, self.nr_of_samples))
+        self.covariance = mixing @ mixing.T + np.eye(self.nr_of_samples)
+
+    def generate(self, labels):
+        noise = self.rng.multivariate_normal(np.zeros(self.nr_of_samples), self.covariance, size=len(labels))
+        return self.class_means[labels] + noise
+
+    def test_accumulator(self):
+        labels = self.rng.integers(0, self.nr_of_classes, size=3000)
+        observations = self.generate(labels)
+        accumulator = gaussian_templates.ClassCovarianceAccumulator(self.nr_of_classes, self.nr_of_samples)
+        # Batches of different sizes and single observations give the same result
+        accumulator.add(observations[:1000], labels[:1000])
+        for observation, label in zip(observations[1000:1010], labels[1000:1010]):
+            accumulator.add(observation, label)
+        accumulator.add(observations[1010:], labels[1010:])
+        self.assertEqual(accumulator.counts.sum(), 3000)
+        for label in range(self.nr_of_classes):
+            self.assertTrue(np.allclose(accumulator.means[label], observations[labels == label].mean(axis=0)))
+        residuals = observations - accumulator.means[labels]
+        expected_covariance = residuals.T @ residuals / (3000 - self.nr_of_classes)
+        self.assertTrue(np.allclose(accumulator.pooled_covariance, expected_covariance))
+        self.assertRaises(Exception, lambda: gaussian_templates.ClassCovarianceAccumulator(2, 3).pooled_covariance)
+
+    def test_log_likelihoods(self):
+        templates = gaussian_templates.GaussianTemplates(self.class_means, self.covariance)
+        observations = self.generate(np.arange(self.nr_of_classes))
+        log_likelihoods = templates.log_likelihoods(observations)
+        self.assertEqual(log_likelihoods.shape, (self.nr_of_classes, self.nr_of_classes))
+        inverse_covariance = np.linalg.inv(self.covariance)
+        _, log_determinant = np.linalg.slogdet(self.covariance)
+        for n, observation in enumerate(observations):
+            for c, mean in enumerate(self.class_means):
+                deviation = observation - mean
+                expected = -0.5 * (deviation @ inverse_covariance @ deviation + log_determinant +
+                                   self.nr_of_samples * np.log(2 * np.pi))
+                self.assertAlmostEqual(log_likelihoods[n, c], expected)
+        self.assertTrue(np.allclose(templates.log_likelihoods(observations[0]), log_likelihoods[0]))
+
+    def test_classify(self):
+        labels = self.rng.integers(0, self.nr_of_classes, size=5000)
+        accumulator = gaussian_templates.ClassCovarianceAccumulator(self.nr_of_classes, self.nr_of_samples)
+        accumulator.add(self.generate(labels), labels)
+        templates = gaussian_templates.GaussianTemplates.from_accumulator(accumulator)
+        test_labels = self.rng.integers(0, self.nr_of_classes, size=500)
+        accuracy = np.mean(templates.classify(self.generate(test_labels)) == test_labels)
+        self.assertTrue(accuracy > 0.5)
+
+        # Classes without profiling observations are never chosen
+        accumulator = gaussian_templates.ClassCovarianceAccumulator(3, self.nr_of_samples)
+        accumulator.add(self.generate(np.zeros(100, dtype=int)), np.zeros(100, dtype=int))
+        accumulator.add(self.generate(np.ones(100, dtype=int)), np.ones(100, dtype=int))
+        templates = gaussian_templates.GaussianTemplates.from_accumulator(accumulator)
+        self.assertEqual(templates.log_likelihoods(self.class_means[2])[2], -np.inf)
+
+    def test_persistence(self):
+        templates = gaussian_templates.GaussianTemplates(self.class_means, self.covariance)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "templates.npz")
+            gaussian_templates.save_templates([templates, templates], [templates], [np.arange(6), np.arange(6) + 1],
+                                              [np.arange(6) * 2], path)
+            dbl_templates, add_templates, dbl_pois, add_pois = gaussian_templates.load_templates(path)
+        self.assertEqual((len(dbl_templates), len(add_templates)), (2, 1))
+        self.assertTrue(np.array_equal(dbl_pois[1], np.arange(6) + 1))
+        self.assertTrue(np.array_equal(add_pois[0], np.arange(6) * 2))
+        observation = self.generate([3])[0]
+        self.assertTrue(np.allclose(add_templates[0].log_likelihoods(observation), templates.log_likelihoods(observation)))
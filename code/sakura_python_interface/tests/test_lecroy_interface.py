@@ -97,3 +97,50 @@ class TestLeCroyInterface(unittest.TestCase):
         fp[0] = np.ones(6000)
         print(fp[0])
         del fp
+
+    def test_decode_segmented_trace(self):
+        segments = np.array([[-128, 0, 127], [1, -1, 5]])
+        channel_out = (segments + 128).astype(np.uint8).tobytes()
+        decoded = Lecroy.decode_segmented_trace(channel_out, 2)
+        self.assertTrue(np.array_equal(decoded, segments))
+        self.assertTrue(np.array_equal(decoded[1], Lecroy.decode_trace(channel_out[3:])))
+        self.assertRaises(Exception, Lecroy.decode_segmented_trace, channel_out, 4)
+
+    def test_acquire_segmented_traces(self):
+        nr_of_segments = 5
+        lecroy_if.prepare_for_segmented_capture(nr_of_segments)
+        lecroy_if.wait_lecroy()
+        traces = lecroy_if.acquire_segmented_traces("C3", nr_of_segments)
+        lecroy_if.disable_sequence_mode()
+        self.assertEqual(traces.shape[0], nr_of_segments)
+
+
+class FakeActiveDSO:
+    """
+    Records the time-out time of the control during WaitForOPC
+    """
+
+    def __init__(self):
+        self.timeout = 10
+        self.waited_with_timeout = []
+
+    def SetTimeout(self, seconds):
+        self.timeout = seconds
+
+    def WaitForOPC(self):
+        self.waited_with_timeout.append(self.timeout)
+        return True
+
+
+class TestWaitLecroy(unittest.TestCase):
+
+    def test_timeout_is_restored(self):
+        scope = Lecroy.__new__(Lecroy)
+        scope._scope = FakeActiveDSO()
+        scope.transfers_timeout = 10
+        scope.set_transfers_timeout(20)
+        self.assertTrue(scope.wait_lecroy())
+        self.assertTrue(scope.wait_lecroy(timeout=2))
+        self.assertEqual(scope._scope.waited_with_timeout, [20, 2])
+        # The transfers after the wait use the time-out time of the control again
+        self.assertEqual(scope._scope.timeout, 20)
@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+
+from online_template_attack import operation_offsets
+
+
+def generate_trigger_trace(nr_of_iterations=64, dbl_duration=300, add_duration=500, gap=100, start=1000, noise=2.0,
+                           seed=0):
+    """
+    :return: A trigger trace with alternating DBL and ADD pulses, and the expected (start, duration) of every pulse
+    """
+    rng = np.random.default_rng(seed)
+    expected = []
+    offset = start
+    for _ in range(nr_of_iterations):
+        for duration in (dbl_duration, add_duration):
+            expected.append((offset, duration))
+            offset += duration + gap
+    trace = np.full(offset + start, -40.0)
+    for pulse_start, duration in expected:
+        trace[pulse_start:pulse_start + duration] = 40.0
+    return trace + rng.normal(0, noise, size=len(trace)), expected
+
+
+class TestOperationOffsets(unittest.TestCase):
+
+    def test_detect_pulses(self):
+        trace, expected = generate_trigger_trace()
+        original = trace.copy()
+        pulses = operation_offsets.detect_pulses(trace)
+        self.assertEqual(pulses.dtype, operation_offsets.OFFSET_DTYPE)
+        self.assertEqual([(int(start), int(duration)) for start, duration in pulses], expected)
+        # The trigger trace is not modified
+        self.assertTrue(np.array_equal(trace, original))
+
+        # Pulses that are not completely captured are ignored
+        pulses = operation_offsets.detect_pulses(trace[1100:-1100])
+        self.assertEqual(len(pulses), len(expected) - 2)
+        self.assertEqual(pulses[0]["start"], expected[1][0] - 1100)
+        self.assertEqual(len(operation_offsets.detect_pulses(np.zeros(100))), 0)
+
+    def test_glitches(self):
+        trace, expected = generate_trigger_trace(noise=5.0)
+        # A high glitch between two pulses and a low glitch within a pulse
+        trace[expected[0][0] + 320:expected[0][0] + 323] = 40.0
+        trace[expected[5][0] + 200:expected[5][0] + 203] = -40.0
+        pulses = operation_offsets.detect_pulses(trace, min_pulse_width=10)
+        self.assertEqual([(int(start), int(duration)) for start, duration in pulses], expected)
+        self.assertNotEqual(len(operation_offsets.detect_pulses(trace)), len(expected))
+
+    def test_decimation(self):
+        trace, expected = generate_trigger_trace()
+        pulses = operation_offsets.detect_pulses(trace[::10], decimation=10, min_pulse_width=30)
+        self.assertEqual(len(pulses), len(expected))
+        for (start, duration), (exp_start, exp_duration) in zip(pulses, expected):
+            self.assertTrue(abs(start - exp_start) < 10)
+            self.assertTrue(abs(duration - exp_duration) <= 10)
+
+    def test_determine_operation_offsets(self):
+        trace, expected = generate_trigger_trace()
+        dbl_offsets, add_offsets = operation_offsets.determine_operation_offsets(trace)
+        self.assertEqual(len(dbl_offsets), 64)
+        self.assertTrue(np.all(dbl_offsets["duration"] == 300))
+        self.assertTrue(np.all(add_offsets["duration"] == 500))
+        self.assertEqual(operation_offsets.interleave_offsets(dbl_offsets, add_offsets), expected)
+
+        # Missing operations and deviating durations are detected
+        self.assertRaises(Exception, operation_offsets.determine_operation_offsets, trace[:-10000])
+        trace[expected[10][0] + 300:expected[10][0] + 400] = 40.0
+        self.assertRaises(Exception, operation_offsets.determine_operation_offsets, trace)
@@ -1,7 +1,70 @@
+import os
+import tempfile
 import unittest
-from online_template_attack import ota
+from unittest import mock
+from fourq_software import scalar_recoding
+from online_template_attack import board_pool, ota, replay
 import numpy as np
 
+import test_replay
+
+
+class FakeCaptureBoard:
+    """
+    The FPGA and oscilloscope of a capture: the trace of scalar s is s plus uniform noise of amplitude noise[s]
+    """
+
+    def __init__(self, noise):
+        self.noise = noise
+        self.rng = np.random.RandomState(15)
+        self.loaded_scalar = None
+        self.captured_scalar = None
+        self.nr_of_captures = {}
+
+    def load_scalar(self, sakura, scalar, use_decomposed_scalar):
+        self.loaded_scalar = scalar
+
+    def perform_scalar_mult(self, sakura, without_cfk=True, wait_for_completion=None):
+        self.captured_scalar = self.loaded_scalar
+        self.nr_of_captures[self.captured_scalar] = self.nr_of_captures.get(self.captured_scalar, 0) + 1
+
+    def prepare_for_trace_capture(self):
+        pass
+
+    def wait_lecroy(self, timeout=None):
+        pass
+
+    def transfer_trace(self, channel):
+        noise = self.noise[self.captured_scalar]
+        return self.captured_scalar + self.rng.randint(-noise, noise + 1, size=100)
+
+    @staticmethod
+    def decode_trace(channel_out):
+        return channel_out
+
+
+class FakeBoardPool:
+    """
+    Runs the jobs of a template board pool in this process, on a FakeCaptureBoard per board of the pool
+    """
+
+    def __init__(self, boards):
+        self.boards = boards
+
+    def __len__(self):
+        return len(self.boards)
+
+    def run(self, payloads, on_result=None, in_parallel=None):
+        if in_parallel is not None:
+            in_parallel()
+        results = []
+        for payload, board in zip(payloads, self.boards):
+            with mock.patch.object(ota, "lecroy_if", board), mock.patch.object(ota, "load_scalar", board.load_scalar), \
+                    mock.patch.object(ota, "perform_scalar_mult", board.perform_scalar_mult):
+                results.append(ota.capture_pool_job(None, board_pool.Board(b"SAKURA1A", "192.168.0.2", "C3"),
+                                                    payload))
+        return results
+
 
 class TestOnlineTemplateAttack(unittest.TestCase):
 
@@ -14,6 +77,77 @@ class TestOnlineTemplateAttack(unittest.TestCase):
         for offset, loaded_offset in zip(offsets, loaded_offsets):
             self.assertTrue(np.array_equal(offset, loaded_offset))
 
+    def test_capture_average_traces_pipelined(self):
+        board = FakeCaptureBoard({0: 0, 1: 50})
+        with mock.patch.object(ota, "lecroy_if", board), mock.patch.object(ota, "load_scalar", board.load_scalar), \
+                mock.patch.object(ota, "perform_scalar_mult", board.perform_scalar_mult):
+            average_traces = ota.capture_average_traces_pipelined(None, [0, 1], 20, True)
+            self.assertEqual(board.nr_of_captures, {0: 20, 1: 20})
+            self.assertTrue(np.array_equal(average_traces[0], np.zeros(100)))
+
+            # The noiseless scalar has converged after the first round, the other one is captured until the maximum
+            board.nr_of_captures = {}
+            average_traces = ota.capture_average_traces_pipelined(None, [0, 1], 20, True, max_standard_error=0.5)
+            self.assertEqual(board.nr_of_captures, {0: ota.averaging_batch_size, 1: 20})
+            self.assertTrue(np.array_equal(average_traces[0], np.zeros(100)))
+            self.assertLess(np.max(np.abs(average_traces[1] - 1)), 50)
+
+            board.nr_of_captures = {}
+            traces = ota.capture_average_traces_pipelined(None, [1, 0], 1, True)
+            self.assertEqual(board.nr_of_captures, {0: 1, 1: 1})
+            self.assertTrue(np.array_equal(traces[1], np.zeros(100)))
+
+    def test_capture_average_traces_on_all_boards(self):
+        board = FakeCaptureBoard({0: 0, 1: 50})
+        pool_boards = [FakeCaptureBoard({0: 0, 1: 50}) for _ in range(2)]
+        with mock.patch.object(ota, "lecroy_if", board), mock.patch.object(ota, "load_scalar", board.load_scalar), \
+                mock.patch.object(ota, "perform_scalar_mult", board.perform_scalar_mult), \
+                mock.patch.object(ota, "template_board_pool", FakeBoardPool(pool_boards)):
+            # Every board captures its share of every scalar, including the board of this process
+            average_traces = ota.capture_average_traces_pipelined(None, [0, 1], 20, True)
+            self.assertEqual(board.nr_of_captures, {0: 7, 1: 7})
+            self.assertEqual([pool_board.nr_of_captures for pool_board in pool_boards], [{0: 7, 1: 7}, {0: 6, 1: 6}])
+            self.assertTrue(np.array_equal(average_traces[0], np.zeros(100)))
+            self.assertLess(np.max(np.abs(average_traces[1] - 1)), 50)
+
+            # A single trace per scalar is captured on the board of this process
+            board.nr_of_captures = {}
+            traces = ota.capture_average_traces_pipelined(None, [1, 0], 1, True)
+            self.assertEqual(board.nr_of_captures, {0: 1, 1: 1})
+            self.assertTrue(np.array_equal(traces[1], np.zeros(100)))
+
+    def test_replay_stored_campaign(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        ota.campaign_directory = os.path.join(directory.name, "campaign")
+        self.addCleanup(ota.close_campaign)
+        synthetic_campaign = test_replay.SyntheticCampaign(np.random.RandomState(20))
+
+        # The traces are stored the way online_template_attack stores them
+        ota.store_campaign_trace(synthetic_campaign.target_trace, label="target",
+                                 multi_scalar=synthetic_campaign.multi_scalar, channel="C3")
+        ota.store_campaign_trace(synthetic_campaign.trigger_trace, label="trigger", channel="C2")
+        attacked_digit_columns = None
+        for iteration in (63, 62):
+            template_traces, template_digit_columns = [], []
+            for sign in ((1,) if iteration == 63 else (-1, 1)):
+                for value in range(8):
+                    template_traces.append(synthetic_campaign.template_trace(iteration, sign, value))
+                    template_digit_columns.append(scalar_recoding.generate_digit_column_for_value(value, sign))
+            ota.store_template_traces(template_traces, template_digit_columns, [None] * len(template_traces),
+                                      attacked_digit_columns is None, attacked_digit_columns)
+            attacked_digit_columns = synthetic_campaign.recoded_matrix[:, [63 - iteration]]
+        ota.close_campaign()
+        # Without a campaign, traces are no longer stored (and the closed store is not reused)
+        ota.store_campaign_trace(synthetic_campaign.target_trace, label="target", channel="C3")
+        self.assertIsNone(ota.campaign_store)
+
+        with replay.Campaign(os.path.join(directory.name, "campaign")) as campaign:
+            self.assertEqual(campaign.offsets, test_replay.operation_offsets())
+            self.assertEqual(campaign.iterations, [63, 62])
+            self.assertTrue(np.array_equal(campaign.expected_digit_column(62), synthetic_campaign.recoded_matrix[:, 1]))
+            self.assertTrue(np.array_equal(replay.replay_attack(campaign), np.ones((1, 2))))
+
     def test_ota(self):
         todo = 1
         # TODO test whether the OTA behaves as expected
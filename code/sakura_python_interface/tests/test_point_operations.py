@@ -3,7 +3,7 @@ import unittest
 from mpmath import *
 
 from fourq_software.field_element import FieldElement
-from fourq_software.point import Point
+from fourq_software.point import Point, ExtendedPoint, batch_to_affine
 
 # Set precision of mpmath library
 mp.dps = 9000
@@ -75,5 +75,44 @@ class TwistedEdwardsComplex(unittest.TestCase):
         # Test if P + O = P
         self.assertTrue(p_plus_o.x == p.x and p_plus_o.y == p.y)
 
+    def test_extended_coordinates(self):
+        field_element_x = FieldElement(0x1a3472237c2fb305 << 64 | 0x286592ad7b3833aa,
+                                       0x1e1f553f2878aa9c << 64 | 0x96869fb360ac77f6)
+        field_element_y = FieldElement(0x0e3fee9ba120785a << 64 | 0xb924a2462bcbb287,
+                                       0x6e1c4af8630e0242 << 64 | 0x49a7c344844c8b5c)
+        p = Point(field_element_x, field_element_y)
+        p_ext = p.to_extended()
+
+        # Doubling in extended coordinates should match the affine doubling
+        p_dbl = p_ext.dbl().to_affine()
+        expected = p.dbl()
+        self.assertTrue(p_dbl.x == expected.x and p_dbl.y == expected.y)
+
+        # Addition is unified, so P + P should equal 2P
+        p_plus_p = (p_ext + p_ext).to_affine()
+        self.assertTrue(p_plus_p.x == expected.x and p_plus_p.y == expected.y)
 
+        # 2P + P should match the affine addition and be on the curve
+        p_three = (p_ext.dbl() + p_ext).to_affine()
+        expected = p.dbl() + p
+        self.assertTrue(p_three.x == expected.x and p_three.y == expected.y)
+        self.assertTrue(p_three.on_curve())
 
+        # P + (-P) = O and P + O = P
+        neutral = (p_ext + (-p_ext)).to_affine()
+        self.assertTrue(neutral.x == FieldElement(0, 0) and neutral.y == FieldElement(1, 0))
+        p_plus_o = (p_ext + ExtendedPoint.neutral()).to_affine()
+        self.assertTrue(p_plus_o.x == p.x and p_plus_o.y == p.y)
+
+    def test_batch_to_affine(self):
+        field_element_x = FieldElement(0x1a3472237c2fb305 << 64 | 0x286592ad7b3833aa,
+                                       0x1e1f553f2878aa9c << 64 | 0x96869fb360ac77f6)
+        field_element_y = FieldElement(0x0e3fee9ba120785a << 64 | 0xb924a2462bcbb287,
+                                       0x6e1c4af8630e0242 << 64 | 0x49a7c344844c8b5c)
+        points = [Point(field_element_x, field_element_y).to_extended()]
+        for i in range(5):
+            points.append(points[-1].dbl())
+        affine_points = batch_to_affine(points)
+        for point, affine_point in zip(points, affine_points):
+            expected = point.to_affine()
+            self.assertTrue(affine_point.x == expected.x and affine_point.y == expected.y)
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from online_template_attack import points_of_interest
+
+
+class TestPointsOfInterest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(3)
+        # Two windows of 200 samples, the class only leaks at samples 40 and 120 (first window) and 10 (second window)
+        self.windows = [(100, 200), (500, 200)]
+        self.leaking_samples = [[40, 120], [10]]
+
+    def generate_trace(self, labels):
+        trace = self.rng.normal(0, 1, size=800)
+        for (offset, _), leaking_samples, label in zip(self.windows, self.leaking_samples, labels):
+            for sample in leaking_samples:
+                trace[offset + sample] += label
+        return trace
+
+    def test_statistics(self):
+        means = np.array([[0.0, 1.0, 5.0], [0.0, 2.0, 5.0], [0.0, 3.0, 5.0]])
+        variances = np.ones((3, 3))
+        counts = np.array([10, 10, 10])
+        self.assertTrue(np.allclose(points_of_interest.snr(means, variances), [0, 2 / 3, 0]))
+        # Pairs (1, 2), (1, 3) and (2, 3) differ 1, 2 and 1 at the second sample, with a variance of 0.2
+        self.assertTrue(np.allclose(points_of_interest.sost(means, variances, counts), [0, 6 / 0.2, 0]))
+        self.assertTrue(np.allclose(points_of_interest.t_test(means, variances, counts), [0, 2 / np.sqrt(0.2), 0]))
+
+    def test_select_points_of_interest(self):
+        statistic = np.array([0, 9, 8, 7, 0, 0, 5, np.nan, 6, 1], dtype=np.float64)
+        self.assertEqual(list(points_of_interest.select_points_of_interest(statistic, 3)), [1, 2, 3])
+        self.assertEqual(list(points_of_interest.select_points_of_interest(statistic, 3, min_spacing=3)), [1, 4, 8])
+        # Not enough samples for the spacing
+        self.assertEqual(list(points_of_interest.select_points_of_interest(statistic, 5, min_spacing=5)), [1, 8])
+
+    def test_profiler(self):
+        profiler = points_of_interest.PoiProfiler(self.windows, nr_of_classes=4)
+        for _ in range(400):
+            labels = self.rng.integers(0, 4, size=2)
+            profiler.add_trace(self.generate_trace(labels), labels)
+        for statistic in points_of_interest.STATISTICS:
+            pois = profiler.select(2, min_spacing=5, statistic=statistic)
+            self.assertEqual(list(pois[0]), [40, 120])
+            self.assertIn(10, list(pois[1]))
+        self.assertRaises(Exception, profiler.statistic, 0, "unknown")
+        self.assertRaises(Exception, profiler.add_trace, self.generate_trace([0, 0]), [0])
+        self.assertRaises(Exception, points_of_interest.PoiProfiler(self.windows, 4).statistic, 0)
+
+    def test_persistence(self):
+        dbl_pois = [np.array([1, 5, 9]), np.array([2, 4, 8])]
+        add_pois = [np.array([3, 7, 11])]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pois.npz")
+            points_of_interest.save_points_of_interest(dbl_pois, add_pois, path, statistic="sost", min_spacing=4)
+            loaded_dbl_pois, loaded_add_pois, settings = points_of_interest.load_points_of_interest(path)
+        self.assertEqual(len(loaded_dbl_pois), 2)
+        for pois, loaded_pois in zip(dbl_pois + add_pois, loaded_dbl_pois + loaded_add_pois):
+            self.assertTrue(np.array_equal(pois, loaded_pois))
+        self.assertEqual(settings, {"statistic": "sost", "min_spacing": 4})
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from fourq_software import scalar_recoding
+from online_template_attack import replay, scoring
+from online_template_attack.trace_store import TraceStore
+
+# Layout of the synthetic traces: every operation takes 20 samples and is followed by 10 idle samples
+OPERATION_DURATION = 20
+OPERATION_PERIOD = 30
+FIRST_OPERATION = 50
+SAMPLES_PER_TRACE = FIRST_OPERATION + 128 * OPERATION_PERIOD + 50
+
+
+def operation_offsets():
+    return [(FIRST_OPERATION + idx * OPERATION_PERIOD, OPERATION_DURATION) for idx in range(128)]
+
+
+class SyntheticCampaign:
+    """
+    The traces of a synthetic campaign, in which the doubling operations leak the class of their digit column
+    """
+
+    multi_scalar = [0x8b8e05ff76fe90a5, 0x6261ed79303c3feb, 0x780e38de51089170, 0x5f055848a6493e4f]
+
+    def __init__(self, rng):
+        self.rng = rng
+        # The leakage of a digit column in the doubling operation processing it
+        self.patterns = rng.randint(-60, 60, size=(16, OPERATION_DURATION))
+        self.recoded_matrix = scalar_recoding.recode_multi_scalar_general_unoptimized(
+            np.asarray(self.multi_scalar, dtype=np.uint64), 2 ** 256)
+
+        self.trigger_trace = np.zeros(SAMPLES_PER_TRACE, dtype=np.int8)
+        self.target_trace = rng.randint(-60, 60, size=SAMPLES_PER_TRACE)
+        for idx, (start, duration) in enumerate(operation_offsets()):
+            self.trigger_trace[start:start + duration] = 100
+            if idx % 2 == 0:
+                digit_column = self.recoded_matrix[:, idx // 2]
+                self.target_trace[start:start + duration] = self.patterns[scalar_recoding.digit_column_class(
+                    scalar_recoding.digit_column_value(digit_column), digit_column[0])]
+
+    def template_trace(self, iteration, sign, value):
+        """
+        :return: A template trace of the given iteration, in which only the attacked doubling operation differs from
+        the target trace
+        """
+        start, duration = operation_offsets()[2 * (63 - iteration)]
+        template_trace = self.target_trace + self.rng.randint(-5, 5, size=SAMPLES_PER_TRACE)
+        template_trace[start:start + duration] = self.patterns[scalar_recoding.digit_column_class(value, sign)]
+        return template_trace
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "campaign")
+        campaign = SyntheticCampaign(np.random.RandomState(20))
+        self.multi_scalar = campaign.multi_scalar
+        self.recoded_matrix = campaign.recoded_matrix
+        self.target_trace = campaign.target_trace
+
+        with TraceStore(self.path, samples_per_trace=SAMPLES_PER_TRACE) as store:
+            store.append(self.target_trace, label="target", multi_scalar=self.multi_scalar, channel="C3")
+            store.append(campaign.trigger_trace, label="trigger", channel="C2")
+            # Two templates per digit column for the first two iterations
+            for iteration in (63, 62):
+                for _ in range(2):
+                    for sign in ((1,) if iteration == 63 else (-1, 1)):
+                        for value in range(8):
+                            store.append(campaign.template_trace(iteration, sign, value), label="template",
+                                         iteration=iteration, sign=sign, digit_column=value, channel="C3")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_campaign(self):
+        with replay.Campaign(self.path) as campaign:
+            self.assertEqual(campaign.offsets, operation_offsets())
+            self.assertEqual(campaign.iterations, [63, 62])
+            self.assertTrue(np.array_equal(campaign.target_trace, self.target_trace))
+            self.assertTrue(np.array_equal(campaign.expected_digit_column(62), self.recoded_matrix[:, 1]))
+            self.assertEqual(campaign.nr_of_runs(63), 2)
+            self.assertEqual(campaign.nr_of_runs(62, nr_of_averaged_templates=2), 1)
+            self.assertEqual(campaign.nr_of_runs(0), 0)
+
+            template_traces, template_digit_columns = campaign.template_traces(62, run=1)
+            self.assertEqual(len(template_traces), 16)
+            self.assertTrue(np.array_equal(template_digit_columns[0][:, 0], [-1, 0, 0, 0]))
+            # Run 1 uses the second template trace of every digit column
+            self.assertTrue(np.array_equal(template_traces[0], campaign.store.traces[2 + 16 + 16]))
+            averaged_traces, _ = campaign.template_traces(62, nr_of_averaged_templates=2)
+            self.assertTrue(np.allclose(averaged_traces[0], np.mean(campaign.store.traces[[2 + 16, 2 + 16 + 16]],
+                                                                    axis=0)))
+            self.assertEqual(campaign.template_traces(62, nr_of_averaged_templates=2, run=1), ([], []))
+
+        # The offsets can be given instead of determined from the trigger trace
+        offsets = operation_offsets()[::-1]
+        with replay.Campaign(self.path, offsets=offsets) as campaign:
+            self.assertEqual(campaign.offsets, offsets)
+
+    def test_replay_attack(self):
+        with replay.Campaign(self.path) as campaign:
+            results = replay.replay_digit_column(campaign, 63)
+            self.assertEqual(len(results), 8)
+            self.assertEqual(scoring.rank_of_expected(results, self.recoded_matrix[:, 0]), 1)
+
+            ranks_per_iter = replay.replay_attack(campaign)
+            self.assertTrue(np.array_equal(ranks_per_iter, np.ones((2, 2))))
+            ranks_per_iter = replay.replay_attack(campaign, replay.DEFAULT_SETTINGS._replace(
+                nr_of_averaged_templates=2, offset_into_start=2, offset_from_end=2), iterations=[62])
+            self.assertTrue(np.array_equal(ranks_per_iter, [[1]]))
+
+    def test_sweep(self):
+        settings_list = [replay.DEFAULT_SETTINGS, replay.DEFAULT_SETTINGS._replace(use_fft=True),
+                         replay.DEFAULT_SETTINGS._replace(nr_of_averaged_templates=2, max_lag=3)]
+        serial_ranks = replay.sweep(self.path, settings_list, max_workers=1)
+        self.assertEqual([ranks.shape for ranks in serial_ranks], [(2, 2), (2, 2), (1, 2)])
+        parallel_ranks = replay.sweep(self.path, settings_list, max_workers=2)
+        for serial, parallel in zip(serial_ranks, parallel_ranks):
+            self.assertTrue(np.array_equal(serial, parallel))
+        self.assertTrue(np.array_equal(serial_ranks[0], np.ones((2, 2))))
+
+    def test_missing_target(self):
+        empty_path = os.path.join(self.directory.name, "empty")
+        TraceStore(empty_path, samples_per_trace=10).close()
+        self.assertRaises(Exception, replay.Campaign, empty_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
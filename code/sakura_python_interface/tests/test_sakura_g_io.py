@@ -1,8 +1,9 @@
+import time
 import unittest
 from binascii import hexlify
 
 from fourq_hardware import fourq_rom_constants
-from sakura_g.ftdi_interface import SaseboGii
+from sakura_g.ftdi_interface import CommandBatch, SaseboGii, encode_read, encode_write, wait_while_busy
 
 sakura = None
 
@@ -93,5 +94,115 @@ class TestFpgaIO(unittest.TestCase):
         self.assertEqual(output, expected_output)
 
 
+class TestCommandBatch(unittest.TestCase):
+
+    def test_encode_write(self):
+        self.assertEqual(encode_write(0x0140, 0x13, 0x35), bytes([0x02, 0x01, 0x40, 0x13, 0x35]))
+        self.assertEqual(encode_read(0x0296), bytes([0x01, 0x02, 0x96]))
+
+    def test_write64(self):
+        """
+        A batched 64-bit write consists of the same commands as the separate writes of SaseboGii.write64
+        """
+        batch = CommandBatch()
+        batch.write64("00000000000000e4", 0x1F, 0x0140, is_upper_half=True)
+        self.assertEqual(len(batch), 6)
+        expected = (encode_write(0x0140, 0x00, 0x00) + encode_write(0x0142, 0x00, 0x00) +
+                    encode_write(0x0144, 0x00, 0x00) + encode_write(0x0146, 0x00, 0xe4) +
+                    encode_write(0x0138, 0x1F, 0x01) + encode_write(0x0002, 0x00, 0x02))
+        self.assertEqual(bytes(batch.commands), expected)
+
+        # Without data enable, the data is not written to the RAM
+        batch = CommandBatch()
+        batch.write64("0000000000000142", 0x1F, 0x0140, is_upper_half=False, data_enable=False)
+        self.assertEqual(bytes(batch.commands[-5:]), encode_write(0x0138, 0x1F, 0x00))
+
+    def test_rom_batch(self):
+        batch = CommandBatch()
+        for lower_half, upper_half, addr in fourq_rom_constants.rom_values:
+            batch.write64(lower_half, addr, 0x0140, is_upper_half=False)
+            batch.write64(upper_half, addr, 0x0140, is_upper_half=True)
+        self.assertEqual(len(batch), 12 * len(fourq_rom_constants.rom_values))
+        self.assertEqual(len(batch.commands), 5 * len(batch))
+
+
+    def test_read_result_point(self):
+        """
+        Reading back a point queues a ROM address write and four reads per 64-bit word
+        """
+        batch = CommandBatch()
+        for address in (0x02, 0x03):
+            batch.write_rom_address(address, 0x00)
+            batch.read_result()
+        self.assertEqual((len(batch), batch.nr_of_reads), (10, 8))
+        self.assertEqual(bytes(batch.commands[:17]), encode_write(0x0138, 0x02, 0x00) + encode_read(0x0186) +
+                         encode_read(0x0188) + encode_read(0x018a) + encode_read(0x018c))
+        self.assertRaises(Exception, batch.responses64)
+        batch.responses = bytearray(range(16))
+        self.assertEqual(batch.responses64(), ["0001020304050607", "08090a0b0c0d0e0f"])
+
+
+    def test_shadow(self):
+        """
+        Writes of unchanged values that are not overwritten by the design are skipped
+        """
+        shadow = {}
+        batch = CommandBatch(shadow=shadow)
+        batch.write64("0000000000000142", 0x1E, 0x0140, is_upper_half=False, skip_unchanged=True)
+        batch.write64("00000000000000E4", 0x1E, 0x0140, is_upper_half=True, skip_unchanged=True)
+        batch.write64("0000000000000142", 0x02, 0x0140, is_upper_half=False)
+        self.assertEqual(len(batch), 18)
+        # The shadow copy only changes once the batch has been sent
+        self.assertEqual(shadow, {})
+        batch.apply_shadow_updates()
+        self.assertEqual(shadow, {(0x1E, False): "0000000000000142", (0x1E, True): "00000000000000e4"})
+
+        batch = CommandBatch(shadow=shadow)
+        batch.write64("0000000000000142", 0x1E, 0x0140, is_upper_half=False, skip_unchanged=True)
+        batch.write64("00000000000000e4", 0x1E, 0x0140, is_upper_half=True, skip_unchanged=True)
+        batch.write64("0000000000000142", 0x02, 0x0140, is_upper_half=False, skip_unchanged=True)
+        self.assertEqual(len(batch), 6)
+        # Writing without skipping (or a changed value) invalidates the entry
+        batch.write64("0000000000000000", 0x1E, 0x0140, is_upper_half=True)
+        batch.apply_shadow_updates()
+        self.assertEqual(shadow, {(0x1E, False): "0000000000000142", (0x02, False): "0000000000000142"})
+
+
+class TestWaitWhileBusy(unittest.TestCase):
+
+    def test_backoff(self):
+        poll_times = []
+        end = time.perf_counter() + 0.05
+
+        def is_busy():
+            poll_times.append(time.perf_counter())
+            return poll_times[-1] < end
+
+        elapsed = wait_while_busy(is_busy, initial_poll_interval=1e-3, max_poll_interval=8e-3)
+        self.assertGreaterEqual(elapsed, 0.05)
+        # The poll interval grows up to the maximum, so far fewer polls than with spinning are needed
+        self.assertLess(len(poll_times), 20)
+        self.assertGreater(poll_times[-1] - poll_times[-2], poll_times[1] - poll_times[0])
+
+    def test_expected_duration(self):
+        poll_times = []
+        start = time.perf_counter()
+        wait_while_busy(lambda: poll_times.append(time.perf_counter()) or False, expected_duration=0.02)
+        # Nothing is polled during the expected duration of the operation
+        self.assertEqual(len(poll_times), 1)
+        self.assertGreaterEqual(poll_times[0] - start, 0.02)
+
+    def test_timeout(self):
+        self.assertRaises(Exception, wait_while_busy, lambda: True, timeout=0.02)
+
+    def test_wait_for_completion(self):
+        events = []
+        elapsed = wait_while_busy(lambda: events.append("poll") or False,
+                                  wait_for_completion=lambda timeout: events.append(timeout) or True, timeout=1.0)
+        self.assertEqual(events, [1.0, "poll"])
+        self.assertGreaterEqual(elapsed, 0)
+        self.assertRaises(Exception, wait_while_busy, lambda: False, wait_for_completion=lambda timeout: False)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,11 @@
 import gmpy2
+import numpy as np
+import random
 import unittest
 from gmpy2 import mpq
 
 from fourq_hardware import constants
-from fourq_software import scalar_decomposition
+from fourq_software import scalar_decomposition, decomposition_constants
 from fourq_software.scalar_decomposition import inverse_decomposition_using_eigen
 from tests.test_constants import scalar_decomp_test_vectors
 
@@ -125,3 +127,35 @@ class TestsScalarDecomposition(unittest.TestCase):
             decomposed_scalar = test_vector[1]
             reconstructed_scalar = inverse_decomposition_using_eigen(decomposed_scalar)
             self.assertEqual(reconstructed_scalar, expected_scalar % constants.N)
+
+    def test_decomposition_constants(self):
+        self.assertTrue(decomposition_constants.self_test())
+
+    def test_integer_decomposition_matches_rational(self):
+        random.seed(0)
+        scalars = [test_vector[0] for test_vector in scalar_decomp_test_vectors]
+        scalars += [random.randrange(1, 2 ** 256) for _ in range(200)]
+        for scalar in scalars:
+            decomposed_scalar = scalar_decomposition.decompose_scalar(scalar)
+            self.assertEqual(decomposed_scalar, scalar_decomposition.decompose_scalar_rational(scalar))
+            self.assertTrue(decomposed_scalar[0] & 1)
+            self.assertTrue(all(0 <= ai < 2 ** 64 for ai in decomposed_scalar))
+            self.assertEqual(scalar_decomposition.inverse_decomposition_using_eigen(decomposed_scalar),
+                             scalar % constants.N)
+
+    def test_decompose_scalars(self):
+        random.seed(1)
+        scalars = [test_vector[0] for test_vector in scalar_decomp_test_vectors]
+        scalars += [random.randrange(1, 2 ** 256) for _ in range(200)]
+        multi_scalars = scalar_decomposition.decompose_scalars(scalars)
+        self.assertEqual(multi_scalars.shape, (len(scalars), 4))
+        self.assertEqual(multi_scalars.dtype, np.uint64)
+        for scalar, multi_scalar in zip(scalars, multi_scalars):
+            self.assertEqual([int(ai) for ai in multi_scalar], scalar_decomposition.decompose_scalar(scalar))
+
+        reconstructed_scalars = scalar_decomposition.inverse_decompositions_using_eigen(multi_scalars)
+        for scalar, reconstructed_scalar in zip(scalars, reconstructed_scalars):
+            self.assertEqual(reconstructed_scalar, scalar % constants.N)
+
+        self.assertRaises(Exception, scalar_decomposition.decompose_scalars, [0])
+        self.assertEqual(scalar_decomposition.decompose_scalars([]).shape, (0, 4))
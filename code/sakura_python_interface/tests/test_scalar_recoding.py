@@ -81,7 +81,8 @@ class TestScalarRecoding(unittest.TestCase):
         base_point_order = 2 ** 256
         length = int(math.ceil(math.log(base_point_order, 2) / m)) + 1
 
-        scalars_in_matrix_form = scalar_recoding.get_valid_recoded_matrix(expected_digit_columns, length)
+        scalars_in_matrix_form, is_valid = scalar_recoding.get_valid_recoded_matrix(expected_digit_columns, length)
+        self.assertTrue(is_valid)
         # print(scalars_in_matrix_form)
         scalar_vals = scalar_recoding.matrix_to_scalars(scalars_in_matrix_form)
         scalar_vals = np.asarray(scalar_vals, dtype=np.uint64)
@@ -142,3 +143,70 @@ class TestScalarRecoding(unittest.TestCase):
                                                                                      2 ** 256)
             scalar_vals = np.asarray(scalar_recoding.matrix_to_scalars(recoded_matrix), dtype=np.uint64)
             self.assertTrue(np.array_equal(scalar_vals, expected_decomposed_scalar))
+
+    def test_recode_multi_scalars(self):
+        multi_scalars = [np.asarray(test_vector[1], dtype=np.uint64) for test_vector in scalar_decomp_test_vectors]
+        multi_scalars += [self._generate_random_64bit_scalars() for _ in range(100)]
+        multi_scalars = np.asarray(multi_scalars, dtype=np.uint64)
+        recoded_matrices, signs, digit_column_values = scalar_recoding.recode_multi_scalars(multi_scalars)
+        self.assertEqual(recoded_matrices.shape, (len(multi_scalars), 4, 65))
+        for multi_scalar, recoded_matrix, signs_i, digit_column_values_i in zip(multi_scalars, recoded_matrices, signs,
+                                                                                digit_column_values):
+            expected_matrix = scalar_recoding.recode_multi_scalar_general_unoptimized(multi_scalar, 2 ** 256)
+            self.assertTrue(np.array_equal(recoded_matrix, expected_matrix))
+            expected_signs, expected_digit_column_values = scalar_recoding.interpret_recoded_matrix(expected_matrix)
+            self.assertEqual(list(signs_i), list(expected_signs))
+            self.assertEqual(list(digit_column_values_i), list(expected_digit_column_values))
+
+        even_multi_scalar = np.asarray([[2, 1, 1, 1]], dtype=np.uint64)
+        self.assertRaises(Exception, scalar_recoding.recode_multi_scalars, even_multi_scalar)
+
+    def test_digit_column_class(self):
+        classes = set()
+        for sign in (-1, 1):
+            for value in range(8):
+                digit_column = scalar_recoding.generate_digit_column_for_value(value, sign)
+                self.assertEqual(scalar_recoding.digit_column_value(digit_column), value)
+                self.assertEqual(scalar_recoding.digit_column_value(digit_column[:, 0]), value)
+                classes.add(int(scalar_recoding.digit_column_class(value, sign)))
+        self.assertEqual(classes, set(range(16)))
+        self.assertEqual(scalar_recoding.digit_column_class(5, 1), 13)
+
+        # The classes of many recoded multi-scalars at once match those of their digit columns
+        multi_scalars = np.asarray([self._generate_random_64bit_scalars() for _ in range(5)], dtype=np.uint64)
+        multi_scalars[:, 0] |= np.uint64(1)
+        recoded_matrices, signs, digit_column_values = scalar_recoding.recode_multi_scalars(multi_scalars)
+        digit_column_classes = scalar_recoding.digit_column_class(digit_column_values, signs)
+        for recoded_matrix, classes in zip(recoded_matrices, digit_column_classes):
+            for idx in range(65):
+                digit_column = recoded_matrix[:, 64 - idx]
+                self.assertEqual(classes[idx], scalar_recoding.digit_column_class(
+                    scalar_recoding.digit_column_value(digit_column), digit_column[0]))
+
+    def test_get_valid_recoded_matrix(self):
+        for i in range(50):
+            multi_scalar = self._generate_random_64bit_scalars()
+            multi_scalar[0] |= np.uint64(1)
+            glv_sac_matrix = scalar_recoding.recode_multi_scalar_general_unoptimized(multi_scalar, 2 ** 256)
+            for nr_of_cols in [1, 2, 3, 33, 64, 65]:
+                expected_digit_columns = glv_sac_matrix[:, :nr_of_cols]
+                for rng in [None, i]:
+                    recoded_matrix, is_valid = scalar_recoding.get_valid_recoded_matrix(expected_digit_columns, 65,
+                                                                                        rng=rng)
+                    self.assertTrue(is_valid)
+                    scalar_vals = np.asarray(scalar_recoding.matrix_to_scalars(recoded_matrix), dtype=np.uint64)
+                    recoded = scalar_recoding.recode_multi_scalar_general_unoptimized(scalar_vals, 2 ** 256)
+                    self.assertTrue(np.array_equal(recoded, recoded_matrix))
+                    self.assertTrue(np.array_equal(recoded[:, :nr_of_cols], expected_digit_columns))
+
+        # The same seed gives the same filling
+        expected_digit_columns = scalar_recoding.generate_digit_column_for_value(5, 1)
+        recoded_matrix_a, _ = scalar_recoding.get_valid_recoded_matrix(expected_digit_columns, 65, rng=1)
+        recoded_matrix_b, _ = scalar_recoding.get_valid_recoded_matrix(expected_digit_columns, 65, rng=1)
+        self.assertTrue(np.array_equal(recoded_matrix_a, recoded_matrix_b))
+
+        # s_63 can not be positive for a sign-aligner that fits in an uint64
+        expected_digit_columns = np.concatenate((scalar_recoding.generate_digit_column_for_value(1, 1),
+                                                 scalar_recoding.generate_digit_column_for_value(1, 1)), axis=1)
+        _, is_valid = scalar_recoding.get_valid_recoded_matrix(expected_digit_columns, 65)
+        self.assertFalse(is_valid)
@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+from online_template_attack import scoring
+
+
+class TestScoring(unittest.TestCase):
+
+    def setUp(self):
+        self.offsets = [(100 + idx * 30, 20) for idx in range(128)]
+
+    def test_operation_windows(self):
+        # The first iteration only uses the first doubling operation
+        self.assertEqual(scoring.operation_windows(self.offsets, 63), ((100, 20), None))
+        # Later iterations also use the preceding addition operation
+        self.assertEqual(scoring.operation_windows(self.offsets, 62, offset_into_start=2, offset_from_end=3),
+                         ((162, 15), (132, 15)))
+        # The last iteration uses the last addition operation
+        self.assertEqual(scoring.operation_windows(self.offsets, 0), (self.offsets[127], None))
+
+        pois = ([np.array([1, 5])] * 64, [np.array([2])] * 64)
+        dbl_samples, add_samples = scoring.operation_samples(self.offsets, 62, pois)
+        self.assertTrue(np.array_equal(dbl_samples, [161, 165]))
+        self.assertTrue(np.array_equal(add_samples, [132]))
+        dbl_samples, add_samples = scoring.operation_samples(self.offsets, 63, pois)
+        self.assertTrue(np.array_equal(dbl_samples, [101, 105]))
+        self.assertIsNone(add_samples)
+
+    def test_correlate_digit_column(self):
+        target_trace = np.random.randint(-128, 127, size=4000)
+        template_traces = [np.random.randint(-128, 127, size=4000) for _ in range(4)]
+        template_traces[2] = target_trace.copy()
+        dbl_window, add_window = scoring.operation_windows(self.offsets, 62)
+        coeffs, lags = scoring.correlate_digit_column(template_traces, target_trace, dbl_window, add_window)
+        self.assertEqual(np.argmax(coeffs), 2)
+        self.assertAlmostEqual(coeffs[2], 1.0)
+        self.assertTrue(np.array_equal(lags, np.zeros(4)))
+        start, duration = dbl_window
+        dbl_coeff = np.corrcoef(template_traces[0][start:start + duration], target_trace[start:start + duration])[0, 1]
+        add_coeff = np.corrcoef(template_traces[0][130:150], target_trace[130:150])[0, 1]
+        self.assertAlmostEqual(coeffs[0], (dbl_coeff + add_coeff) / 2)
+
+        # A template shifted by a few samples is aligned by the lag search
+        template_traces[1] = np.roll(target_trace, 3)
+        coeffs, lags = scoring.correlate_digit_column(template_traces, target_trace, dbl_window, max_lag=5)
+        self.assertAlmostEqual(coeffs[1], 1.0)
+        self.assertEqual(abs(lags[1]), 3)
+
+    def test_rank_statistics(self):
+        digit_columns = [np.array([[1], [value & 1], [(value >> 1) & 1], [(value >> 2) & 1]]) for value in range(4)]
+        results = list(zip(digit_columns, [0.1, 0.7, 0.3, 0.5], [0] * 4))
+        self.assertEqual(scoring.rank_of_expected(results, [1, 1, 0, 0]), 1)
+        self.assertEqual(scoring.rank_of_expected(results, [1, 0, 0, 0]), 4)
+        self.assertIsNone(scoring.rank_of_expected(results, [-1, 0, 0, 0]))
+
+        statistics = scoring.rank_statistics([[1, 2], [1, 4], [3, 2]])
+        self.assertAlmostEqual(statistics["average"], 13 / 6)
+        self.assertEqual(statistics["median"], 2)
+        self.assertEqual((statistics["min"], statistics["max"], statistics["nr_correct"]), (1, 4, 2))
+        self.assertEqual(len(statistics["per_iteration"]), 2)
+        self.assertAlmostEqual(statistics["per_iteration"][0]["average"], 5 / 3)
+        self.assertEqual(statistics["per_iteration"][1]["nr_correct"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from fourq_software import scalar_recoding
+from online_template_attack import template_scalar_cache
+from tests.test_constants import scalar_decomp_test_vectors
+
+
+class TestTemplateScalarCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "template_scalars.sqlite")
+        multi_scalar = np.asarray(scalar_decomp_test_vectors[0][1], dtype=np.uint64)
+        self.recoded_matrix = scalar_recoding.recode_multi_scalar_general_unoptimized(multi_scalar, 2 ** 256)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_template_digit_column_guesses(self):
+        guesses = template_scalar_cache.template_digit_column_guesses(None)
+        self.assertEqual(len(guesses), 8)
+        guesses = template_scalar_cache.template_digit_column_guesses(self.recoded_matrix[:, :3])
+        self.assertEqual(len(guesses), 16)
+        for template_digit_column, digit_columns_guess in guesses:
+            self.assertEqual(digit_columns_guess.shape, (4, 4))
+            self.assertTrue(np.array_equal(digit_columns_guess[:, :3], self.recoded_matrix[:, :3]))
+            self.assertTrue(np.array_equal(digit_columns_guess[:, 3:], template_digit_column))
+
+    def test_get(self):
+        digit_columns = self.recoded_matrix[:, :5]
+        with template_scalar_cache.TemplateScalarCache(self.path) as cache:
+            multi_scalar, is_valid = cache.get(digit_columns)
+        self.assertTrue(is_valid)
+        recoded_matrix, _ = scalar_recoding.get_valid_recoded_matrix(digit_columns, 65)
+        self.assertEqual(multi_scalar, scalar_recoding.matrix_to_scalars(recoded_matrix))
+
+        # An invalid prefix (s_63 = 1) is cached as well
+        invalid_digit_columns = np.concatenate((digit_columns[:, :1], digit_columns[:, :1]), axis=1)
+        with template_scalar_cache.TemplateScalarCache(self.path) as cache:
+            self.assertEqual(cache.get(invalid_digit_columns), (None, False))
+            self.assertEqual(len(cache), 2)
+
+        # The multi-scalar is persisted
+        with template_scalar_cache.TemplateScalarCache(self.path) as cache:
+            self.assertEqual(cache.get(digit_columns), (multi_scalar, True))
+            self.assertEqual(len(cache), 2)
+
+    def test_precompute(self):
+        with template_scalar_cache.TemplateScalarCache(self.path) as cache:
+            self.assertEqual(cache.precompute(self.recoded_matrix, nr_of_iterations=4), 8 + 3 * 16)
+        with template_scalar_cache.TemplateScalarCache(self.path) as cache:
+            self.assertEqual(cache.precompute(self.recoded_matrix, nr_of_iterations=4), 0)
+            for _, digit_columns_guess in template_scalar_cache.template_digit_column_guesses(
+                    self.recoded_matrix[:, :3]):
+                multi_scalar, is_valid = cache.get(digit_columns_guess)
+                if not is_valid:
+                    continue
+                recoded = scalar_recoding.recode_multi_scalar_general_unoptimized(
+                    np.asarray(multi_scalar, dtype=np.uint64), 2 ** 256)
+                self.assertTrue(np.array_equal(recoded[:, :4], digit_columns_guess))
@@ -1,5 +1,6 @@
 import os
 import struct
+import tempfile
 import unittest
 from binascii import hexlify, unhexlify
 from random import randint, choice
@@ -204,6 +205,68 @@ class TestTraceSetCoding(unittest.TestCase):
                 #     print(e)
                 #     # pass
 
+    def test_samples_encoding(self):
+        samples = np.random.randint(-2 ** 31, 2 ** 31 - 1, size=100)
+        for sample_data_type, sample_length in [(0, 1), (0, 2), (0, 4), (1, 4)]:
+            encoded_samples = tsc._encode_samples(samples, sample_data_type, sample_length)
+            expected = bytearray()
+            for sample in samples:
+                expected.extend(tsc._encode_sample(sample, sample_data_type, sample_length))
+            self.assertEqual(bytes(expected), encoded_samples)
+        self.assertRaises(Exception, tsc._encode_samples, samples, 1, 2)
+
+    def test_trs_writer(self):
+        traces = [np.random.randint(-128, 127, size=1000) for _ in range(5)]
+        trace_names = ["trace {}".format(i) for i in range(5)]
+        traces_data_bytes = [os.urandom(3) for _ in range(5)]
+        for sample_data_type, sample_length in [(0, 1), (0, 2), (1, 4)]:
+            expected = tsc.to_trs_format(traces, traces_data_bytes, trace_names, 1000, sample_data_type, sample_length,
+                                         nr_of_data_bytes=3)
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "traces.trs")
+                with trace_set_coding.TrsWriter(path, 1000, sample_data_type, sample_length, nr_of_data_bytes=3,
+                                                title_space_len=7) as trs_writer:
+                    for trace, trace_name, trace_data_bytes in zip(traces, trace_names, traces_data_bytes):
+                        trs_writer.write_trace(trace, trace_name, trace_data_bytes)
+                    self.assertRaises(Exception, trs_writer.write_trace, traces[0][:10], "too short",
+                                      traces_data_bytes[0])
+                    self.assertRaises(Exception, trs_writer.write_trace, traces[0], "no data bytes")
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), bytes(expected))
+
+    def test_trs_reader(self):
+        traces = np.random.randint(-128, 127, size=(6, 500))
+        trace_names = ["trace {}".format(i) for i in range(6)]
+        traces_data_bytes = [os.urandom(4) for _ in range(6)]
+        with tempfile.TemporaryDirectory() as directory:
+            for sample_data_type, sample_length in [(0, 1), (0, 2), (1, 4)]:
+                path = os.path.join(directory, "traces_{}_{}.trs".format(sample_data_type, sample_length))
+                with open(path, "wb") as f:
+                    f.write(tsc.to_trs_format(list(traces), traces_data_bytes, trace_names, 500, sample_data_type,
+                                              sample_length, nr_of_data_bytes=4))
+                with trace_set_coding.TrsReader(path) as trs_reader:
+                    self.assertEqual(len(trs_reader), 6)
+                    self.assertEqual(trs_reader.samples_per_trace, 500)
+                    self.assertEqual(trs_reader.global_trace_title, "FourQ power trace")
+                    self.assertTrue(np.array_equal(trs_reader.traces, traces))
+                    self.assertTrue(np.array_equal(trs_reader[2:4, 10:20], traces[2:4, 10:20]))
+                    self.assertEqual(trs_reader.titles, trace_names)
+                    self.assertEqual([bytes(data) for data in trs_reader.data_bytes], traces_data_bytes)
+                    for trace, expected_trace in zip(trs_reader, traces):
+                        self.assertTrue(np.array_equal(trace, expected_trace))
+
+            # A trace set that was not closed has no number of traces in its header yet
+            path = os.path.join(directory, "unfinished.trs")
+            trs_writer = trace_set_coding.TrsWriter(path, 500, title_space_len=0)
+            for trace in traces[:3]:
+                trs_writer.write_trace(trace)
+            trs_writer._file.flush()
+            with trace_set_coding.TrsReader(path) as trs_reader:
+                self.assertEqual(len(trs_reader), 3)
+                self.assertEqual(trs_reader.titles, ["", "", ""])
+                self.assertTrue(np.array_equal(trs_reader.traces, traces[:3]))
+            trs_writer.close()
+
     def _decompose(self, x: np.float32):
         """
         Decomposes a float32 into negative, exponent, and significand
@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+
+from online_template_attack import trace_statistics
+
+
+class TestTraceStatistics(unittest.TestCase):
+
+    def test_add(self):
+        traces = np.random.randint(-128, 127, size=(50, 300))
+        accumulator = trace_statistics.TraceAccumulator()
+        for trace in traces:
+            accumulator.add(trace)
+        self.assertEqual(len(accumulator), 50)
+        self.assertTrue(np.allclose(accumulator.mean, traces.mean(axis=0)))
+        self.assertTrue(np.allclose(accumulator.variance, traces.var(axis=0, ddof=1)))
+        self.assertTrue(np.allclose(accumulator.standard_error, np.sqrt(traces.var(axis=0, ddof=1) / 50)))
+
+        # Traces are truncated to the shortest length
+        accumulator.add(traces[0][:200])
+        self.assertEqual(len(accumulator.mean), 200)
+        self.assertTrue(np.allclose(accumulator.mean, np.vstack((traces, traces[:1]))[:, :200].mean(axis=0)))
+        self.assertRaises(Exception, lambda: trace_statistics.TraceAccumulator().mean)
+
+    def test_merge(self):
+        traces = np.random.randint(-128, 127, size=(40, 100))
+        accumulators = [trace_statistics.TraceAccumulator() for _ in range(3)]
+        for trace in traces[:10]:
+            accumulators[0].add(trace)
+        accumulators[1].add_traces(traces[10:35])
+        for trace in traces[35:]:
+            accumulators[2].add(trace[:90])
+        merged = trace_statistics.TraceAccumulator()
+        for accumulator in accumulators:
+            merged.merge(accumulator)
+        self.assertEqual(merged.count, 40)
+        self.assertTrue(np.allclose(merged.mean, traces[:, :90].mean(axis=0)))
+        self.assertTrue(np.allclose(merged.variance, traces[:, :90].var(axis=0, ddof=1)))
+        # Merging does not change the merged accumulators
+        self.assertEqual(len(accumulators[0].mean), 100)
+
+    def test_convergence(self):
+        signal = np.random.randint(-100, 100, size=200)
+        accumulator = trace_statistics.TraceAccumulator()
+        accumulator.add(signal)
+        self.assertFalse(accumulator.has_converged(0.5))
+        nr_of_traces = 1
+        while not accumulator.has_converged(0.5):
+            accumulator.add(signal + np.random.normal(0, 4, size=len(signal)))
+            nr_of_traces += 1
+        # The standard error is about 4 / sqrt(n)
+        self.assertTrue(30 < nr_of_traces < 200)
+        self.assertTrue(np.all(np.abs(accumulator.mean - signal) < 3))
+        snr = accumulator.snr
+        self.assertTrue(np.all(snr[np.abs(signal) > 10] > 100))
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from online_template_attack.trace_store import TraceStore
+
+
+class TestTraceStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "campaign")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_append(self):
+        traces = np.random.randint(-128, 127, size=(10, 100))
+        multi_scalar = [0x8b8e05ff76fe90a5, 0x6261ed79303c3feb, 0x780e38de51089170, 0x5f055848a6493e4f]
+        scope_settings = {"bandwidth": "20MHZ", "ver_scale": 3.4e-3}
+        with TraceStore(self.path, samples_per_trace=100, initial_capacity=4) as store:
+            store.append(traces[0], label="target", multi_scalar=multi_scalar, channel="C3")
+            for idx, trace in enumerate(traces[1:]):
+                store.append(trace, label="template", iteration=63, sign=1, digit_column=idx % 8,
+                             multi_scalar=multi_scalar, channel="C3", scope_settings=scope_settings)
+            # The store grows beyond its initial capacity
+            self.assertEqual(len(store), 10)
+            self.assertGreaterEqual(store.capacity, 10)
+            self.assertTrue(np.array_equal(store.traces, traces))
+
+        # Reopen the store and append traces of different lengths
+        with TraceStore(self.path) as store:
+            self.assertEqual(len(store), 10)
+            self.assertTrue(np.array_equal(store.traces, traces))
+            store.append(np.ones(120), label="template", iteration=62)
+            store.append(np.ones(80), label="template", iteration=62)
+            self.assertTrue(np.array_equal(store[10], np.ones(100)))
+            self.assertTrue(np.array_equal(store[11], np.concatenate((np.ones(80), np.zeros(20)))))
+
+            metadata = store.get_metadata(3)
+            self.assertEqual(metadata["label"], "template")
+            self.assertEqual(metadata["digit_column"], 2)
+            self.assertEqual(metadata["multi_scalar"], multi_scalar)
+            self.assertEqual(metadata["scope_settings"], scope_settings)
+            self.assertEqual(store.get_metadata(11)["nr_of_samples"], 80)
+            self.assertEqual(store.select(label="target"), [0])
+            self.assertEqual(store.select(iteration=62), [10, 11])
+            self.assertEqual(store.select(label="template", digit_column=1), [2])
+            self.assertRaises(Exception, store.select, multi_scalar="1")
+            self.assertRaises(IndexError, store.get_metadata, 12)
+
+    def test_uncommitted_samples_are_ignored(self):
+        with TraceStore(self.path, samples_per_trace=10) as store:
+            store.append(np.arange(10))
+            # Samples written without committing the metadata (e.g. a crash during an append)
+            store._samples[1] = np.arange(10)
+            store._samples.flush()
+        with TraceStore(self.path) as store:
+            self.assertEqual(len(store), 1)
+            store.append(np.ones(10))
+            self.assertTrue(np.array_equal(store[1], np.ones(10)))
+
+    def test_create_without_samples_per_trace(self):
+        self.assertRaises(Exception, TraceStore, self.path)